@@ -8,9 +8,9 @@
 
 # ! Place the code below into Houdini's Python Panel Editor "Script" Section
 
-# from usdbrowser import project
-# import importlib
-# importlib.reload(project)
+# from usdbrowser import project, startup
+# if startup.dev_mode():
+#     startup.reload_modules()
 #
 # def onCreateInterface():
 #     return project.UsdBrowser()
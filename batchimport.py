@@ -0,0 +1,102 @@
+import os
+import re
+
+import hou
+
+MODE_GEO_PER_FILE = 'geo'
+MODE_MERGE = 'merge'
+MODE_SUBLAYER = 'sublayer'
+MODE_REFERENCE = 'reference'
+# (mode, label) in the order they are offered next to the import button
+IMPORT_MODES = ((MODE_GEO_PER_FILE, 'Geo per file'),
+                (MODE_MERGE, 'Merge into one geo'),
+                (MODE_SUBLAYER, 'LOP sublayer'),
+                (MODE_REFERENCE, 'LOP reference'))
+
+
+# The frame part of a sequence path, e.g. `.$F4` in `cache.$F4.usdc`
+FRAME_TOKEN = re.compile(r'[._]?\$F\d*')
+
+
+def node_name(path):
+    # Houdini node names only allow letters, digits and underscores
+    name = FRAME_TOKEN.sub('', os.path.splitext(os.path.basename(path))[0])
+    name = re.sub(r'\W', '_', name)
+    return name if name[:1].isalpha() else 'usd_' + name
+
+
+def set_parm(node, name, value):
+    # Parm names differ between Houdini versions, a missing one would
+    # leave the node loading nothing
+    parm = node.parm(name)
+    if parm is None:
+        raise ValueError(f"{node.type().name()} has no {name} parameter")
+    parm.set(value)
+
+
+def import_files(paths, mode=MODE_GEO_PER_FILE):
+    # Creates the nodes for every path inside one undo group, with cooking
+    # held back until all of them exist. A path of a file sequence holds a
+    # $F token and is loaded per frame by its single node. Returns the
+    # created nodes
+    update_mode = hou.updateModeSetting()
+    hou.setUpdateMode(hou.updateMode.Manual)
+    try:
+        with hou.undos.group(f"Import {len(paths)} USD files"):
+            if mode == MODE_MERGE:
+                return import_merged(paths)
+            if mode == MODE_SUBLAYER:
+                return import_lop(paths, 'sublayer')
+            if mode == MODE_REFERENCE:
+                return import_lop(paths, 'reference')
+            return import_geo_per_file(paths)
+    finally:
+        hou.setUpdateMode(update_mode)
+
+
+def create_usd_import(parent, path):
+    usd_import = parent.createNode('usdimport', node_name(path))
+    usd_import.parm('filepath1').set(path)
+    usd_import.parm('importtraversal').set('std:boundables')
+    return usd_import
+
+
+def import_geo_per_file(paths):
+    obj = hou.node('/obj')
+    nodes = []
+    for path in paths:
+        loader = obj.createNode('geo', 'usd_loader')
+        create_usd_import(loader, path)
+        nodes.append(loader)
+    obj.layoutChildren(items=nodes)
+    return nodes
+
+
+def import_merged(paths):
+    loader = hou.node('/obj').createNode('geo', 'usd_loader')
+    merge = loader.createNode('merge', 'merge_usd')
+    for path in paths:
+        merge.setNextInput(create_usd_import(loader, path))
+    merge.setDisplayFlag(True)
+    merge.setRenderFlag(True)
+    loader.layoutChildren()
+    return [loader]
+
+
+def import_lop(paths, node_type):
+    # A single sublayer or reference LOP holding every file in its
+    # multiparm, references each get their own primitive
+    stage = hou.node('/stage')
+    node = stage.createNode(node_type, f'usd_{node_type}')
+    try:
+        set_parm(node, 'num_files', len(paths))
+        for number, path in enumerate(paths, 1):
+            set_parm(node, f'filepath{number}', path)
+            if node_type == 'reference':
+                set_parm(node, f'primpath{number}', '/' + node_name(path))
+    except ValueError:
+        # No half set up node is left behind
+        node.destroy()
+        raise
+    node.setDisplayFlag(True)
+    return [node]
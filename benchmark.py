@@ -0,0 +1,197 @@
+import argparse
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+try:
+    from . import browsercore, projectindex, scancache, scanner, sorting
+except ImportError:
+    import browsercore
+    import projectindex
+    import scancache
+    import scanner
+    import sorting
+
+USD_FILE_TYPES = ('.usd', '.usda', '.usdc', '.png')
+# Rows of the in-memory listing the sort engine is timed on
+SORT_ROWS = 50000
+
+
+def build_tree(root, depth, width, files):
+    # Synthetic project: `width` directories per level down to `depth`,
+    # each holding `files` files cycling through the usd types and a png.
+    # Directory mtimes are moved an hour back so the scan cache trusts them
+    past = time.time() - 3600
+    created = []
+    stack = [(root, 0)]
+    while stack:
+        path, level = stack.pop()
+        os.makedirs(path, exist_ok=True)
+        for i in range(files):
+            extension = USD_FILE_TYPES[i % len(USD_FILE_TYPES)]
+            open(os.path.join(path, f'asset_{i:04d}{extension}'), 'w').close()
+        if level < depth:
+            for i in range(width):
+                stack.append((os.path.join(path, f'dir_{i:03d}'), level + 1))
+        created.append(path)
+    for path in created:
+        os.utime(path, (past, past))
+    return len(created)
+
+
+def synthetic_scan(rows):
+    # Listing of `rows` counted directories and usd files, without disk
+    scan = scanner.DirectoryScan('/synthetic')
+    for i in range(rows):
+        if i % 2:
+            scan.add_entry(scanner.ScanEntry(
+                f'Asset{i}_v{i % 7}{USD_FILE_TYPES[i % 3]}', '', False,
+                usage=scanner.DiskUsage(1, i * 7919 % 100003, i * 31)))
+        else:
+            scan.add_entry(scanner.ScanEntry(
+                f'dir{i}', '', True, scanner.UsdCounts(i % 13, i % 7, i % 5),
+                scanner.DiskUsage(i % 11, i * 104729 % 1000003, i * 17)))
+    return scan
+
+
+def timed(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return {'min': min(times), 'mean': statistics.mean(times),
+            'max': max(times), 'rounds': repeat}
+
+
+def run(root, repeat):
+    results = {}
+
+    def navigate_cold():
+        core = browsercore.BrowserCore()
+        core.set_project(root)
+        core.list_current()
+        core.count_pending()
+
+    cache = scancache.ScanCache()
+    warm = browsercore.BrowserCore(cache)
+    warm.set_project(root)
+    warm.refresh()
+
+    def navigate_warm():
+        warm.navigate(root)
+        warm.list_current()
+        warm.count_pending()
+
+    def refresh():
+        warm.refresh()
+
+    def count():
+        scanner.count_usd_files(root)
+
+    def sort():
+        warm.listing(ascending=False)
+
+    def search():
+        warm.search('dir_00')
+
+    rows = browsercore.BrowserCore()
+    rows.scan = synthetic_scan(SORT_ROWS)
+
+    def sort_rows_first():
+        # Grouping sequences and ranking names, once per listing
+        rows.sorter = None
+        rows.listing()
+
+    def sort_rows():
+        # A sort click after counts changed, nothing cached
+        for mode, _ in sorting.SORT_MODES:
+            rows.scan.version += 1
+            rows.listing(False, mode)
+
+    results['navigate_cold'] = timed(navigate_cold, repeat)
+    results['navigate_warm'] = timed(navigate_warm, repeat)
+    results['refresh'] = timed(refresh, repeat)
+    results['count'] = timed(count, repeat)
+    results['sort'] = timed(sort, repeat)
+    results['search'] = timed(search, repeat)
+    results['sort_rows_first'] = timed(sort_rows_first, repeat)
+    results['sort_rows'] = timed(sort_rows, repeat)
+
+    index = projectindex.ProjectIndex(root)
+    results['index_build'] = timed(index.build, repeat)
+    results['search_project_substring'] = timed(
+        lambda: index.search('asset_0001'), repeat)
+    results['search_project_glob'] = timed(
+        lambda: index.search('dir_00?'), repeat)
+    results['search_project_fuzzy'] = timed(
+        lambda: index.search('~ast01usdc'), repeat)
+    results['index_entries'] = len(index)
+    return results
+
+
+def compare(results, baseline, threshold):
+    # Names of benchmarks whose mean grew by more than `threshold`
+    regressions = []
+    for name, timing in results.items():
+        previous = baseline.get(name)
+        if not isinstance(timing, dict) or not isinstance(previous, dict):
+            continue
+        if timing['mean'] > previous['mean'] * threshold:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Time navigate, search, refresh and count on a '
+                    'synthetic project tree')
+    parser.add_argument('--depth', type=int, default=3)
+    parser.add_argument('--width', type=int, default=8)
+    parser.add_argument('--files', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--root', help='existing directory to benchmark, '
+                                       'no synthetic tree is built')
+    parser.add_argument('--json', help='write results to this file')
+    parser.add_argument('--compare', help='baseline json from an earlier run')
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help='allowed slowdown against the baseline')
+    args = parser.parse_args(argv)
+
+    temp_dir = None
+    root = args.root
+    if root is None:
+        temp_dir = tempfile.mkdtemp(prefix='usdbrowser_bench_')
+        root = os.path.join(temp_dir, 'project')
+        directories = build_tree(root, args.depth, args.width, args.files)
+        print(f'synthetic tree: {directories} directories, '
+              f'{directories * args.files} files')
+    try:
+        results = run(root, args.repeat)
+    finally:
+        if temp_dir is not None:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    for name, timing in results.items():
+        if isinstance(timing, dict):
+            print(f"{name:<28}{timing['mean'] * 1000:>10.2f} ms"
+                  f"  (min {timing['min'] * 1000:.2f}, "
+                  f"max {timing['max'] * 1000:.2f})")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            print('regressions: ' + ', '.join(regressions))
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
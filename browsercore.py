@@ -0,0 +1,177 @@
+try:
+    from . import scanner, projectindex
+    from .sorting import ListingSorter, SORT_NAME
+    from .tree import Tree, LISTED, COUNTED
+except ImportError:
+    import scanner
+    import projectindex
+    from sorting import ListingSorter, SORT_NAME
+    from tree import Tree, LISTED, COUNTED
+
+
+def split_listing(scan, ascending=True, sort=SORT_NAME, group=True):
+    # Directories then usd files of `scan` in the requested order, see
+    # sorting.ListingSorter. With `group` numbered files are collapsed
+    # into sequences.FileSequence rows
+    return ListingSorter(scan, group).listing(sort, ascending)
+
+
+def narrows(previous, text):
+    # Every name matching `text` also matched `previous`
+    return bool(previous) and previous.lower() in text.lower()
+
+
+def filter_entries(entries, text):
+    text = text.lower()
+    if not text:
+        return list(entries)
+    return [entry for entry in entries if text in entry.name.lower()]
+
+
+class BrowserCore:
+    # Browsing state without Qt or hou: the project tree, the current
+    # directory and its scan. UsdBrowser drives one of these, benchmark.py
+    # and other headless tools can use it directly
+    def __init__(self, cache=None):
+        self.cache = cache
+        self.tree = Tree()
+        self.current_node = self.tree.root
+        self.scan = None
+        self.index = None
+        # Gather per-directory disk usage along with the usd counts
+        self.disk_usage = False
+        # Show numbered files as one row per sequence
+        self.group_sequences = True
+        # ListingSorter of the current scan, sort clicks reuse it
+        self.sorter = None
+
+    def set_project(self, root, tree=None):
+        # `tree` is one shared with other browsers of the same root
+        self.tree = tree if tree is not None else Tree(root)
+        self.current_node = self.tree.root
+        self.scan = None
+        self.index = None
+
+    def navigate(self, path):
+        self.current_node = self.tree.add_path(path)
+        return self.current_node
+
+    def go_up(self):
+        if self.current_node.parent is not None:
+            self.current_node = self.current_node.parent
+        return self.current_node
+
+    def list_current(self, keep_counts=False):
+        # One listing of the current directory. With `keep_counts` the
+        # subtree counts of directories that were already listed are kept
+        previous = self.scan
+        node = self.current_node
+        scan = scanner.list_directory(node.path, self.cache, self.disk_usage)
+        node.mtime_ns = scan.mtime_ns
+        node.state = LISTED
+        node.subdirs_present = False
+        for entry in scan.entries:
+            if not entry.is_dir:
+                continue
+            node.subdirs_present = True
+            self.tree.add_path(entry.path)
+            if keep_counts and previous is not None:
+                old = previous.by_name.get(entry.name)
+                if old is not None and old.is_dir and old.counts is not None:
+                    scan.set_counts(entry.name, old.counts, old.usage)
+        self.set_scan(scan)
+        return scan
+
+    def set_scan(self, scan, sorter=None):
+        # A new listing. Sequences are grouped and names put in natural
+        # order here, once, so the first sort is as quick as the next ones.
+        # `sorter` is one kept with an earlier view of the same scan
+        self.scan = scan
+        if sorter is None or not sorter.matches(scan, self.group_sequences):
+            sorter = ListingSorter(scan, self.group_sequences)
+        self.sorter = sorter
+
+    def listing(self, ascending=True, sort=SORT_NAME):
+        sorter = self.sorter
+        if sorter is None \
+                or not sorter.matches(self.scan, self.group_sequences):
+            sorter = self.sorter = ListingSorter(self.scan,
+                                                 self.group_sequences)
+        return sorter.listing(sort, ascending)
+
+    def set_counts(self, entry, counts, usage=None):
+        # Record subtree counts and disk usage for a listed directory, on
+        # the scan and on its tree node
+        self.scan.set_counts(entry.name, counts, usage)
+        child = self.current_node.child(entry.name)
+        if child is not None:
+            child.counts = counts
+            child.usage = usage
+            child.state = COUNTED
+
+    def count_subtree(self, path, cancel=None):
+        if self.cache is not None:
+            return self.cache.subtree_counts(path, cancel, fresh=True)
+        return scanner.count_usd_files(path, cancel=cancel)
+
+    def total_subtree(self, path, cancel=None):
+        # (counts, DiskUsage) in one walk, None once cancelled
+        if self.cache is not None:
+            return self.cache.subtree_totals(path, cancel, fresh=True)
+        usage = scanner.DiskUsage()
+        counts = scanner.count_usd_files(path, cancel=cancel, usage=usage)
+        return (counts, usage) if counts is not None else None
+
+    def count_pending(self, cancel=None):
+        # Synchronously count every directory of the listing still missing
+        # its counts, the UI does the same on the scan pool instead
+        for entry in self.scan.pending(self.disk_usage):
+            if self.disk_usage:
+                totals = self.total_subtree(entry.path, cancel)
+                if totals is None:
+                    return False
+                self.set_counts(entry, *totals)
+                continue
+            counts = self.count_subtree(entry.path, cancel)
+            if counts is None:
+                return False
+            self.set_counts(entry, counts)
+        if self.cache is not None:
+            self.cache.flush()
+        return True
+
+    def refresh(self):
+        if self.cache is not None:
+            self.cache.expire()
+        self.list_current()
+        self.count_pending()
+        return self.scan
+
+    def search(self, text, ascending=True, sort=SORT_NAME):
+        dir_entries, file_entries = self.listing(ascending, sort)
+        return (filter_entries(dir_entries, text),
+                filter_entries(file_entries, text))
+
+    def build_index(self, cancel=None):
+        index = projectindex.ProjectIndex(self.tree.root.path)
+        index.build(cancel)
+        if index.complete:
+            self.index = index
+        return index
+
+    def search_project(self, text):
+        # Project-wide matches as scan entries named by their path
+        # relative to the project root
+        dir_entries = []
+        file_entries = []
+        if self.index is None:
+            return dir_entries, file_entries
+        for result in self.index.search(text):
+            entry = scanner.ScanEntry(self.index.relative_path(result),
+                                      self.index.path(result),
+                                      self.index.is_dir(result))
+            if entry.is_dir:
+                dir_entries.append(entry)
+            else:
+                file_entries.append(entry)
+        return dir_entries, file_entries
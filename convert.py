@@ -0,0 +1,497 @@
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from . import layerinfo, perftrace, scanner
+except ImportError:
+    import layerinfo
+    import perftrace
+    import scanner
+
+TO_USDC = 'usdc'
+TO_USDA = 'usda'
+# Conversions are whole processes, only this many run at once
+DEFAULT_WORKERS = max(1, min(4, os.cpu_count() or 1))
+CONVERT_TIMEOUT = 600
+# Estimates of a dry run when no sample could be converted: a crate file
+# is about this part of the text layer, and Sdf opens text layers at
+# about TEXT_LOAD_RATE and crate files, whose values are read lazily, at
+# about CRATE_LOAD_RATE bytes per second
+CRATE_SIZE_RATIO = 0.4
+TEXT_LOAD_RATE = 40 * 1024 * 1024
+CRATE_LOAD_RATE = 400 * 1024 * 1024
+# A dry run converts this many of the files into a temp folder, the
+# largest ones up to SAMPLE_MAX_BYTES, and measures them
+SAMPLE_FILES = 3
+SAMPLE_MAX_BYTES = 64 * 1024 * 1024
+
+
+def layer_format(path):
+    # 'usdc' or 'usda' from the first bytes, None for anything else
+    with open(path, 'rb') as f:
+        head = f.read(len(layerinfo.CRATE_MAGIC))
+    if head == layerinfo.CRATE_MAGIC:
+        return TO_USDC
+    if head.startswith(layerinfo.USDA_MAGIC):
+        return TO_USDA
+    return None
+
+
+def destination_path(path, target):
+    # A .usd layer is converted in place so references to it still hold,
+    # .usda and .usdc files get the extension of the new format
+    stem, extension = os.path.splitext(path)
+    if extension == '.usd':
+        return path
+    return f"{stem}.{target}"
+
+
+def converter_command():
+    # usdcat from a USD build or Houdini, else a Python able to import pxr
+    # running this file. None when neither is found
+    hfs = os.environ.get('HFS')
+    usdcat = shutil.which('usdcat') or (
+        hfs and shutil.which(os.path.join(hfs, 'bin', 'usdcat')))
+    if usdcat:
+        return [usdcat]
+    python = hfs and shutil.which(os.path.join(hfs, 'bin', 'hython'))
+    if not python and 'hou' not in sys.modules and sdf_available():
+        # Inside Houdini sys.executable is Houdini itself
+        python = sys.executable
+    if python:
+        return [python, os.path.abspath(__file__), '--worker']
+    return None
+
+
+def conversion_args(command, source, output, target):
+    if command[-1] == '--worker':
+        return command + [source, output, target]
+    args = command + [source, '-o', output]
+    if output.endswith('.usd'):
+        args += ['--usdFormat', target]
+    return args
+
+
+def sdf_available():
+    try:
+        from pxr import Sdf  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def sdf_convert(source, output, target):
+    # The --worker side of converter_command
+    from pxr import Sdf
+    layer = Sdf.Layer.FindOrOpen(source)
+    if layer is None:
+        raise ValueError(f"can't open {source}")
+    args = {'format': target} if output.endswith('.usd') else {}
+    if not layer.Export(output, args=args):
+        raise OSError(f"can't write {output}")
+
+
+def sdf_load_seconds(path):
+    # How long Sdf takes to open the layer, None without pxr or when the
+    # layer can't be read
+    try:
+        from pxr import Sdf
+    except ImportError:
+        return None
+    start = time.perf_counter()
+    try:
+        layer = Sdf.Layer.OpenAsAnonymous(path)
+    except Exception:
+        # Sdf raises Tf.ErrorException for a layer it can't parse
+        return None
+    seconds = time.perf_counter() - start
+    if layer is None:
+        return None
+    return seconds
+
+
+class Conversion:
+    __slots__ = ('source', 'destination', 'size')
+
+    def __init__(self, source, destination, size):
+        self.source = source
+        self.destination = destination
+        self.size = size
+
+    def renamed(self):
+        return self.source != self.destination
+
+
+class ConversionPlan:
+    # The layers under the selected files and directories that are not in
+    # the `target` format yet, and those left out with the reason
+    def __init__(self, target):
+        self.target = target
+        self.conversions = []
+        # [(path, reason), ...]
+        self.skipped = []
+
+    def source_bytes(self):
+        return sum(conversion.size for conversion in self.conversions)
+
+
+def layer_paths(paths, cancel=None):
+    # Usd files of `paths`, directories walked like count_usd_files
+    found = []
+    for path in paths:
+        if not os.path.isdir(path):
+            found.append(os.path.normpath(path))
+            continue
+        for top, dirs, files in os.walk(path):
+            if cancel is not None and cancel.is_set():
+                return None
+            dirs.sort()
+            found.extend(os.path.join(top, name) for name in sorted(files)
+                         if name.endswith(scanner.USD_EXTENSIONS))
+    return list(dict.fromkeys(found))
+
+
+def plan_conversion(paths, target, cancel=None):
+    # None once `cancel` is set
+    plan = ConversionPlan(target)
+    found = layer_paths(paths, cancel)
+    if found is None:
+        return None
+    for path in found:
+        if cancel is not None and cancel.is_set():
+            return None
+        try:
+            current = layer_format(path)
+            size = os.stat(path).st_size
+        except OSError as error:
+            plan.skipped.append((path, error.strerror or str(error)))
+            continue
+        if current is None:
+            plan.skipped.append((path, 'not a usd layer'))
+            continue
+        if current == target:
+            plan.skipped.append((path, f'already {target}'))
+            continue
+        destination = destination_path(path, target)
+        if destination != path and os.path.exists(destination):
+            plan.skipped.append(
+                (path, f'{os.path.basename(destination)} exists'))
+            continue
+        plan.conversions.append(Conversion(path, destination, size))
+    return plan
+
+
+class ConversionReport:
+    # What a dry run expects the conversion of a plan to save. Ratios come
+    # from converting a few samples when a converter is installed, from
+    # CRATE_SIZE_RATIO and the load rates otherwise
+    def __init__(self, plan, used_by=None):
+        self.plan = plan
+        self.source_bytes = plan.source_bytes()
+        self.size_ratio = CRATE_SIZE_RATIO if plan.target == TO_USDC \
+            else 1.0 / CRATE_SIZE_RATIO
+        source_rate, target_rate = TEXT_LOAD_RATE, CRATE_LOAD_RATE
+        if plan.target == TO_USDA:
+            source_rate, target_rate = target_rate, source_rate
+        self.source_rate = source_rate
+        self.target_rate = target_rate
+        self.sampled = 0
+        self.timed = False
+        # Layers referring to a renamed file by its old name
+        self.used_by = used_by or {}
+
+    def expected_bytes(self):
+        return int(self.source_bytes * self.size_ratio)
+
+    def load_seconds(self):
+        # (before, after)
+        before = self.source_bytes / self.source_rate
+        return before, self.expected_bytes() / self.target_rate
+
+    def measure(self, command, cancel=None, count=SAMPLE_FILES):
+        # Converts the largest files up to SAMPLE_MAX_BYTES into a temp
+        # folder, times opening both with Sdf when pxr imports here
+        samples = sorted((conversion for conversion in self.plan.conversions
+                          if conversion.size <= SAMPLE_MAX_BYTES),
+                         key=lambda conversion: -conversion.size)[:count]
+        if command is None or not samples:
+            return self
+        # The first layer Sdf opens loads the file format plugins, it is
+        # left out of the timings
+        timed = sdf_load_seconds(samples[0].source) is not None
+        temp_dir = tempfile.mkdtemp(prefix='usdbrowser_convert_')
+        try:
+            sizes = [0, 0]
+            seconds = [0.0, 0.0]
+            for number, conversion in enumerate(samples):
+                if cancel is not None and cancel.is_set():
+                    return self
+                extension = os.path.splitext(conversion.destination)[1]
+                output = os.path.join(temp_dir, f"{number}{extension}")
+                try:
+                    subprocess.run(
+                        conversion_args(command, conversion.source, output,
+                                        self.plan.target),
+                        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                        timeout=CONVERT_TIMEOUT, check=True)
+                    converted = os.stat(output).st_size
+                except (OSError, subprocess.SubprocessError):
+                    continue
+                sizes[0] += conversion.size
+                sizes[1] += converted
+                if timed:
+                    times = (sdf_load_seconds(conversion.source),
+                             sdf_load_seconds(output))
+                    timed = None not in times
+                    if timed:
+                        seconds[0] += times[0]
+                        seconds[1] += times[1]
+                self.sampled += 1
+            if self.sampled and sizes[0]:
+                self.size_ratio = sizes[1] / sizes[0]
+                if timed and seconds[0] > 0 and seconds[1] > 0:
+                    self.timed = True
+                    self.source_rate = sizes[0] / seconds[0]
+                    self.target_rate = sizes[1] / seconds[1]
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+        return self
+
+    def describe(self, root=None):
+        # Lines of text for the dialog and the command line
+        plan = self.plan
+        before, after = self.load_seconds()
+        expected = self.expected_bytes()
+        format_bytes = perftrace.format_bytes
+        lines = [f"{len(plan.conversions)} layers to convert to "
+                 f"{plan.target}, {len(plan.skipped)} skipped",
+                 f"size: {format_bytes(self.source_bytes)} -> about "
+                 f"{format_bytes(expected)} "
+                 f"({format_change(self.source_bytes, expected)})",
+                 f"load time: {format_seconds(before)} -> about "
+                 f"{format_seconds(after)} "
+                 f"({format_change(before, after)})"]
+        if self.sampled:
+            lines.append(f"measured on {self.sampled} converted samples"
+                         + ('' if self.timed else ', load rates estimated'))
+        else:
+            lines.append('estimated from typical ratios, no sample was '
+                         'converted')
+        renamed = [conversion for conversion in plan.conversions
+                   if conversion.renamed()]
+        if renamed:
+            lines.append(f"{len(renamed)} .{other_format(plan.target)} "
+                         f"files are written next to the original as "
+                         f".{plan.target}, the originals are kept")
+        if self.used_by:
+            lines.append(f"{len(self.used_by)} of them are still referred "
+                         f"to by their old name:")
+            for path in sorted(self.used_by)[:8]:
+                shown = os.path.relpath(path, root) if root else path
+                lines.append(f"    {shown} ({self.used_by[path]} layers)")
+        return lines
+
+
+def other_format(target):
+    return TO_USDA if target == TO_USDC else TO_USDC
+
+
+def format_seconds(seconds):
+    if seconds < 1.0:
+        return f"{seconds * 1000.0:.0f} ms"
+    return f"{seconds:.1f} s"
+
+
+def format_change(before, after):
+    if not before:
+        return 'no change'
+    change = (after - before) / before * 100.0
+    return f"{change:+.0f}%"
+
+
+def dry_run(paths, target, command=None, cancel=None, graph=None,
+            sample=SAMPLE_FILES):
+    # The ConversionReport of converting `paths`, nothing is written
+    # outside a temp folder. With a DependencyGraph, renamed layers other
+    # layers use are listed. None once `cancel` is set
+    plan = plan_conversion(paths, target, cancel)
+    if plan is None:
+        return None
+    used_by = {}
+    if graph is not None and graph.complete:
+        for conversion in plan.conversions:
+            if conversion.renamed():
+                users = graph.used_by(conversion.source)
+                if users:
+                    used_by[conversion.source] = len(users)
+    report = ConversionReport(plan, used_by)
+    if sample:
+        report.measure(command, cancel, sample)
+    return report
+
+
+class ConversionBatch:
+    # Converts the layers of a plan in at most `max_workers` usdcat (or
+    # Sdf) processes at once. Each layer is written to a hidden temp file
+    # next to it and renamed over the destination once complete, so a
+    # cancelled or failed conversion leaves the original untouched.
+    # `progress(batch, conversion, error)` is called from the worker
+    # threads after every layer, error is '' on success
+    def __init__(self, plan, command, max_workers=DEFAULT_WORKERS,
+                 progress=None):
+        self.plan = plan
+        self.command = command
+        self.progress = progress
+        self.cancel_event = threading.Event()
+        self.converted = []
+        # [(path, error), ...]
+        self.failed = []
+        self.processes = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers, thread_name_prefix='usdbrowser-convert')
+        self.futures = [self._executor.submit(self._convert, conversion)
+                        for conversion in plan.conversions]
+        # Threads go away once the last layer is done
+        self._executor.shutdown(wait=False)
+
+    def total(self):
+        return len(self.plan.conversions)
+
+    def finished_count(self):
+        return len(self.converted) + len(self.failed)
+
+    def done(self):
+        return all(future.done() for future in self.futures)
+
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def wait(self):
+        for future in self.futures:
+            if not future.cancelled():
+                future.result()
+        return self
+
+    def cancel(self):
+        # Layers not started are dropped, running processes are stopped
+        # and their temp files removed
+        self.cancel_event.set()
+        for future in self.futures:
+            future.cancel()
+        with self._lock:
+            processes = list(self.processes)
+        for process in processes:
+            try:
+                process.terminate()
+            except OSError:
+                pass
+
+    def _convert(self, conversion):
+        if self.cancel_event.is_set():
+            return
+        folder, name = os.path.split(conversion.destination)
+        temp = os.path.join(
+            folder, f".{name}.{os.getpid()}-{threading.get_ident()}.tmp"
+                    f"{os.path.splitext(name)[1]}")
+        error = ''
+        try:
+            self._run(conversion_args(self.command, conversion.source, temp,
+                                      self.plan.target))
+            if self.cancel_event.is_set():
+                return
+            if layer_format(temp) != self.plan.target:
+                raise ValueError(f"not written as {self.plan.target}")
+            shutil.copymode(conversion.source, temp)
+            if conversion.renamed() and os.path.exists(
+                    conversion.destination):
+                raise OSError(f"{name} exists")
+            os.replace(temp, conversion.destination)
+        except (OSError, ValueError, subprocess.SubprocessError) as failure:
+            error = str(failure) or type(failure).__name__
+        finally:
+            if os.path.exists(temp):
+                try:
+                    os.remove(temp)
+                except OSError:
+                    pass
+        with self._lock:
+            if error:
+                self.failed.append((conversion.source, error))
+            else:
+                self.converted.append(conversion)
+        if self.progress is not None:
+            self.progress(self, conversion, error)
+
+    def _run(self, args):
+        process = subprocess.Popen(args, stdout=subprocess.DEVNULL,
+                                   stderr=subprocess.PIPE)
+        with self._lock:
+            self.processes.add(process)
+        try:
+            _, stderr = process.communicate(timeout=CONVERT_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.communicate()
+            raise
+        finally:
+            with self._lock:
+                self.processes.discard(process)
+        if process.returncode and not self.cancel_event.is_set():
+            lines = stderr.decode('utf-8', 'replace').strip().splitlines()
+            raise subprocess.SubprocessError(
+                lines[-1] if lines else f"exit code {process.returncode}")
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ['--worker']:
+        # One conversion for ConversionBatch, see converter_command
+        sdf_convert(*argv[1:4])
+        return 0
+    parser = argparse.ArgumentParser(
+        description='Convert the usd layers under files and folders between '
+                    'usda and usdc')
+    parser.add_argument('paths', nargs='+')
+    parser.add_argument('--to', choices=(TO_USDC, TO_USDA), default=TO_USDC)
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS)
+    parser.add_argument('--dry-run', action='store_true',
+                        help='only report the expected savings')
+    parser.add_argument('--sample', type=int, default=SAMPLE_FILES,
+                        help='layers converted to measure the savings')
+    args = parser.parse_args(argv)
+
+    command = converter_command()
+    if args.dry_run:
+        report = dry_run(args.paths, args.to, command, sample=args.sample)
+        print('\n'.join(report.describe()))
+        return 0
+    if command is None:
+        print('usdcat or a Python with pxr is needed to convert')
+        return 1
+    plan = plan_conversion(args.paths, args.to)
+
+    def progress(batch, conversion, error):
+        print(f"{batch.finished_count()}/{batch.total()} "
+              f"{conversion.destination}" + (f": {error}" if error else ''))
+
+    batch = ConversionBatch(plan, command, args.workers, progress)
+    try:
+        batch.wait()
+    except KeyboardInterrupt:
+        batch.cancel()
+        return 1
+    print(f"{len(batch.converted)} converted, {len(batch.failed)} failed, "
+          f"{len(plan.skipped)} skipped")
+    return 1 if batch.failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,337 @@
+import argparse
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from . import layerinfo, projectindex, storage
+except ImportError:
+    import layerinfo
+    import projectindex
+    import storage
+
+CACHE_FILE = 'usdbrowser_depcache.sqlite'
+# Layers are read whole, more threads than cores keeps NFS reads busy
+DEFAULT_WORKERS = min(16, (os.cpu_count() or 1) + 4)
+# Asset paths only an asset resolver can turn into a file: URIs, and
+# expressions or UDIM/frame tokens expanded at runtime
+RESOLVER_PATH = re.compile(r'^[A-Za-z][A-Za-z0-9+.-]+:|[$`{<]')
+# Listed per file in tooltips
+MAX_TOOLTIP_PATHS = 8
+
+
+def default_cache_path(pref_dir=None):
+    if not pref_dir:
+        pref_dir = os.environ.get('HOUDINI_USER_PREF_DIR') \
+                   or os.path.expanduser('~')
+    return os.path.join(pref_dir, CACHE_FILE)
+
+
+def resolve(layer_path, asset_path):
+    # File an asset path of `layer_path` points to, anchored to the layer
+    # like the default resolver does. None when it needs a resolver
+    if not asset_path or RESOLVER_PATH.search(asset_path):
+        return None
+    if not os.path.isabs(asset_path):
+        asset_path = os.path.join(os.path.dirname(layer_path), asset_path)
+    return os.path.normpath(asset_path)
+
+
+class LayerRecord:
+    __slots__ = ('mtime_ns', 'size', 'arcs', 'error')
+
+    def __init__(self, mtime_ns, size, arcs, error=None):
+        self.mtime_ns = mtime_ns
+        self.size = size
+        # [(arc, asset path), ...], see layerinfo.read_layer_arcs
+        self.arcs = arcs
+        self.error = error
+
+
+class Dependency:
+    __slots__ = ('layer', 'arc', 'asset_path', 'target')
+
+    def __init__(self, layer, arc, asset_path, target):
+        self.layer = layer
+        self.arc = arc
+        self.asset_path = asset_path
+        # Resolved file, None when only an asset resolver knows it
+        self.target = target
+
+    def as_dict(self):
+        return {'layer': self.layer, 'arc': self.arc,
+                'asset_path': self.asset_path, 'target': self.target}
+
+
+class DependencyGraph:
+    # Sublayers, references and payloads of every layer under `root`,
+    # forward (what a layer depends on) and reverse (what uses a layer).
+    # Layers are only read again when their mtime or size changed, the
+    # arcs read are kept in a sqlite cache between sessions
+    def __init__(self, root, cache_path=None, max_workers=DEFAULT_WORKERS):
+        self.root = os.path.normpath(root)
+        self.path = cache_path or ':memory:'
+        self.max_workers = max_workers
+        self.records = {}
+        self.forward = {}
+        self.reverse = {}
+        # Resolved targets that are not on disk
+        self.missing = set()
+        self.complete = False
+        self._lock = threading.RLock()
+        self._db = self._connect(self.path)
+        self._load()
+
+    def _connect(self, path):
+        try:
+            if path != ':memory:':
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            db = sqlite3.connect(path, check_same_thread=False)
+            self._create_schema(db)
+        except (OSError, sqlite3.Error):
+            # Unwritable preference dir, keep the cache for this session
+            self.path = ':memory:'
+            db = sqlite3.connect(':memory:', check_same_thread=False)
+            self._create_schema(db)
+        return db
+
+    def _create_schema(self, db):
+        db.execute('CREATE TABLE IF NOT EXISTS layers ('
+                   'path TEXT PRIMARY KEY, mtime_ns INTEGER, size INTEGER, '
+                   'arcs TEXT, error TEXT)')
+        db.commit()
+
+    def _load(self):
+        prefix = self.root.rstrip(os.sep) + os.sep
+        with self._lock:
+            rows = self._db.execute(
+                'SELECT path, mtime_ns, size, arcs, error FROM layers '
+                'WHERE substr(path, 1, ?) = ?', (len(prefix), prefix))
+            for path, mtime_ns, size, arcs, error in rows:
+                self.records[path] = LayerRecord(
+                    mtime_ns, size, [tuple(arc) for arc in json.loads(arcs)],
+                    error)
+
+    def _save(self, changed, removed):
+        rows = [(path, record.mtime_ns, record.size, json.dumps(record.arcs),
+                 record.error) for path, record in changed.items()]
+        with self._lock:
+            try:
+                self._db.executemany('INSERT OR REPLACE INTO layers VALUES '
+                                     '(?, ?, ?, ?, ?)', rows)
+                self._db.executemany('DELETE FROM layers WHERE path = ?',
+                                     [(path,) for path in removed])
+                self._db.commit()
+            except sqlite3.Error:
+                self._db.rollback()
+
+    # Scanning
+    def layer_paths(self, cancel=None):
+        index = projectindex.ProjectIndex(self.root).build(cancel)
+        return [index.path(i) for i in range(len(index))
+                if not index.is_dir(i)]
+
+    def _check(self, path, cancel):
+        # Cached record of a layer, or a new one when it changed
+        if cancel is not None and cancel.is_set():
+            return None
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        record = self.records.get(path)
+        if record is not None and record.mtime_ns == stat.st_mtime_ns \
+                and record.size == stat.st_size:
+            return record
+        try:
+            arcs = layerinfo.read_layer_arcs(path)
+            error = None
+        except Exception as error_:
+            # Truncated or corrupt layers raise struct.error, lz4 errors
+            # and more. One broken layer must not end the whole scan
+            arcs = []
+            error = str(error_) or type(error_).__name__
+        return LayerRecord(stat.st_mtime_ns, stat.st_size, arcs, error)
+
+    def scan(self, cancel=None):
+        # One parallel pass over every layer of the project: read changed
+        # layers, then check every resolved target exists
+        paths = self.layer_paths(cancel)
+        if cancel is not None and cancel.is_set():
+            return self
+        self._update(paths, set(self.records), cancel)
+        self.complete = True
+        return self
+
+    def rescan_folders(self, folders, cancel=None):
+        # Changes of a few directories, e.g. from the watcher. Only their
+        # layers are checked again
+        folders = {os.path.normpath(folder) for folder in folders}
+        paths = []
+        for folder in folders:
+            try:
+                _, entries = storage.list_dir(folder)
+            except OSError:
+                continue
+            paths.extend(os.path.join(folder, entry.name) for entry in entries
+                         if not entry.is_dir
+                         and projectindex.file_kind(entry.name) is not None)
+        previous = {path for path in self.records
+                    if os.path.dirname(path) in folders}
+        self._update(paths, previous, cancel, folders)
+        return self
+
+    def _update(self, paths, previous, cancel, folders=None):
+        with ThreadPoolExecutor(self.max_workers) as executor:
+            checked = list(executor.map(lambda path: self._check(path, cancel),
+                                        paths))
+            if cancel is not None and cancel.is_set():
+                return
+            records = dict(self.records)
+            changed = {}
+            for path, record in zip(paths, checked):
+                if record is None:
+                    continue
+                if records.get(path) is not record:
+                    changed[path] = record
+                records[path] = record
+            found = {path for path, record in zip(paths, checked)
+                     if record is not None}
+            removed = previous - found
+            for path in removed:
+                records.pop(path, None)
+            forward, reverse = self._edges(records)
+
+            # Targets to look for on disk: all of them for a full scan,
+            # otherwise the ones in the changed folders or new to the graph
+            targets = {target for target in reverse
+                       if target not in records}
+            if folders is not None:
+                targets = {target for target in targets
+                           if os.path.dirname(target) in folders
+                           or target not in self.reverse}
+                missing = {target for target in self.missing
+                           if target in reverse and target not in records
+                           and target not in targets}
+            else:
+                missing = set()
+            targets = sorted(targets)
+            exists = executor.map(os.path.isfile, targets)
+            missing.update(target for target, found_ in zip(targets, exists)
+                           if not found_)
+
+        with self._lock:
+            self.records = records
+            self.forward = forward
+            self.reverse = reverse
+            self.missing = missing
+        self._save(changed, removed)
+
+    @staticmethod
+    def _edges(records):
+        forward = {}
+        reverse = {}
+        for path, record in records.items():
+            dependencies = []
+            for arc, asset_path in record.arcs:
+                dependency = Dependency(path, arc, asset_path,
+                                        resolve(path, asset_path))
+                dependencies.append(dependency)
+                if dependency.target is not None:
+                    reverse.setdefault(dependency.target, []) \
+                        .append(dependency)
+            forward[path] = dependencies
+        return forward, reverse
+
+    # Queries
+    def depends_on(self, path):
+        return list(self.forward.get(os.path.normpath(path), ()))
+
+    def used_by(self, path):
+        return list(self.reverse.get(os.path.normpath(path), ()))
+
+    def is_missing(self, dependency):
+        return dependency.target in self.missing
+
+    def report(self):
+        # Missing targets, unreadable layers and paths left to a resolver
+        missing = []
+        unresolved = []
+        for dependencies in self.forward.values():
+            for dependency in dependencies:
+                if dependency.target is None:
+                    unresolved.append(dependency.as_dict())
+                elif dependency.target in self.missing:
+                    missing.append(dependency.as_dict())
+        broken = [{'layer': path, 'error': record.error}
+                  for path, record in self.records.items() if record.error]
+        return {'root': self.root, 'layers': len(self.records),
+                'missing': sorted(missing, key=lambda item: item['layer']),
+                'broken': sorted(broken, key=lambda item: item['layer']),
+                'unresolved': sorted(unresolved,
+                                     key=lambda item: item['layer'])}
+
+    def describe(self, path):
+        # Tooltip lines for one layer
+        if not self.complete:
+            return ''
+        lines = []
+        for label, dependencies, show in (
+                ('depends on', self.depends_on(path),
+                 lambda dependency: dependency.asset_path
+                 + (' (missing)' if self.is_missing(dependency) else '')),
+                ('used by', self.used_by(path),
+                 lambda dependency: os.path.relpath(dependency.layer,
+                                                    self.root))):
+            if not dependencies:
+                continue
+            lines.append(f"{label}:")
+            lines.extend(f"    {show(dependency)} ({dependency.arc})"
+                         for dependency in dependencies[:MAX_TOOLTIP_PATHS])
+            if len(dependencies) > MAX_TOOLTIP_PATHS:
+                lines.append(f"    (+{len(dependencies) - MAX_TOOLTIP_PATHS}"
+                             f" more)")
+        record = self.records.get(os.path.normpath(path))
+        if record is not None and record.error:
+            lines.append(f"unreadable: {record.error}")
+        return '\n'.join(lines)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Report missing references, payloads and sublayers of '
+                    'every usd file under a project')
+    parser.add_argument('root')
+    parser.add_argument('--cache', help='sqlite cache, reused between runs')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS)
+    parser.add_argument('--json', help='write the report to this file')
+    args = parser.parse_args(argv)
+
+    graph = DependencyGraph(args.root, args.cache, args.workers).scan()
+    report = graph.report()
+    print(f"{report['layers']} layers, {len(report['missing'])} missing, "
+          f"{len(report['broken'])} unreadable, "
+          f"{len(report['unresolved'])} left to the resolver")
+    for item in report['missing']:
+        print(f"missing  {os.path.relpath(item['layer'], graph.root)}: "
+              f"{item['arc']} @{item['asset_path']}@")
+    for item in report['broken']:
+        print(f"broken   {os.path.relpath(item['layer'], graph.root)}: "
+              f"{item['error']}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    graph.close()
+    return 1 if report['missing'] or report['broken'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,128 @@
+import os
+import time
+from collections import OrderedDict
+
+MAX_ENTRIES = 200
+MAX_SNAPSHOTS = 16
+# Rows kept over all snapshots together
+MAX_SNAPSHOT_ROWS = 200000
+
+
+class ViewSnapshot:
+    # Everything needed to redraw one directory view without the disk
+    __slots__ = ('path', 'scan', 'dir_entries', 'file_entries', 'ascending',
+                 'sort_clicked', 'filter_text', 'scroll', 'selected',
+                 'current', 'sorter', 'taken_at')
+
+    def __init__(self, path, scan, dir_entries, file_entries, ascending=True,
+                 sort_clicked=False, filter_text='', scroll=0, selected=(),
+                 current=None, sorter=None):
+        self.path = os.path.normpath(path)
+        self.scan = scan
+        self.dir_entries = list(dir_entries)
+        self.file_entries = list(file_entries)
+        self.ascending = ascending
+        self.sort_clicked = sort_clicked
+        self.filter_text = filter_text
+        self.scroll = scroll
+        # Names of the selected rows and of the current row
+        self.selected = list(selected)
+        self.current = current
+        # The ListingSorter of the scan, sorting again after going back
+        # reuses its natural order
+        self.sorter = sorter
+        self.taken_at = time.time()
+
+    def rows(self):
+        return len(self.dir_entries) + len(self.file_entries)
+
+
+class NavigationHistory:
+    # Visited directories and a cursor, like a web browser. Snapshots of
+    # the most recently left views are kept so back and forward can show
+    # them again straight from memory
+    def __init__(self, max_entries=MAX_ENTRIES, max_snapshots=MAX_SNAPSHOTS,
+                 max_rows=MAX_SNAPSHOT_ROWS):
+        self.max_entries = max_entries
+        self.max_snapshots = max_snapshots
+        self.max_rows = max_rows
+        self.paths = []
+        self.position = -1
+        self.snapshots = OrderedDict()
+        self.snapshot_rows = 0
+
+    def current(self):
+        if self.position < 0:
+            return None
+        return self.paths[self.position]
+
+    def visit(self, path):
+        # A new view drops everything forward of the cursor
+        path = os.path.normpath(path)
+        if self.current() == path:
+            return
+        del self.paths[self.position + 1:]
+        self.paths.append(path)
+        if len(self.paths) > self.max_entries:
+            del self.paths[:len(self.paths) - self.max_entries]
+        self.position = len(self.paths) - 1
+
+    def insert_before(self, path):
+        # Make `path` the entry back goes to, e.g. the parent directory
+        # when nothing was visited before the current view
+        self.paths.insert(max(self.position, 0), os.path.normpath(path))
+        self.position += 1
+
+    def can_go_back(self):
+        return self.position > 0
+
+    def can_go_forward(self):
+        return self.position + 1 < len(self.paths)
+
+    def back(self):
+        if not self.can_go_back():
+            return None
+        self.position -= 1
+        return self.paths[self.position]
+
+    def forward(self):
+        if not self.can_go_forward():
+            return None
+        self.position += 1
+        return self.paths[self.position]
+
+    def forward_path(self):
+        if not self.can_go_forward():
+            return None
+        return self.paths[self.position + 1]
+
+    def save(self, snapshot):
+        self.discard(snapshot.path)
+        self.snapshots[snapshot.path] = snapshot
+        self.snapshot_rows += snapshot.rows()
+        while len(self.snapshots) > self.max_snapshots \
+                or (self.snapshot_rows > self.max_rows
+                    and len(self.snapshots) > 1):
+            _, evicted = self.snapshots.popitem(last=False)
+            self.snapshot_rows -= evicted.rows()
+
+    def snapshot(self, path):
+        snapshot = self.snapshots.get(os.path.normpath(path))
+        if snapshot is not None:
+            self.snapshots.move_to_end(snapshot.path)
+        return snapshot
+
+    def discard(self, path=None):
+        # Forget the snapshot of `path`, or all of them
+        if path is None:
+            self.snapshots.clear()
+            self.snapshot_rows = 0
+            return
+        snapshot = self.snapshots.pop(os.path.normpath(path), None)
+        if snapshot is not None:
+            self.snapshot_rows -= snapshot.rows()
+
+    def clear(self):
+        self.paths = []
+        self.position = -1
+        self.discard()
@@ -0,0 +1,567 @@
+import argparse
+import getpass
+import os
+import select
+import shutil
+import signal
+import socket
+import socketserver
+import struct
+import sys
+import tempfile
+import threading
+import time
+from array import array
+
+try:
+    from . import projectindex, scancache, scanner
+except ImportError:
+    import projectindex
+    import scancache
+    import scanner
+
+SOCKET_NAME = 'usdbrowser-indexd.sock'
+CACHE_FILE = 'usdbrowser_indexd.sqlite'
+PROTOCOL_VERSION = 1
+# Projects are walked this often, within the scan cache's FRESH_SECONDS
+# so answers in between come from memory without a stat
+WARM_SECONDS = 20.0
+# A daemon that stopped answering is left alone this long
+RETRY_SECONDS = 30.0
+CONNECT_TIMEOUT = 0.5
+# Indexing a large project on first request takes a while
+REQUEST_TIMEOUT = 600.0
+# A count is asked for on behalf of a row on screen, a daemon slower than
+# this is given up on and the row counted in-process
+TOTALS_TIMEOUT = 10.0
+# How often a request waiting for its reply looks at its cancel event
+CANCEL_POLL_SECONDS = 0.1
+MAX_MESSAGE_BYTES = 1 << 31
+
+# Wire format: every message is a uint32 big-endian length and one value.
+# A value is a one byte tag and its data: N none, T/F booleans, i int64,
+# d float64, s utf-8 string and b bytes (uint32 length first), l list and
+# m map (uint32 item count first). Arrays of the project index go over as
+# bytes in the machine's own byte order, both ends are on one host
+HEADER = struct.Struct('>I')
+INT = struct.Struct('>q')
+FLOAT = struct.Struct('>d')
+
+
+def default_socket_path():
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime_dir:
+        return os.path.join(runtime_dir, SOCKET_NAME)
+    return os.path.join(tempfile.gettempdir(),
+                        f"usdbrowser-indexd-{getpass.getuser()}.sock")
+
+
+def default_cache_path(pref_dir=None):
+    return os.path.join(os.path.dirname(scancache.default_cache_path(
+        pref_dir)), CACHE_FILE)
+
+
+# Wire format
+def encode(value, out):
+    if value is None:
+        out += b'N'
+    elif value is True:
+        out += b'T'
+    elif value is False:
+        out += b'F'
+    elif isinstance(value, int):
+        out += b'i'
+        out += INT.pack(value)
+    elif isinstance(value, float):
+        out += b'd'
+        out += FLOAT.pack(value)
+    elif isinstance(value, str):
+        data = value.encode('utf-8', 'surrogateescape')
+        out += b's'
+        out += HEADER.pack(len(data))
+        out += data
+    elif isinstance(value, (bytes, bytearray, memoryview)):
+        out += b'b'
+        out += HEADER.pack(len(value))
+        out += value
+    elif isinstance(value, (list, tuple)):
+        out += b'l'
+        out += HEADER.pack(len(value))
+        for item in value:
+            encode(item, out)
+    elif isinstance(value, dict):
+        out += b'm'
+        out += HEADER.pack(len(value))
+        for key, item in value.items():
+            encode(key, out)
+            encode(item, out)
+    else:
+        raise ValueError(f"can't send {type(value).__name__}")
+    return out
+
+
+def decode(data, position=0):
+    # (value, position after it)
+    tag = data[position:position + 1]
+    position += 1
+    if tag == b'N':
+        return None, position
+    if tag == b'T':
+        return True, position
+    if tag == b'F':
+        return False, position
+    if tag == b'i':
+        return INT.unpack_from(data, position)[0], position + INT.size
+    if tag == b'd':
+        return FLOAT.unpack_from(data, position)[0], position + FLOAT.size
+    if tag in (b's', b'b', b'l', b'm'):
+        size = HEADER.unpack_from(data, position)[0]
+        position += HEADER.size
+        if tag == b's':
+            end = position + size
+            return bytes(data[position:end]).decode(
+                'utf-8', 'surrogateescape'), end
+        if tag == b'b':
+            end = position + size
+            return bytes(data[position:end]), end
+        if tag == b'l':
+            items = []
+            for _ in range(size):
+                item, position = decode(data, position)
+                items.append(item)
+            return items, position
+        items = {}
+        for _ in range(size):
+            key, position = decode(data, position)
+            items[key], position = decode(data, position)
+        return items, position
+    raise ValueError(f"bad message tag {tag!r}")
+
+
+def send_message(sock, value):
+    body = encode(value, bytearray())
+    sock.sendall(HEADER.pack(len(body)))
+    sock.sendall(body)
+
+
+def recv_exact(sock, size):
+    data = bytearray(size)
+    view = memoryview(data)
+    received = 0
+    while received < size:
+        count = sock.recv_into(view[received:])
+        if not count:
+            return None
+        received += count
+    return data
+
+
+def wait_for_reply(sock, timeout, cancel=None):
+    # True once the reply starts to arrive, False when `cancel` is set
+    # first. Raises socket.timeout after `timeout` seconds
+    deadline = time.monotonic() + timeout
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise socket.timeout("indexing daemon timed out")
+        readable, _, _ = select.select(
+            [sock], [], [], min(remaining, CANCEL_POLL_SECONDS))
+        if readable:
+            return True
+        if cancel is not None and cancel.is_set():
+            return False
+
+
+def recv_message(sock):
+    # The next value, None when the other end closed the connection
+    header = recv_exact(sock, HEADER.size)
+    if header is None:
+        return None
+    size = HEADER.unpack(header)[0]
+    if size > MAX_MESSAGE_BYTES:
+        raise ValueError(f"message of {size} bytes")
+    body = recv_exact(sock, size)
+    if body is None:
+        raise ValueError("connection closed mid-message")
+    value, position = decode(body)
+    if position != size:
+        raise ValueError("trailing bytes after message")
+    return value
+
+
+# Daemon
+class IndexDaemon:
+    # The project index and per-directory counts of every project asked
+    # for, kept warm by walking each project every `warm_seconds`. Only
+    # directories whose mtime changed are listed again, see ScanCache
+    def __init__(self, cache_path=None, warm_seconds=WARM_SECONDS):
+        self.cache = scancache.ScanCache(cache_path)
+        self.warm_seconds = warm_seconds
+        # root -> complete ProjectIndex
+        self.indexes = {}
+        self.roots = set()
+        self.stopped = threading.Event()
+        self._lock = threading.Lock()
+        # root -> lock, one index build per project at a time
+        self._builds = {}
+
+    def add_project(self, root):
+        root = os.path.normpath(root)
+        with self._lock:
+            self.roots.add(root)
+            return self._builds.setdefault(root, threading.Lock())
+
+    def index(self, root):
+        root = os.path.normpath(root)
+        build = self.add_project(root)
+        with build:
+            index = self.indexes.get(root)
+            if index is None:
+                index = projectindex.ProjectIndex(root).build(self.stopped)
+                if index.complete:
+                    self.indexes[root] = index
+        return index
+
+    def totals(self, path, usage):
+        return self.cache.subtree_totals(path, self.stopped, fresh=True,
+                                         usage=usage)
+
+    def expire(self, paths):
+        # Changes a client saw before the next warm walk. None expires
+        # every directory
+        if paths is None:
+            self.cache.expire()
+            self.indexes.clear()
+            return
+        for path in paths:
+            self.cache.expire(path)
+        for root in list(self.indexes):
+            prefix = root.rstrip(os.sep) + os.sep
+            if any(path == root or path.startswith(prefix)
+                   for path in paths):
+                self.indexes.pop(root, None)
+
+    def warm(self):
+        # Warm thread: stat every directory of every project, list the
+        # changed ones and index a project again when anything changed
+        while not self.stopped.wait(self.warm_seconds):
+            for root in sorted(self.roots):
+                misses = self.cache.misses
+                self.cache.subtree_totals(root, self.stopped, usage=True)
+                self.cache.flush()
+                if self.cache.misses == misses:
+                    continue
+                # Requests keep getting the old index while this builds
+                index = projectindex.ProjectIndex(root).build(self.stopped)
+                if index.complete:
+                    self.indexes[root] = index
+
+    def handle(self, request):
+        # Reply fields of one request
+        op = request.get('op')
+        if op == 'ping':
+            return {'version': PROTOCOL_VERSION,
+                    'projects': sorted(self.roots)}
+        if op == 'index':
+            index = self.index(request['root'])
+            return {'root': index.root, 'complete': index.complete,
+                    'names': index.names, 'offsets': index.offsets.tobytes(),
+                    'parents': index.parents.tobytes(),
+                    'kinds': index.kinds.tobytes()}
+        if op == 'totals':
+            totals = self.totals(request['path'], request.get('usage'))
+            if totals is None:
+                return {'counts': None, 'usage': None}
+            counts, usage = totals
+            return {'counts': list(counts.as_tuple()),
+                    'usage': usage.as_dict() if usage is not None else None}
+        if op == 'expire':
+            self.expire(request.get('paths'))
+            return {}
+        raise ValueError(f"unknown request {op!r}")
+
+    def stop(self):
+        self.stopped.set()
+        self.cache.close()
+
+
+class RequestHandler(socketserver.BaseRequestHandler):
+    # One connection, requests are answered in order until it closes
+    def handle(self):
+        daemon = self.server.index_daemon
+        while True:
+            try:
+                request = recv_message(self.request)
+            except (OSError, ValueError):
+                return
+            if request is None:
+                return
+            try:
+                reply = {'ok': True}
+                reply.update(daemon.handle(request))
+            except (OSError, ValueError, KeyError, TypeError) as error:
+                reply = {'ok': False,
+                         'error': str(error) or type(error).__name__}
+            try:
+                send_message(self.request, reply)
+            except OSError:
+                return
+
+
+class DaemonServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+
+def is_running(socket_path):
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(CONNECT_TIMEOUT)
+            sock.connect(socket_path)
+        return True
+    except OSError:
+        return False
+
+
+def start(daemon, socket_path):
+    # Bind the socket and serve on background threads, returns the server.
+    # A socket left behind by a daemon that died is replaced
+    if os.path.exists(socket_path):
+        if is_running(socket_path):
+            raise OSError(f"a daemon already serves {socket_path}")
+        os.remove(socket_path)
+    server = DaemonServer(socket_path, RequestHandler)
+    # Only this user's sessions may ask
+    os.chmod(socket_path, 0o600)
+    server.index_daemon = daemon
+    threading.Thread(target=server.serve_forever, daemon=True,
+                     name='usdbrowser-indexd').start()
+    threading.Thread(target=daemon.warm, daemon=True,
+                     name='usdbrowser-indexd-warm').start()
+    return server
+
+
+def stop(server, socket_path):
+    server.shutdown()
+    server.server_close()
+    server.index_daemon.stop()
+    try:
+        os.remove(socket_path)
+    except OSError:
+        pass
+
+
+# Client
+class IndexClient:
+    # Connection to a running daemon, used from the scan pool threads with
+    # one socket per thread. Requests raise OSError when the daemon can't
+    # answer, callers scan in-process then. A daemon that went away is
+    # only tried again after RETRY_SECONDS
+    def __init__(self, socket_path):
+        self.socket_path = socket_path
+        self.failed_at = None
+        self._local = threading.local()
+        self._sockets = []
+        self._lock = threading.Lock()
+
+    def available(self):
+        return self.failed_at is None \
+            or time.time() - self.failed_at > RETRY_SECONDS
+
+    def _socket(self):
+        sock = getattr(self._local, 'socket', None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                sock.settimeout(CONNECT_TIMEOUT)
+                sock.connect(self.socket_path)
+            except OSError:
+                sock.close()
+                raise
+            sock.settimeout(REQUEST_TIMEOUT)
+            self._local.socket = sock
+            with self._lock:
+                self._sockets.append(sock)
+        return sock
+
+    def _drop_socket(self):
+        sock = getattr(self._local, 'socket', None)
+        self._local.socket = None
+        if sock is not None:
+            with self._lock:
+                if sock in self._sockets:
+                    self._sockets.remove(sock)
+            sock.close()
+
+    def request(self, op, timeout=REQUEST_TIMEOUT, cancel=None, **fields):
+        # The reply fields, None once `cancel` is set while waiting. The
+        # connection is dropped then, its reply would come in later
+        if not self.available():
+            raise OSError("indexing daemon not available")
+        fields['op'] = op
+        try:
+            sock = self._socket()
+            send_message(sock, fields)
+            if not wait_for_reply(sock, timeout, cancel):
+                self._drop_socket()
+                return None
+            reply = recv_message(sock)
+            if reply is None:
+                raise OSError("indexing daemon closed the connection")
+        except (OSError, ValueError) as error:
+            self._drop_socket()
+            self.failed_at = time.time()
+            raise OSError(str(error)) from error
+        self.failed_at = None
+        if not reply.get('ok'):
+            raise OSError(reply.get('error'))
+        return reply
+
+    def ping(self):
+        return self.request('ping')
+
+    def fill_index(self, index):
+        # Fill an empty ProjectIndex with the daemon's one of its root
+        reply = self.request('index', root=index.root)
+        index.names = reply['names']
+        index.lower_names = projectindex.searchable_names(index.names)
+        for name in ('offsets', 'parents', 'kinds'):
+            values = array(getattr(index, name).typecode)
+            values.frombytes(reply[name])
+            setattr(index, name, values)
+        index.complete = reply['complete']
+        return index
+
+    def subtree_totals(self, path, usage=False, cancel=None, timeout=None):
+        # (counts, DiskUsage or None) like ScanCache.subtree_totals, None
+        # once `cancel` is set. Waits TOTALS_TIMEOUT by default
+        reply = self.request(
+            'totals', TOTALS_TIMEOUT if timeout is None else timeout, cancel,
+            path=path, usage=usage)
+        if reply is None or reply['counts'] is None:
+            return None
+        usage = reply['usage']
+        return (scanner.UsdCounts(*reply['counts']),
+                scanner.DiskUsage.from_dict(usage)
+                if usage is not None else None)
+
+    def expire(self, paths=None):
+        self.request('expire', paths=list(paths) if paths is not None
+                     else None)
+
+    def close(self):
+        with self._lock:
+            sockets = self._sockets
+            self._sockets = []
+        for sock in sockets:
+            sock.close()
+
+
+def connect(socket_path=None):
+    # IndexClient of the daemon on `socket_path` (default_socket_path when
+    # empty), None when no daemon of this protocol answers there
+    if not hasattr(socket, 'AF_UNIX'):
+        return None
+    socket_path = socket_path or default_socket_path()
+    if not os.path.exists(socket_path):
+        return None
+    client = IndexClient(socket_path)
+    try:
+        if client.ping().get('version') == PROTOCOL_VERSION:
+            return client
+    except OSError:
+        pass
+    client.close()
+    return None
+
+
+# Self check
+def self_check(depth, width, files):
+    # Serve a synthetic project from a temporary socket and compare what
+    # the daemon answers with an in-process scan. Returns the mismatches
+    try:
+        from . import benchmark
+    except ImportError:
+        import benchmark
+
+    temp_dir = tempfile.mkdtemp(prefix='usdbrowser_indexd_')
+    socket_path = os.path.join(temp_dir, SOCKET_NAME)
+    root = os.path.join(temp_dir, 'project')
+    benchmark.build_tree(root, depth, width, files)
+    daemon = IndexDaemon()
+    server = start(daemon, socket_path)
+    problems = []
+    try:
+        client = connect(socket_path)
+        if client is None:
+            return ['no answer from the daemon']
+        local = projectindex.ProjectIndex(root).build()
+        remote = client.fill_index(projectindex.ProjectIndex(root))
+        if [local.path(i) for i in range(len(local))] \
+                != [remote.path(i) for i in range(len(remote))]:
+            problems.append('project index differs')
+        for path in (root, os.path.join(root, 'dir_000')):
+            expected = scancache.ScanCache().subtree_totals(path)
+            if client.subtree_totals(path, usage=True) != expected:
+                problems.append(f"totals of {path} differ")
+
+        # A change reported by a client is picked up before the next walk
+        added = os.path.join(root, 'dir_000', 'added.usda')
+        open(added, 'w').close()
+        client.expire([os.path.dirname(added)])
+        counts, _ = client.subtree_totals(root)
+        if counts.usda != scanner.count_usd_files(root).usda:
+            problems.append('expired directory not listed again')
+        client.close()
+    finally:
+        stop(server, socket_path)
+        shutil.rmtree(temp_dir, ignore_errors=True)
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Serve project indexes and usd counts to every browser '
+                    'pane and Houdini session of this user')
+    parser.add_argument('roots', nargs='*',
+                        help='projects to index and keep warm from the start')
+    parser.add_argument('--socket', help='unix socket, defaults to '
+                                         + default_socket_path())
+    parser.add_argument('--cache', help='sqlite scan cache of the daemon')
+    parser.add_argument('--warm', type=float, default=WARM_SECONDS,
+                        help='seconds between walks of each project')
+    parser.add_argument('--self-check', action='store_true',
+                        help='serve a synthetic project and compare the '
+                             'answers with an in-process scan')
+    parser.add_argument('--depth', type=int, default=3)
+    parser.add_argument('--width', type=int, default=4)
+    parser.add_argument('--files', type=int, default=6)
+    args = parser.parse_args(argv)
+
+    if args.self_check:
+        problems = self_check(args.depth, args.width, args.files)
+        for problem in problems:
+            print(problem)
+        print('ok' if not problems else 'failed')
+        return 1 if problems else 0
+
+    socket_path = args.socket or default_socket_path()
+    daemon = IndexDaemon(args.cache or default_cache_path(), args.warm)
+    server = start(daemon, socket_path)
+    # A plain kill removes the socket as well
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    print(f"serving on {socket_path}")
+    try:
+        for root in args.roots:
+            index = daemon.index(root)
+            print(f"indexed {index.root}: {len(index)} entries")
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop(server, socket_path)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
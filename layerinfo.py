@@ -0,0 +1,614 @@
+import mmap
+import os
+import re
+import struct
+from collections import OrderedDict
+
+try:
+    import lz4.block as lz4_block
+except ImportError:
+    lz4_block = None
+
+try:
+    from . import perftrace
+except ImportError:
+    import perftrace
+
+# Layer metadata sits at the top of a usda file, references are only
+# collected from this much of it
+USDA_READ_BYTES = 256 * 1024
+# Crate sections larger than this are skipped instead of read
+MAX_SECTION_BYTES = 8 * 1024 * 1024
+MAX_REFERENCE_FIELDS = 64
+MAX_PATHS = 100
+DEFAULT_CACHE_SIZE = 4096
+
+CRATE_MAGIC = b'PXR-USDC'
+USDA_MAGIC = b'#usda'
+
+# Crate value types, see crateDataTypes.h
+TYPE_DOUBLE = 9
+TYPE_STRING = 10
+TYPE_TOKEN = 11
+TYPE_ASSET_PATH = 12
+TYPE_REFERENCE_LIST_OP = 35
+TYPE_PAYLOAD = 47
+TYPE_STRING_VECTOR = 50
+TYPE_PAYLOAD_LIST_OP = 55
+
+# _ListOpHeader bits, in the order the item lists are written
+LIST_OP_ITEMS = ((1 << 1, True), (1 << 2, True), (1 << 5, True),
+                 (1 << 6, True), (1 << 3, False), (1 << 4, True))
+
+LAYER_FIELDS = ('defaultPrim', 'upAxis', 'metersPerUnit', 'startTimeCode',
+                'endTimeCode', 'startFrame', 'endFrame', 'subLayers')
+
+ASSET_PATH = re.compile(r'@@@(.*?)@@@|@([^@\n]*)@')
+TRIPLE_STRING = re.compile(r'""".*?"""|\'\'\'.*?\'\'\'', re.DOTALL)
+USDA_REFERENCES = re.compile(
+    r'^\s*(?:(prepend|append|add|delete|reorder)\s+)?references\s*=\s*'
+    r'(\[.*?\]|None|@@@.*?@@@|@[^@\n]*@)', re.MULTILINE | re.DOTALL)
+# Composition arcs for dependency scans, see read_layer_arcs
+ARC_SUBLAYER = 'subLayer'
+ARC_REFERENCE = 'reference'
+ARC_PAYLOAD = 'payload'
+USDA_ARCS = re.compile(
+    rb'^\s*(?:(prepend|append|add|delete|reorder)\s+)?(references|payload)'
+    rb'\s*=\s*(\[.*?\]|None|@@@.*?@@@|@[^@\n]*@)', re.MULTILINE | re.DOTALL)
+ASSET_PATH_BYTES = re.compile(rb'@@@(.*?)@@@|@([^@\n]*)@')
+# Dependency scans read the whole layer, sections up to this size
+MAX_ARC_SECTION_BYTES = 512 * 1024 * 1024
+MAX_ARC_PATHS = 100000
+# assetInfo thumbnails, see the UsdMedia asset thumbnail convention
+USDA_THUMBNAIL = re.compile(
+    r'\bdefaultImage\s*=\s*(?:@@@(.*?)@@@|@([^@\n]*)@)')
+THUMBNAIL_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+
+class LayerInfo:
+    __slots__ = ('format', 'version', 'default_prim', 'up_axis',
+                 'meters_per_unit', 'start_time', 'end_time', 'sublayers',
+                 'references', 'thumbnail', 'truncated', 'error')
+
+    def __init__(self, format=None, version=None):
+        self.format = format
+        self.version = version
+        self.default_prim = None
+        self.up_axis = None
+        self.meters_per_unit = None
+        self.start_time = None
+        self.end_time = None
+        self.sublayers = []
+        self.references = []
+        # Asset path of the defaultImage thumbnail in assetInfo
+        self.thumbnail = None
+        # Part of the file was not read, references may be missing
+        self.truncated = False
+        self.error = None
+
+    def add_reference(self, asset_path):
+        if asset_path and asset_path not in self.references \
+                and len(self.references) < MAX_PATHS:
+            self.references.append(asset_path)
+
+    def describe(self):
+        # Multi-line summary for tooltips
+        if self.error:
+            return self.error
+        lines = [f"{self.format} {self.version}"]
+        if self.default_prim:
+            lines.append(f"defaultPrim: {self.default_prim}")
+        if self.up_axis:
+            lines.append(f"upAxis: {self.up_axis}")
+        if self.meters_per_unit is not None:
+            lines.append(f"metersPerUnit: {self.meters_per_unit:g}")
+        if self.start_time is not None or self.end_time is not None:
+            lines.append(f"time: {format_time(self.start_time)} - "
+                         f"{format_time(self.end_time)}")
+        for label, paths in (('subLayers', self.sublayers),
+                             ('references', self.references)):
+            if paths:
+                lines.append(f"{label}:")
+                lines.extend('    ' + path for path in paths[:10])
+                if len(paths) > 10:
+                    lines.append(f"    (+{len(paths) - 10} more)")
+        if self.truncated:
+            lines.append("(partially read)")
+        return '\n'.join(lines)
+
+
+def format_time(value):
+    return '?' if value is None else f"{value:g}"
+
+
+def read_layer_info(path):
+    try:
+        with open(path, 'rb') as f:
+            magic = f.read(8)
+            perftrace.count('open', files=1, bytes_read=len(magic))
+            if magic.startswith(CRATE_MAGIC):
+                return read_crate(f)
+            if magic.startswith(USDA_MAGIC):
+                f.seek(0)
+                data = f.read(USDA_READ_BYTES)
+                perftrace.count('read', bytes_read=len(data))
+                return read_usda(data, USDA_READ_BYTES)
+    except (OSError, ValueError, IndexError, struct.error) as error:
+        info = LayerInfo()
+        info.error = f"Can't read layer: {error}"
+        return info
+    info = LayerInfo()
+    info.error = "Empty file" if not magic else "Not a usda or usdc layer"
+    return info
+
+
+# usda
+
+def read_usda(data, limit):
+    text = data.decode('utf-8', 'replace')
+    header, _, _ = text.partition('\n')
+    info = LayerInfo('usda', header[len('#usda'):].strip())
+    info.truncated = len(data) >= limit
+    end = metadata_end(text, len(header))
+    if end is not None:
+        parse_usda_metadata(info, text[len(header):end])
+    for match in USDA_REFERENCES.finditer(text, end or 0):
+        if match.group(1) == 'delete':
+            continue
+        for asset in ASSET_PATH.finditer(match.group(2)):
+            info.add_reference(asset.group(1) or asset.group(2))
+    match = USDA_THUMBNAIL.search(text)
+    if match:
+        info.thumbnail = match.group(1) or match.group(2)
+    return info
+
+
+def metadata_end(text, start):
+    # End of the parenthesised layer metadata block after the header,
+    # skipping over strings and comments
+    i = start
+    length = len(text)
+    while i < length and (text[i].isspace() or text[i] == '#'):
+        if text[i] == '#':
+            i = text.find('\n', i)
+            if i == -1:
+                return None
+        i += 1
+    if i >= length or text[i] != '(':
+        return None
+    depth = 0
+    while i < length:
+        char = text[i]
+        if text.startswith('"""', i) or text.startswith("'''", i):
+            i = text.find(text[i:i + 3], i + 3)
+            if i == -1:
+                return None
+            i += 3
+            continue
+        if char in '"\'':
+            i += 1
+            while i < length and text[i] != char:
+                i += 2 if text[i] == '\\' else 1
+        elif char == '@':
+            close = '@@@' if text.startswith('@@@', i) else '@'
+            i = text.find(close, i + len(close))
+            if i == -1:
+                return None
+            i += len(close) - 1
+        elif char == '#':
+            i = text.find('\n', i)
+            if i == -1:
+                return None
+        elif char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+            if depth == 0:
+                return i + 1
+        i += 1
+    return None
+
+
+def parse_usda_metadata(info, block):
+    block = TRIPLE_STRING.sub('""', block)
+    match = re.search(r'\bdefaultPrim\s*=\s*"([^"]*)"', block)
+    if match:
+        info.default_prim = match.group(1)
+    match = re.search(r'\bupAxis\s*=\s*"([^"]*)"', block)
+    if match:
+        info.up_axis = match.group(1)
+    info.meters_per_unit = usda_number(block, 'metersPerUnit')
+    info.start_time = usda_number(block, 'startTimeCode')
+    if info.start_time is None:
+        info.start_time = usda_number(block, 'startFrame')
+    info.end_time = usda_number(block, 'endTimeCode')
+    if info.end_time is None:
+        info.end_time = usda_number(block, 'endFrame')
+    match = re.search(r'\bsubLayers\s*=\s*\[(.*?)\]', block, re.DOTALL)
+    if match:
+        for asset in ASSET_PATH.finditer(match.group(1)):
+            info.sublayers.append(asset.group(1) or asset.group(2))
+
+
+def usda_number(block, key):
+    match = re.search(r'\b' + key + r'\s*=\s*([-+0-9.eE]+|inf|-inf)', block)
+    if match:
+        try:
+            return float(match.group(1))
+        except ValueError:
+            pass
+    return None
+
+
+# usdc
+
+def lz4_decompress(data, size):
+    if lz4_block is not None:
+        return lz4_block.decompress(data, uncompressed_size=size)
+    # Plain LZ4 block format
+    out = bytearray()
+    i = 0
+    end = len(data)
+    while i < end:
+        token = data[i]
+        i += 1
+        length = token >> 4
+        if length == 15:
+            while True:
+                byte = data[i]
+                i += 1
+                length += byte
+                if byte != 255:
+                    break
+        out += data[i:i + length]
+        i += length
+        if i >= end:
+            break
+        offset = data[i] | data[i + 1] << 8
+        i += 2
+        length = token & 15
+        if length == 15:
+            while True:
+                byte = data[i]
+                i += 1
+                length += byte
+                if byte != 255:
+                    break
+        length += 4
+        start = len(out) - offset
+        if start < 0 or offset == 0:
+            raise ValueError("corrupt lz4 block")
+        if offset >= length:
+            out += out[start:start + length]
+        else:
+            out += (out[start:] * (length // offset + 1))[:length]
+    return bytes(out)
+
+
+def fast_decompress(data, size):
+    # TfFastCompression: a chunk count byte, then one block when it is 0,
+    # otherwise that many int32 size-prefixed blocks
+    chunks = data[0]
+    if chunks == 0:
+        return lz4_decompress(data[1:], size)
+    out = bytearray()
+    position = 1
+    for _ in range(chunks):
+        chunk_size, = struct.unpack_from('<i', data, position)
+        position += 4
+        out += lz4_decompress(data[position:position + chunk_size],
+                              size - len(out))
+        position += chunk_size
+    return bytes(out)
+
+
+def decode_ints(data, count):
+    # Sdf_IntegerCompression: a common delta, 2-bit codes per value
+    # (common, int8, int16, int32 delta), then the deltas themselves
+    common, = struct.unpack_from('<i', data, 0)
+    position = 4 + (count * 2 + 7) // 8
+    values = []
+    previous = 0
+    for i in range(count):
+        code = (data[4 + i // 4] >> (2 * (i % 4))) & 3
+        if code == 0:
+            delta = common
+        elif code == 1:
+            delta, = struct.unpack_from('<b', data, position)
+            position += 1
+        elif code == 2:
+            delta, = struct.unpack_from('<h', data, position)
+            position += 2
+        else:
+            delta, = struct.unpack_from('<i', data, position)
+            position += 4
+        previous += delta
+        values.append(previous & 0xFFFFFFFF)
+    return values
+
+
+class CrateReader:
+    # Reads only the crate sections layer metadata needs: the table of
+    # contents, tokens, strings and fields. Specs, paths and value data
+    # are never loaded, single values are read with small seeks
+    def __init__(self, f, max_section=MAX_SECTION_BYTES, max_paths=MAX_PATHS):
+        self.f = f
+        self.max_section = max_section
+        self.max_paths = max_paths
+        self.version = None
+        self.tokens = []
+        self.strings = []
+        self.fields = []
+        self.truncated = False
+
+    def read_at(self, offset, size):
+        self.f.seek(offset)
+        data = self.f.read(size)
+        perftrace.count('read', bytes_read=len(data))
+        if len(data) != size:
+            raise ValueError("unexpected end of file")
+        return data
+
+    def read_header(self):
+        header = self.read_at(0, 24)
+        if not header.startswith(CRATE_MAGIC):
+            raise ValueError("not a crate file")
+        version = self.version = tuple(header[8:11])
+        toc_offset, = struct.unpack_from('<q', header, 16)
+        count, = struct.unpack('<Q', self.read_at(toc_offset, 8))
+        sections = {}
+        table = self.read_at(toc_offset + 8, count * 32)
+        for i in range(count):
+            name, start, size = struct.unpack_from('<16sqq', table, i * 32)
+            sections[name.rstrip(b'\0').decode('ascii')] = (start, size)
+        return version, sections
+
+    def section(self, sections, name):
+        start, size = sections.get(name, (0, 0))
+        if not size:
+            return None
+        if size > self.max_section:
+            self.truncated = True
+            return None
+        return self.read_at(start, size)
+
+    def read_tokens(self, data):
+        count, size, compressed = struct.unpack_from('<QQQ', data, 0)
+        raw = fast_decompress(data[24:24 + compressed], size)
+        self.tokens = raw.decode('utf-8', 'replace').split('\0')[:count]
+
+    def read_strings(self, data):
+        count, = struct.unpack_from('<Q', data, 0)
+        self.strings = list(struct.unpack_from(f'<{count}I', data, 8))
+
+    def read_fields(self, data):
+        count, size = struct.unpack_from('<QQ', data, 0)
+        position = 16
+        working = fast_decompress(data[position:position + size],
+                                  count * 4 + (count * 2 + 7) // 8 + 4)
+        token_indices = decode_ints(working, count)
+        position += size
+        reps_size, = struct.unpack_from('<Q', data, position)
+        position += 8
+        reps = fast_decompress(data[position:position + reps_size], count * 8)
+        self.fields = list(zip(token_indices, struct.unpack(f'<{count}Q',
+                                                            reps)))
+
+    def token(self, index):
+        return self.tokens[index] if index < len(self.tokens) else None
+
+    def string(self, index):
+        if index < len(self.strings):
+            return self.token(self.strings[index])
+        return None
+
+    def value(self, rep):
+        # Value of a ValueRep for the few scalar types layer metadata uses
+        kind = (rep >> 48) & 0xFF
+        inlined = rep & (1 << 62)
+        payload = rep & ((1 << 48) - 1)
+        if kind == TYPE_TOKEN or kind == TYPE_ASSET_PATH:
+            return self.token(payload) if inlined else None
+        if kind == TYPE_STRING:
+            return self.string(payload) if inlined else None
+        if kind == TYPE_DOUBLE:
+            if inlined:
+                # Doubles that survive a round trip through float are
+                # stored inline as float bits
+                return struct.unpack('<f', struct.pack('<I',
+                                                       payload & 0xFFFFFFFF))[0]
+            return struct.unpack('<d', self.read_at(payload, 8))[0]
+        if kind == TYPE_STRING_VECTOR and not inlined:
+            count, = struct.unpack('<Q', self.read_at(payload, 8))
+            count = min(count, self.max_paths)
+            indices = struct.unpack(f'<{count}I',
+                                    self.read_at(payload + 8, count * 4))
+            return [self.string(index) for index in indices]
+        return None
+
+    def reference_paths(self, rep):
+        # Asset paths of a SdfReferenceListOp, deleted items are skipped.
+        # A reference carrying customData has a variable size, reading
+        # stops there
+        if (rep >> 48) & 0xFF != TYPE_REFERENCE_LIST_OP or rep & (1 << 62):
+            return []
+        return self.list_op_paths(rep & ((1 << 48) - 1), 32, True)
+
+    def payload_paths(self, rep):
+        # Asset paths of a payload list op, or of a single payload in
+        # files older than 0.8.0. Payloads gained a layer offset in 0.8.0
+        kind = (rep >> 48) & 0xFF
+        if rep & (1 << 62):
+            return []
+        item_size = 24 if self.version >= (0, 8, 0) else 8
+        offset = rep & ((1 << 48) - 1)
+        if kind == TYPE_PAYLOAD:
+            string_index, = struct.unpack('<I', self.read_at(offset, 4))
+            return [self.string(string_index)]
+        if kind == TYPE_PAYLOAD_LIST_OP:
+            return self.list_op_paths(offset, item_size, False)
+        return []
+
+    def list_op_paths(self, offset, item_size, custom_data):
+        header = self.read_at(offset, 1)[0]
+        offset += 1
+        paths = []
+        for bit, keep in LIST_OP_ITEMS:
+            if not header & bit:
+                continue
+            count, = struct.unpack('<Q', self.read_at(offset, 8))
+            offset += 8
+            for _ in range(min(count, self.max_paths)):
+                item = self.read_at(offset, item_size)
+                offset += item_size
+                string_index, = struct.unpack_from('<I', item, 0)
+                if keep:
+                    paths.append(self.string(string_index))
+                if custom_data and struct.unpack_from('<Q', item, 24)[0]:
+                    self.truncated = True
+                    return paths
+            if count > self.max_paths:
+                self.truncated = True
+                return paths
+        return paths
+
+
+def read_crate(f):
+    reader = CrateReader(f)
+    version, sections = reader.read_header()
+    info = LayerInfo('usdc', '.'.join(str(part) for part in version))
+    if version < (0, 4, 0):
+        info.error = f"usdc {info.version} is too old to read"
+        return info
+    for name, read in (('TOKENS', reader.read_tokens),
+                       ('STRINGS', reader.read_strings),
+                       ('FIELDS', reader.read_fields)):
+        data = reader.section(sections, name)
+        if data is None:
+            info.truncated = True
+            return info
+        read(data)
+        if name == 'TOKENS':
+            info.thumbnail = crate_thumbnail(reader.tokens)
+
+    # Fields are unique (name, value) pairs. Layer metadata names only
+    # occur on the pseudo-root, so no spec or path has to be decoded
+    values = {}
+    reference_fields = 0
+    for token_index, rep in reader.fields:
+        name = reader.token(token_index)
+        if name in LAYER_FIELDS:
+            values[name] = reader.value(rep)
+        elif name == 'references':
+            reference_fields += 1
+            if reference_fields > MAX_REFERENCE_FIELDS:
+                info.truncated = True
+                continue
+            for path in reader.reference_paths(rep):
+                info.add_reference(path)
+
+    info.default_prim = values.get('defaultPrim')
+    info.up_axis = values.get('upAxis')
+    info.meters_per_unit = values.get('metersPerUnit')
+    info.start_time = values.get('startTimeCode', values.get('startFrame'))
+    info.end_time = values.get('endTimeCode', values.get('endFrame'))
+    info.sublayers = values.get('subLayers') or []
+    info.truncated = info.truncated or reader.truncated
+    return info
+
+
+def read_layer_arcs(path):
+    # [(arc, asset path), ...] for every sublayer, reference and payload
+    # of a layer, read from the whole file. Deleted list op items are left
+    # out. Raises OSError/ValueError for unreadable layers
+    with open(path, 'rb') as f:
+        magic = f.read(8)
+        perftrace.count('open', files=1, bytes_read=len(magic))
+        if magic.startswith(CRATE_MAGIC):
+            return read_crate_arcs(f)
+        if not magic.startswith(USDA_MAGIC):
+            raise ValueError("not a usda or usdc layer")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            perftrace.count('read', bytes_read=len(data))
+            return read_usda_arcs(data)
+
+
+def read_usda_arcs(data):
+    info = read_usda(data[:USDA_READ_BYTES], USDA_READ_BYTES)
+    arcs = [(ARC_SUBLAYER, path) for path in info.sublayers]
+    for match in USDA_ARCS.finditer(data):
+        if match.group(1) == b'delete':
+            continue
+        arc = ARC_REFERENCE if match.group(2) == b'references' \
+            else ARC_PAYLOAD
+        for asset in ASSET_PATH_BYTES.finditer(match.group(3)):
+            path = asset.group(1) if asset.group(1) is not None \
+                else asset.group(2)
+            arcs.append((arc, path.decode('utf-8', 'replace')))
+    return arcs
+
+
+def read_crate_arcs(f):
+    reader = CrateReader(f, MAX_ARC_SECTION_BYTES, MAX_ARC_PATHS)
+    version, sections = reader.read_header()
+    if version < (0, 4, 0):
+        raise ValueError(f"usdc {'.'.join(map(str, version))} is too old")
+    for name, read in (('TOKENS', reader.read_tokens),
+                       ('STRINGS', reader.read_strings),
+                       ('FIELDS', reader.read_fields)):
+        data = reader.section(sections, name)
+        if data is None:
+            return []
+        read(data)
+    arcs = []
+    for token_index, rep in reader.fields:
+        name = reader.token(token_index)
+        if name == 'subLayers':
+            arcs.extend((ARC_SUBLAYER, path)
+                        for path in reader.value(rep) or ())
+        elif name == 'references':
+            arcs.extend((ARC_REFERENCE, path)
+                        for path in reader.reference_paths(rep))
+        elif name == 'payload':
+            arcs.extend((ARC_PAYLOAD, path)
+                        for path in reader.payload_paths(rep))
+    return [(arc, path) for arc, path in arcs if path]
+
+
+def crate_thumbnail(tokens):
+    # Dictionary keys and asset paths are both tokens, a layer carrying a
+    # defaultImage key has its image path among them
+    if 'defaultImage' not in tokens:
+        return None
+    for token in tokens:
+        if token.lower().endswith(THUMBNAIL_EXTENSIONS):
+            return token
+    return None
+
+
+class LayerInfoCache:
+    # LayerInfo per file, reused while the file keeps its mtime and size
+    def __init__(self, max_entries=DEFAULT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+
+    def get(self, path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            self.entries.pop(path, None)
+            return None
+        key = (stat.st_mtime_ns, stat.st_size)
+        cached = self.entries.get(path)
+        if cached is not None and cached[0] == key:
+            self.entries.move_to_end(path)
+            return cached[1]
+        info = read_layer_info(path)
+        self.entries[path] = (key, info)
+        self.entries.move_to_end(path)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return info
+
+    def clear(self):
+        self.entries.clear()
@@ -0,0 +1,405 @@
+import os
+import time
+
+from PySide2 import QtCore, QtGui, QtWidgets
+
+try:
+    from . import browsercore, layerinfo, perftrace, sequences
+except ImportError:
+    import browsercore
+    import layerinfo
+    import perftrace
+    import sequences
+
+USD_COLORS = (('.usd', '#36C3F1'), ('.usda', '#1F8ECD'), ('.usdc', '#5DAADA'))
+PENDING_COLOR = '#6E6E6E'
+USAGE_COLOR = '#C5C5C5'
+SEPARATOR_COLOR = (128, 128, 128)
+
+EntryRole = QtCore.Qt.UserRole + 1
+CountsRole = QtCore.Qt.UserRole + 2
+UsageRole = QtCore.Qt.UserRole + 3
+# What the optional usage column shows
+USAGE_SIZE = 'size'
+USAGE_MTIME = 'mtime'
+# Extensions listed in a directory tooltip
+TOOLTIP_EXTENSIONS = 5
+# Frames of an expanded sequence are indented under it
+MEMBER_INDENT = '    '
+
+
+def usd_color(name):
+    for extension, color in USD_COLORS:
+        if name.endswith(extension):
+            return color
+    return None
+
+
+def format_mtime(mtime_ns, today_as_time=False):
+    if not mtime_ns:
+        return ''
+    local = time.localtime(mtime_ns / 1e9)
+    if today_as_time and local[:3] == time.localtime()[:3]:
+        return time.strftime('%H:%M', local)
+    return time.strftime('%Y-%m-%d', local)
+
+
+def usage_tooltip(usage):
+    lines = [f"{perftrace.format_bytes(usage.bytes)} in {usage.files} files,"
+             f" last change {format_mtime(usage.newest_mtime_ns)}"]
+    lines.extend(f"    {extension or '(no extension)'}  "
+                 f"{perftrace.format_bytes(size)}"
+                 for extension, size
+                 in usage.largest_extensions(TOOLTIP_EXTENSIONS))
+    return '\n'.join(lines)
+
+
+def is_sequence(entry):
+    return isinstance(entry, sequences.FileSequence)
+
+
+def layer_path(entry):
+    # The file standing for a row: a sequence is read from its first frame
+    return entry.members[0].path if is_sequence(entry) else entry.path
+
+
+def entry_tooltip(entry, layer_info, dependencies=None):
+    # Path, layer metadata and, once the project is analysed, what the
+    # layer depends on and what uses it (see depgraph). Directories show
+    # their disk usage by extension once it is known, sequences their
+    # frame range, gaps and size
+    if entry.is_dir:
+        if entry.usage is not None:
+            return entry.path + '\n\n' + usage_tooltip(entry.usage)
+        return entry.path
+    if is_sequence(entry):
+        parts = [entry.describe()]
+        if entry.usage is not None:
+            parts.append(usage_tooltip(entry.usage))
+        info = layer_info.get(layer_path(entry))
+        if info is not None:
+            parts.append(info.describe())
+        return '\n\n'.join(parts)
+    parts = [entry.path]
+    info = layer_info.get(entry.path)
+    if info is not None:
+        parts.append(info.describe())
+    if dependencies is not None:
+        described = dependencies.describe(entry.path)
+        if described:
+            parts.append(described)
+    return '\n\n'.join(parts)
+
+
+class SceneListModel(QtCore.QAbstractListModel):
+    # Rows are scanner.ScanEntry objects, None marks the separator
+    # between directories and usd files. A sequences.FileSequence row is
+    # followed by the entries of its frames while it is expanded
+    def __init__(self, parent=None):
+        super(SceneListModel, self).__init__(parent)
+        self.rows = []
+        self.row_of = {}
+        self.brushes = {color: QtGui.QBrush(QtGui.QColor(color))
+                        for _, color in USD_COLORS}
+        # The full listing, and the part of it the filter lets through
+        self.dir_entries = []
+        self.file_entries = []
+        self.shown_dirs = []
+        self.shown_files = []
+        self.filter_text = ''
+        # Layer metadata for file tooltips, read when first hovered
+        self.layer_info = layerinfo.LayerInfoCache()
+        # Optional depgraph.DependencyGraph of the project for tooltips
+        self.dependencies = None
+        # Optional thumbnails.ThumbnailProvider for the file icons
+        self.thumbnails = None
+        self.placeholder = None
+        # Paths of the expanded sequences, kept across listings
+        self.expanded = set()
+        self.members = set()
+        # First frame path -> sequence name, for thumbnails
+        self.sequence_of = {}
+
+    def set_thumbnails(self, provider, size):
+        # Files without a thumbnail (yet) keep an empty icon of the same
+        # size so names stay aligned
+        self.thumbnails = provider
+        provider.listeners.append(self.thumbnail_ready)
+        pixmap = QtGui.QPixmap(size, size)
+        pixmap.fill(QtCore.Qt.transparent)
+        self.placeholder = QtGui.QIcon(pixmap)
+
+    def thumbnail_ready(self, path):
+        for name in (os.path.basename(path), self.sequence_of.get(path)):
+            index = self.index_of(name)
+            if index.isValid() and layer_path(self.rows[index.row()]) == path:
+                self.dataChanged.emit(index, index,
+                                      [QtCore.Qt.DecorationRole])
+
+    def set_entries(self, dir_entries, file_entries):
+        self.dir_entries = list(dir_entries)
+        self.file_entries = list(file_entries)
+        self.filter_text = ''
+        self.show_rows(self.dir_entries, self.file_entries)
+
+    def update_entries(self, dir_entries, file_entries):
+        # A fresh listing of the same directory, the filter is kept
+        text = self.filter_text
+        self.dir_entries = list(dir_entries)
+        self.file_entries = list(file_entries)
+        if text is not None:
+            self.filter_text = ''
+            self.set_filter(text)
+
+    def show_results(self, dir_entries, file_entries):
+        # Rows that are not part of the listing, e.g. project-wide search.
+        # The next set_filter starts again from the full listing
+        self.filter_text = None
+        self.show_rows(list(dir_entries), list(file_entries))
+
+    def set_filter(self, text):
+        # Case-insensitive substring filter over the loaded listing. When
+        # the new text contains the previous one only the rows still shown
+        # can match, so the search narrows instead of starting over
+        text = text.lower()
+        if browsercore.narrows(self.filter_text, text):
+            dir_entries = self.shown_dirs
+            file_entries = self.shown_files
+        else:
+            dir_entries = self.dir_entries
+            file_entries = self.file_entries
+        self.filter_text = text
+        self.show_rows(browsercore.filter_entries(dir_entries, text),
+                       browsercore.filter_entries(file_entries, text))
+
+    def show_rows(self, dir_entries, file_entries):
+        self.beginResetModel()
+        self.shown_dirs = dir_entries
+        self.shown_files = file_entries
+        self.rows = list(dir_entries)
+        if dir_entries and file_entries:
+            self.rows.append(None)
+        self.members = set()
+        self.sequence_of = {}
+        for entry in file_entries:
+            self.rows.append(entry)
+            if is_sequence(entry):
+                self.sequence_of[entry.members[0].path] = entry.name
+                if entry.path in self.expanded:
+                    self.rows.extend(entry.members)
+                    self.members.update(entry.members)
+        self.row_of = {entry.name: row for row, entry
+                       in enumerate(self.rows) if entry is not None}
+        self.endResetModel()
+
+    def toggle_sequence(self, entry):
+        # Show or hide the frames of a sequence row below it
+        if entry.path in self.expanded:
+            self.expanded.discard(entry.path)
+        else:
+            self.expanded.add(entry.path)
+        self.show_rows(self.shown_dirs, self.shown_files)
+
+    def clear(self):
+        self.set_entries([], [])
+
+    def entry(self, index):
+        if not index.isValid() or index.row() >= len(self.rows):
+            return None
+        return self.rows[index.row()]
+
+    def index_of(self, name):
+        row = self.row_of.get(name)
+        if row is None:
+            return QtCore.QModelIndex()
+        return self.index(row)
+
+    def counts_changed(self, name):
+        index = self.index_of(name)
+        if index.isValid():
+            self.dataChanged.emit(index, index, [CountsRole, UsageRole])
+
+    def tooltip(self, entry):
+        return entry_tooltip(entry, self.layer_info, self.dependencies)
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.rows)
+
+    def flags(self, index):
+        if self.entry(index) is None:
+            return QtCore.Qt.NoItemFlags
+        return QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        entry = self.entry(index)
+        if entry is None:
+            return None
+        if role == QtCore.Qt.DisplayRole:
+            if entry in self.members:
+                return MEMBER_INDENT + entry.name
+            return entry.name
+        if role == QtCore.Qt.ForegroundRole and not entry.is_dir:
+            return self.brushes.get(usd_color(entry.name))
+        if role == QtCore.Qt.ToolTipRole:
+            return self.tooltip(entry)
+        if role == QtCore.Qt.DecorationRole and not entry.is_dir \
+                and self.thumbnails is not None:
+            return self.thumbnails.icon(layer_path(entry)) \
+                or self.placeholder
+        if role == EntryRole:
+            return entry
+        if role == CountsRole:
+            return entry.counts
+        if role == UsageRole:
+            return entry.usage
+        return None
+
+
+class SceneItemDelegate(QtWidgets.QStyledItemDelegate):
+    # Paints the name and the three colored usd counts of a row directly,
+    # only rows inside the viewport are ever painted. With `usage_mode`
+    # set a size or last-change column goes left of the counts
+    def __init__(self, parent=None):
+        super(SceneItemDelegate, self).__init__(parent)
+        self.digit_font = QtGui.QFont("Consolas", 12)
+        self.digit_metrics = QtGui.QFontMetrics(self.digit_font)
+        self.column_width = self.digit_metrics.horizontalAdvance('(0000)')
+        self.column_gap = self.digit_metrics.horizontalAdvance(' ' * 2)
+        self.usage_mode = None
+        self.usage_width = max(
+            self.digit_metrics.horizontalAdvance('1023.9 MB'),
+            self.digit_metrics.horizontalAdvance('0000-00-00'))
+        self.count_colors = [QtGui.QColor(color) for _, color in USD_COLORS]
+        self.pending_color = QtGui.QColor(PENDING_COLOR)
+        self.usage_color = QtGui.QColor(USAGE_COLOR)
+        self.separator_color = QtGui.QColor(*SEPARATOR_COLOR)
+
+    def sizeHint(self, option, index):
+        if index.data(EntryRole) is None:
+            return QtCore.QSize(0, 20)
+        size = super(SceneItemDelegate, self).sizeHint(option, index)
+        # Directory rows as tall as file rows with a thumbnail
+        size.setHeight(max(size.height(), option.decorationSize.height()))
+        return size
+
+    def paint(self, painter, option, index):
+        entry = index.data(EntryRole)
+        if entry is None:
+            self.paint_separator(painter, option)
+            return
+
+        opt = QtWidgets.QStyleOptionViewItem(option)
+        self.initStyleOption(opt, index)
+        text = opt.text
+        opt.text = ''
+        widget = opt.widget
+        style = widget.style() if widget else QtWidgets.QApplication.style()
+        style.drawControl(QtWidgets.QStyle.CE_ItemViewItem, opt, painter,
+                          widget)
+
+        text_rect = style.subElementRect(
+            QtWidgets.QStyle.SE_ItemViewItemText, opt, widget)
+        columns_right = opt.rect.right()
+        sequence = is_sequence(entry)
+        if entry.is_dir:
+            columns_right -= self.counts_width()
+        elif sequence:
+            summary = f"{entry.frame_range()} [{len(entry.members)}]"
+            summary_width = min(
+                max(self.digit_metrics.horizontalAdvance(summary)
+                    + self.column_gap, self.counts_width()),
+                opt.rect.width() // 2)
+            columns_right -= summary_width + self.column_gap
+        text_right = columns_right
+        if self.usage_mode is not None:
+            text_right -= self.usage_width + self.column_gap
+        if text_right < opt.rect.right():
+            text_rect.setRight(min(text_rect.right(), text_right))
+
+        painter.save()
+        if opt.state & QtWidgets.QStyle.State_Selected:
+            painter.setPen(opt.palette.color(QtGui.QPalette.HighlightedText))
+        else:
+            foreground = index.data(QtCore.Qt.ForegroundRole)
+            if foreground is not None:
+                painter.setPen(foreground.color())
+            else:
+                painter.setPen(opt.palette.color(QtGui.QPalette.Text))
+        painter.setFont(opt.font)
+        elided = opt.fontMetrics.elidedText(text, QtCore.Qt.ElideRight,
+                                            text_rect.width())
+        painter.drawText(text_rect,
+                         QtCore.Qt.AlignLeft | QtCore.Qt.AlignVCenter,
+                         elided)
+        if entry.is_dir:
+            self.paint_counts(painter, opt.rect, entry.counts)
+        elif sequence:
+            self.paint_sequence(painter, opt.rect, summary, summary_width)
+        if self.usage_mode is not None:
+            self.paint_usage(painter, opt.rect, columns_right, entry)
+        painter.restore()
+
+    def paint_sequence(self, painter, rect, summary, width):
+        # Frame range, gaps and number of files where directories show
+        # their counts
+        painter.setFont(self.digit_font)
+        painter.setPen(self.usage_color)
+        cell = QtCore.QRect(rect.right() - self.column_gap - width,
+                            rect.top(), width, rect.height())
+        text = self.digit_metrics.elidedText(summary, QtCore.Qt.ElideLeft,
+                                             cell.width())
+        painter.drawText(cell, QtCore.Qt.AlignRight | QtCore.Qt.AlignVCenter,
+                         text)
+
+    def paint_usage(self, painter, rect, right, entry):
+        painter.setFont(self.digit_font)
+        usage = entry.usage
+        cell = QtCore.QRect(right - self.column_gap - self.usage_width,
+                            rect.top(), self.usage_width, rect.height())
+        if usage is None:
+            if not entry.is_dir:
+                return
+            painter.setPen(self.pending_color)
+            text = '·'
+        else:
+            painter.setPen(self.usage_color)
+            if self.usage_mode == USAGE_MTIME:
+                text = format_mtime(usage.newest_mtime_ns, True)
+            else:
+                text = perftrace.format_bytes(usage.bytes)
+        painter.drawText(cell, QtCore.Qt.AlignRight | QtCore.Qt.AlignVCenter,
+                         text)
+
+    def counts_width(self):
+        return 3 * self.column_width + 3 * self.column_gap
+
+    def paint_counts(self, painter, rect, counts):
+        painter.setFont(self.digit_font)
+        right = rect.right() - self.column_gap
+        values = counts.as_tuple() if counts is not None else (None,) * 3
+        for column in (2, 1, 0):
+            cell = QtCore.QRect(right - self.column_width, rect.top(),
+                                self.column_width, rect.height())
+            right -= self.column_width + self.column_gap
+            value = values[column]
+            if value == 0:
+                continue
+            if value is None:
+                painter.setPen(self.pending_color)
+                text = '·'
+            else:
+                painter.setPen(self.count_colors[column])
+                text = f"({value})"
+            painter.drawText(cell,
+                             QtCore.Qt.AlignRight | QtCore.Qt.AlignVCenter,
+                             text)
+
+    def paint_separator(self, painter, option):
+        painter.save()
+        painter.setPen(self.separator_color)
+        y = option.rect.center().y()
+        painter.drawLine(option.rect.left() + 7, y,
+                         option.rect.right() - 7, y)
+        painter.restore()
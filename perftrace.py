@@ -0,0 +1,266 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from functools import wraps
+
+# Operations kept for the overlay and for export
+MAX_RECORDS = 2000
+
+
+class OperationRecord:
+    # One timed operation, e.g. a get_items call, and the disk work done
+    # on its thread while it ran
+    __slots__ = ('name', 'start', 'duration', 'syscalls', 'files',
+                 'bytes_read', 'thread', 'thread_id', 'depth')
+
+    def __init__(self, name, thread, depth, thread_id=0):
+        self.name = name
+        self.start = time.perf_counter()
+        self.duration = 0.0
+        # 'stat', 'scandir', 'open', 'manifest' -> number of calls
+        self.syscalls = {}
+        self.files = 0
+        self.bytes_read = 0
+        self.thread = thread
+        self.thread_id = thread_id
+        self.depth = depth
+
+    def syscall_count(self):
+        return sum(count for kind, count in self.syscalls.items()
+                   if kind != 'manifest')
+
+    def describe(self):
+        calls = ' '.join(f"{count} {kind}"
+                         for kind, count in sorted(self.syscalls.items()))
+        return (f"{self.name} {self.duration * 1000:.1f} ms"
+                f" | {calls or '0 syscalls'}"
+                f" | {self.files} files | {format_bytes(self.bytes_read)}")
+
+    def as_dict(self):
+        return {'name': self.name, 'start': self.start,
+                'duration': self.duration, 'syscalls': dict(self.syscalls),
+                'files': self.files, 'bytes_read': self.bytes_read,
+                'thread': self.thread, 'depth': self.depth}
+
+
+def format_bytes(size):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == 'B' \
+                else f"{size:.1f} {unit}"
+        size /= 1024.0
+    return f"{size:.1f} TB"
+
+
+class Recorder:
+    # Off by default, then every hook is a single attribute check. Disk
+    # work is charged to the innermost operation running on the same
+    # thread, work on scan pool threads goes to the background totals
+    def __init__(self, max_records=MAX_RECORDS):
+        self.enabled = False
+        self.records = deque(maxlen=max_records)
+        self.background = OperationRecord('background', 'background', 0)
+        self.listeners = []
+        self.origin = time.perf_counter()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def enable(self, enabled=True):
+        self.enabled = enabled
+
+    def clear(self):
+        with self._lock:
+            self.records.clear()
+            self.background = OperationRecord('background', 'background', 0)
+            self.origin = time.perf_counter()
+
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def begin(self, name):
+        stack = self._stack()
+        thread = threading.current_thread()
+        record = OperationRecord(name, thread.name, len(stack), thread.ident)
+        stack.append(record)
+        return record
+
+    def end(self, record):
+        record.duration = time.perf_counter() - record.start
+        stack = self._stack()
+        stack.remove(record)
+        if stack:
+            # The outer operation includes the work of the inner one
+            outer = stack[-1]
+            for kind, count in record.syscalls.items():
+                outer.syscalls[kind] = outer.syscalls.get(kind, 0) + count
+            outer.files += record.files
+            outer.bytes_read += record.bytes_read
+        with self._lock:
+            self.records.append(record)
+        for listener in list(self.listeners):
+            listener(record)
+
+    def current(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack:
+            return stack[-1]
+        return self.background
+
+    def count(self, kind, calls=1, files=0, bytes_read=0):
+        record = self.current()
+        if record is self.background:
+            with self._lock:
+                self._add(record, kind, calls, files, bytes_read)
+        else:
+            self._add(record, kind, calls, files, bytes_read)
+
+    @staticmethod
+    def _add(record, kind, calls, files, bytes_read):
+        if kind is not None:
+            record.syscalls[kind] = record.syscalls.get(kind, 0) + calls
+        record.files += files
+        record.bytes_read += bytes_read
+
+    # Export
+    def snapshot(self):
+        with self._lock:
+            return list(self.records)
+
+    def summary(self):
+        # name -> totals over every recorded call of that operation
+        totals = {}
+        for record in self.snapshot():
+            if record.depth:
+                continue
+            total = totals.setdefault(record.name, {
+                'calls': 0, 'duration': 0.0, 'max_duration': 0.0,
+                'syscalls': 0, 'files': 0, 'bytes_read': 0})
+            total['calls'] += 1
+            total['duration'] += record.duration
+            total['max_duration'] = max(total['max_duration'],
+                                        record.duration)
+            total['syscalls'] += record.syscall_count()
+            total['files'] += record.files
+            total['bytes_read'] += record.bytes_read
+        return totals
+
+    def to_json(self):
+        return {'operations': [record.as_dict()
+                               for record in self.snapshot()],
+                'summary': self.summary(),
+                'background': self.background.as_dict()}
+
+    def chrome_trace(self):
+        # Complete ('X') events, loads in chrome://tracing and Perfetto
+        pid = os.getpid()
+        events = []
+        threads = {}
+        for record in self.snapshot():
+            threads[record.thread_id] = record.thread
+            events.append({
+                'name': record.name, 'cat': 'usdbrowser', 'ph': 'X',
+                'ts': (record.start - self.origin) * 1e6,
+                'dur': record.duration * 1e6,
+                'pid': pid, 'tid': record.thread_id,
+                'args': {'syscalls': dict(record.syscalls),
+                         'files': record.files,
+                         'bytes_read': record.bytes_read}})
+        for thread_id, thread in threads.items():
+            events.append({'name': 'thread_name', 'ph': 'M', 'pid': pid,
+                           'tid': thread_id, 'args': {'name': thread}})
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def write_json(self, path):
+        write_atomic(path, self.to_json())
+
+    def write_chrome_trace(self, path):
+        write_atomic(path, self.chrome_trace())
+
+
+def write_atomic(path, data):
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=1)
+    os.replace(path + '.tmp', path)
+
+
+recorder = Recorder()
+
+
+class operation:
+    # with perftrace.operation('name'): ...
+    __slots__ = ('name', 'record')
+
+    def __init__(self, name):
+        self.name = name
+        self.record = None
+
+    def __enter__(self):
+        if recorder.enabled:
+            self.record = recorder.begin(self.name)
+        return self.record
+
+    def __exit__(self, *exc):
+        if self.record is not None:
+            recorder.end(self.record)
+        return False
+
+
+def traced(name=None):
+    # Decorator timing every call of a function or method
+    def decorate(fn):
+        label = name or fn.__name__
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not recorder.enabled:
+                return fn(*args, **kwargs)
+            record = recorder.begin(label)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                recorder.end(record)
+        return wrapper
+    return decorate
+
+
+def count(kind, calls=1, files=0, bytes_read=0):
+    # Hooks in storage and layerinfo, no-op while recording is off
+    if recorder.enabled:
+        recorder.count(kind, calls, files, bytes_read)
+
+
+# Python API, e.g. from Houdini's Python shell:
+#   import perftrace; perftrace.enable()
+#   ... use the panel ...
+#   perftrace.write_chrome_trace('/tmp/usdbrowser.trace.json')
+def enable(enabled=True):
+    recorder.enable(enabled)
+
+
+def disable():
+    recorder.enable(False)
+
+
+def records():
+    return recorder.snapshot()
+
+
+def summary():
+    return recorder.summary()
+
+
+def clear():
+    recorder.clear()
+
+
+def write_json(path):
+    recorder.write_json(path)
+
+
+def write_chrome_trace(path):
+    recorder.write_chrome_trace(path)
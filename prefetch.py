@@ -0,0 +1,110 @@
+import math
+import os
+import time
+
+try:
+    from . import scanner
+    from .scanpool import ScanBatch
+except ImportError:
+    import scanner
+    from scanpool import ScanBatch
+
+# A visit counts half as much after this many seconds
+HALF_LIFE = 6 * 3600.0
+MAX_HISTORY = 5000
+# Directories prefetched after each listing
+PREFETCH_LIMIT = 8
+
+
+class Frecency:
+    # Visit scores that decay with age, directories opened often and
+    # recently rank first
+    def __init__(self, max_entries=MAX_HISTORY):
+        self.max_entries = max_entries
+        # path -> (score, time of the last visit)
+        self.visits = {}
+
+    def score(self, path, now=None):
+        visit = self.visits.get(os.path.normpath(path))
+        if visit is None:
+            return 0.0
+        if now is None:
+            now = time.time()
+        score, last = visit
+        return score * math.pow(0.5, (now - last) / HALF_LIFE)
+
+    def visit(self, path, now=None):
+        if now is None:
+            now = time.time()
+        path = os.path.normpath(path)
+        self.visits[path] = (self.score(path, now) + 1.0, now)
+        if len(self.visits) > self.max_entries:
+            # Forget the least relevant tenth in one go
+            ranked = sorted(self.visits, key=lambda key: self.score(key, now))
+            for key in ranked[:len(ranked) // 10]:
+                del self.visits[key]
+
+    def rank(self, paths, now=None):
+        # Visited paths by score, the rest keep their order after them
+        if now is None:
+            now = time.time()
+        scores = {path: self.score(path, now) for path in paths}
+        visited = sorted((path for path in paths if scores[path] > 0),
+                         key=lambda path: -scores[path])
+        return visited, [path for path in paths if scores[path] <= 0]
+
+
+class Prefetcher:
+    # Lists likely next directories and validates their subtree counts on
+    # the scan pool, so the ScanCache answers the next navigation without
+    # touching the disk
+    def __init__(self, pool, cache, history=None):
+        self.pool = pool
+        self.cache = cache
+        self.history = history if history is not None else Frecency()
+        self.batch = None
+        # Warm the disk usage too while the size column is shown
+        self.usage = False
+
+    def visit(self, path):
+        self.history.visit(path)
+
+    def predict(self, children, first=(), after=(), limit=PREFETCH_LIMIT):
+        # `first` (e.g. the forward target) goes ahead of the children
+        # with history, `after` (e.g. the parent when going back) ahead of
+        # the children without
+        visited, others = self.history.rank(list(children))
+        paths = []
+        for path in list(first) + visited + list(after) + others:
+            if path not in paths:
+                paths.append(path)
+        return paths[:limit]
+
+    def start(self, paths):
+        self.cancel()
+        batch = ScanBatch()
+        for path in paths:
+            batch.futures.append(
+                self.pool.submit(self._prefetch, path, batch.cancel_event))
+        self.batch = batch
+        return batch
+
+    def cancel(self):
+        if self.batch is not None:
+            self.batch.cancel()
+            self.batch = None
+
+    def _prefetch(self, path, cancel):
+        if cancel.is_set():
+            return
+        try:
+            scan = scanner.list_directory(path, self.cache)
+        except OSError:
+            return
+        for entry in scan.entries:
+            if cancel.is_set():
+                return
+            if entry.is_dir:
+                self.cache.subtree_totals(entry.path, cancel, fresh=True,
+                                          usage=self.usage)
+        self.cache.flush()
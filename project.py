@@ -1,55 +1,109 @@
 import os
+import threading
 import hou
 from pathlib import Path
-from PySide2.QtWidgets import QMessageBox, QCheckBox, QListWidgetItem
-from PySide2.QtGui import QKeySequence, QBrush, QColor
-from PySide2 import QtWidgets, QtUiTools, QtGui, QtCore
-
-
-class Node:
-    def __init__(self, path):
-        self.path = path
-        self.children = []
-
-    def add_child(self, node):
-        self.children.append(node)
-
-
-class Tree:
-    def __init__(self, root=""):
-        self.root = Node(root)
-
-    def add_path(self, path):
-        current = self.root
-        for part in path.split(os.sep):
-            if not part:
-                continue
-            found = None
-            for child in current.children:
-                if child.path == part:
-                    found = child
-                    break
-            if found is None:
-                found = Node(part)
-                current.add_child(found)
-            current = found
+from PySide2.QtWidgets import QMessageBox, QCheckBox
+from PySide2.QtGui import QKeySequence
+from PySide2 import QtWidgets, QtGui, QtCore
+
+try:
+    from . import listmodel, browsercore, batchimport, prefetch, history, \
+        treemodel, storage, perftrace, startup, thumbnails, scanservice, \
+        sorting, convert
+except ImportError:
+    import listmodel
+    import browsercore
+    import batchimport
+    import prefetch
+    import history
+    import treemodel
+    import storage
+    import perftrace
+    import startup
+    import thumbnails
+    import scanservice
+    import sorting
+    import convert
+
+
+class ScanSignals(QtCore.QObject):
+    # Emitted from scan worker threads, delivered on the main thread
+    counted = QtCore.Signal(int, str, object, object)
+    stale = QtCore.Signal(int)
+
+
+class ConvertSignals(QtCore.QObject):
+    # Emitted from worker threads, delivered on the main thread
+    planned = QtCore.Signal(object, object)
+    progress = QtCore.Signal(object, str, str)
+
+
+# Wait for a pause in typing before filtering
+SEARCH_DEBOUNCE_MS = 150
+# Thumbnail size in scene_list
+LIST_ICON_SIZE = 32
+# Recent operations listed in the debug overlay tooltip
+TRACE_TOOLTIP_LINES = 12
 
 
 class UsdBrowser(QtWidgets.QWidget):
     def __init__(self):
         super(UsdBrowser, self).__init__()
-        # Get the current directory of the script
-        current_directory = os.path.dirname(os.path.abspath(__file__))
         # Set data structures
-        self.tree = Tree()
-        self.current_node = self.tree.root
-        self.back_stack = []
-
-        # Load QtDesigner UI file
-        ui_file = 'usdbrowser.ui'
-        ui_path = os.path.join(current_directory, ui_file)
-        loader = QtUiTools.QUiLoader()
-        self.ui = loader.load(ui_path)
+        self.history = history.NavigationHistory()
+        # Scan cache, scan pool, project trees and the directory watcher
+        # are shared by every pane of the session, see scanservice.py. A
+        # running indexd.py is used for counts and the project index,
+        # USDBROWSER_INDEXD picks its socket, 0 never uses one
+        self.service = scanservice.acquire(
+            hou.getenv('HOUDINI_USER_PREF_DIR'),
+            hou.getenv('USDBROWSER_INDEXD', ''))
+        self.service.subscribe(self)
+        self.proj = None
+        self.project = None
+        self.scan_cache = self.service.cache
+        # Tree, current directory and listing live in the headless core
+        self.core = browsercore.BrowserCore(self.scan_cache)
+        self.scan_pool = self.service.pool
+        self.scan_batches = []
+        self.result_batch = None
+        self.scan_generation = 0
+        self.counting = {}
+        self.scan_signals = ScanSignals()
+        self.scan_signals.counted.connect(self.set_subtree_counts)
+        self.scan_signals.stale.connect(self.reload_stale_view)
+        # Sublayers, references and payloads of the whole project, read in
+        # the background. USDBROWSER_DEPENDENCIES=0 turns the scan off
+        self.analyse_dependencies = \
+            hou.getenv('USDBROWSER_DEPENDENCIES', '1') != '0'
+        self.dependency_graph = None
+        # Likely next directories are scanned once the listing is counted
+        self.prefetcher = prefetch.Prefetcher(self.scan_pool, self.scan_cache)
+        self.prefetch_pending = False
+        self.went_back = False
+        # Conversion of the selected layers between usda and usdc, from the
+        # context menu. The dry run's cancel event while it runs, then the
+        # convert.ConversionBatch
+        self.conversion_dry_run = None
+        self.conversion = None
+        self.convert_signals = ConvertSignals()
+        self.convert_signals.planned.connect(self.confirm_conversion)
+        self.convert_signals.progress.connect(self.conversion_progress)
+
+        # Watch the current directory and its children, or every directory
+        # of the project when USDBROWSER_WATCH_PROJECT is set
+        self.watch_project = bool(hou.getenv('USDBROWSER_WATCH_PROJECT'))
+        # Project root whose manifest is registered with storage
+        self.manifest_root = None
+
+        # Timings of the traced methods in the comment area, also toggled
+        # with Ctrl+Shift+D. See perftrace for the Python API
+        self.debug_overlay = False
+        self.comment = ""
+        self.last_trace = None
+
+        # Load QtDesigner UI file, compiled or cached, see startup.py
+        self.ui = startup.load_ui()
 
         # get UI elements (QtDesigner)
         self.usd_logo = self.ui.findChild(QtWidgets.QLabel, 'usdlogo')
@@ -62,6 +116,10 @@ class UsdBrowser(QtWidgets.QWidget):
         self.sort_btn = self.ui.findChild(QtWidgets.QPushButton, 'sortbtn')
         self.ref_btn = self.ui.findChild(QtWidgets.QPushButton, 'refbtn')
         self.home_btn = self.ui.findChild(QtWidgets.QPushButton, 'homebtn')
+        self.tree_btn = self.ui.findChild(QtWidgets.QPushButton, 'treebtn')
+        self.size_btn = self.ui.findChild(QtWidgets.QPushButton, 'sizebtn')
+        self.sort_mode_box = self.ui.findChild(QtWidgets.QComboBox,
+                                               'sortmode')
         self.search_bar = self.ui.findChild(QtWidgets.QLineEdit, 'searchbar')
         self.init_label = self.ui.findChild(QtWidgets.QLabel, 'initlbl')
         self.usd_label = self.ui.findChild(QtWidgets.QLabel, 'usdlbl')
@@ -69,8 +127,61 @@ class UsdBrowser(QtWidgets.QWidget):
         self.usdc_label = self.ui.findChild(QtWidgets.QLabel, 'usdclbl')
         self.cmt_label = self.ui.findChild(QtWidgets.QLabel, 'cmtlbl')
         self.import_btn = self.ui.findChild(QtWidgets.QPushButton, 'importbtn')
+        self.import_mode = self.ui.findChild(QtWidgets.QComboBox, 'importmode')
         self.reset_btn = self.ui.findChild(QtWidgets.QPushButton, 'resetbtn')
-        self.scene_list = self.ui.findChild(QtWidgets.QListWidget, 'scenelist')
+        self.scene_list = self.ui.findChild(QtWidgets.QListView, 'scenelist')
+
+        # scene_list is a virtualized view over the current listing
+        self.scene_model = listmodel.SceneListModel(self)
+        self.scene_list.setModel(self.scene_model)
+        self.list_delegate = listmodel.SceneItemDelegate(self.scene_list)
+        self.scene_list.setItemDelegate(self.list_delegate)
+        self.scene_list.setUniformItemSizes(True)
+        self.scene_list.setSelectionMode(
+            QtWidgets.QAbstractItemView.ExtendedSelection)
+        for mode, label in batchimport.IMPORT_MODES:
+            self.import_mode.addItem(label, mode)
+        for mode, label in sorting.SORT_MODES:
+            self.sort_mode_box.addItem(label, mode)
+        self.sort_mode = sorting.SORT_NAME
+
+        # Thumbnails of the usd files on screen, from sidecar images, the
+        # layer's assetInfo or a husk render. USDBROWSER_THUMBNAILS=0 turns
+        # them off, USDBROWSER_THUMBNAIL_RENDER=0 only the renders
+        self.thumbnails = None
+        if hou.getenv('USDBROWSER_THUMBNAILS', '1') != '0':
+            self.thumbnails = thumbnails.ThumbnailProvider(
+                thumbnails.ThumbnailCache(thumbnails.default_cache_dir(
+                    hou.getenv('HOUDINI_USER_PREF_DIR'))),
+                renderer=hou.getenv('USDBROWSER_THUMBNAIL_RENDERER'),
+                render=hou.getenv('USDBROWSER_THUMBNAIL_RENDER', '1') != '0')
+            self.scene_model.set_thumbnails(self.thumbnails, LIST_ICON_SIZE)
+            self.scene_list.setIconSize(QtCore.QSize(LIST_ICON_SIZE,
+                                                     LIST_ICON_SIZE))
+
+        # Optional tree mode, shown in place of scene_list. Directories
+        # are only listed when expanded
+        self.tree_mode = False
+        self.tree_model = treemodel.ProjectTreeModel(self.scan_pool,
+                                                     self.scan_cache, self)
+        self.scene_tree = QtWidgets.QTreeView(self.ui)
+        self.scene_tree.setModel(self.tree_model)
+        self.scene_tree.setItemDelegate(
+            listmodel.SceneItemDelegate(self.scene_tree))
+        self.scene_tree.setHeaderHidden(True)
+        self.scene_tree.setUniformRowHeights(True)
+        self.scene_tree.setSelectionMode(
+            QtWidgets.QAbstractItemView.ExtendedSelection)
+        self.scene_tree.expanded.connect(self.tree_model.expanded)
+        self.scene_tree.collapsed.connect(self.tree_model.collapsed)
+        self.scene_tree.setVisible(False)
+        list_layout = self.ui.findChild(QtWidgets.QGridLayout, 'gridLayout_2')
+        row, column, _, _ = list_layout.getItemPosition(
+            list_layout.indexOf(self.scene_list))
+        list_layout.addWidget(self.scene_tree, row, column)
+        for view in (self.scene_list, self.scene_tree):
+            view.setContextMenuPolicy(QtCore.Qt.CustomContextMenu)
+            view.customContextMenuRequested.connect(self.show_context_menu)
 
         # set default text values for UI elements
         self.default_proj_name = self.proj_name.text()
@@ -85,50 +196,38 @@ class UsdBrowser(QtWidgets.QWidget):
         self.sort_btn.clicked.connect(self.sort_button)
         self.ref_btn.clicked.connect(self.refresh_button)
         self.home_btn.clicked.connect(self.home_button)
-        self.search_bar.textChanged.connect(self.search_directories)
+        self.tree_btn.toggled.connect(self.set_tree_mode)
+        self.size_btn.toggled.connect(self.set_disk_usage)
+        self.sort_mode_box.currentIndexChanged.connect(self.set_sort_mode)
+        self.search_timer = QtCore.QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(SEARCH_DEBOUNCE_MS)
+        self.search_timer.timeout.connect(self.search_directories)
+        self.search_bar.textChanged.connect(lambda: self.search_timer.start())
         self.scene_list.doubleClicked.connect(self.double_click_forward)
         self.import_btn.clicked.connect(self.import_button)
         self.reset_btn.clicked.connect(self.reset_button)
 
-
-        # set icons for UI elements
-        usd_logo_icon_path = os.path.join(current_directory, 'static',
-                                          'USDlogovector.svg')
-        usd_logo_icon = QtGui.QPixmap(usd_logo_icon_path)
-        self.usd_logo.setPixmap(usd_logo_icon)
-        set_proj_icon_path = os.path.join(current_directory, 'static',
-                                          'chooser_folder.svg')
-        set_proj_icon = QtGui.QIcon(set_proj_icon_path)
-        self.set_proj.setIcon(set_proj_icon)
-        back_icon_path = os.path.join(current_directory, 'static',
-                                      'back.svg')
-        back_icon = QtGui.QIcon(back_icon_path)
-        self.back_btn.setIcon(back_icon)
-        fwd_icon_path = os.path.join(current_directory, 'static',
-                                     'forward.svg')
-        fwd_icon = QtGui.QIcon(fwd_icon_path)
-        self.fwd_btn.setIcon(fwd_icon)
-        sort_btn_path = os.path.join(current_directory, 'static',
-                                     'adaptpixelrange.svg')
-        sort_btn = QtGui.QIcon(sort_btn_path)
-        self.sort_btn.setIcon(sort_btn)
-        ref_icon_path = os.path.join(current_directory, 'static',
-                                     'reload.svg')
-        ref_icon = QtGui.QIcon(ref_icon_path)
-        self.ref_btn.setIcon(ref_icon)
-        home_icon_path = os.path.join(current_directory, 'static',
-                                      'home.svg')
-        home_icon = QtGui.QIcon(home_icon_path)
-        self.home_btn.setIcon(home_icon)
+        # set icons for UI elements, shared by every pane
+        self.usd_logo.setPixmap(startup.pixmap('USDlogovector.svg'))
+        self.set_proj.setIcon(startup.icon('chooser_folder.svg'))
+        self.back_btn.setIcon(startup.icon('back.svg'))
+        self.fwd_btn.setIcon(startup.icon('forward.svg'))
+        self.sort_btn.setIcon(startup.icon('adaptpixelrange.svg'))
+        self.ref_btn.setIcon(startup.icon('reload.svg'))
+        self.home_btn.setIcon(startup.icon('home.svg'))
 
         # set default values for variables
         self.back_btn.setEnabled(False)
         self.fwd_btn.setEnabled(False)
         self.sort_btn.setEnabled(False)
-        self.ascending_order = True
+        self.ascending_order = sorting.default_ascending(self.sort_mode)
         self.sort_btn_clicked = False
         self.ref_btn.setEnabled(False)
         self.home_btn.setEnabled(False)
+        self.tree_btn.setEnabled(False)
+        self.size_btn.setEnabled(False)
+        self.sort_mode_box.setEnabled(False)
         self.search_bar.setVisible(False)
         self.enter_pressed_on_search_bar = False
         self.init_label.setVisible(True)
@@ -138,11 +237,37 @@ class UsdBrowser(QtWidgets.QWidget):
         self.import_btn.setEnabled(False)
         self.show_reset_popup = True
         self.current_node.subdirs_present = False
+        if hou.getenv('USDBROWSER_DEBUG_OVERLAY'):
+            self.set_debug_overlay(True)
+        # Size column, sizes are gathered in the walks counting usd files
+        if hou.getenv('USDBROWSER_DISK_USAGE'):
+            self.size_btn.setChecked(True)
+        # Numbered files as one row per sequence, see sequences.py
+        self.core.group_sequences = \
+            hou.getenv('USDBROWSER_SEQUENCES', '1') != '0'
 
         # Initialise the panel
         main_layout = QtWidgets.QVBoxLayout()
         main_layout.addWidget(self.ui)
         self.setLayout(main_layout)
+        # Closing the pane lets go of the shared service
+        self.destroyed.connect(lambda: self.release_service())
+
+    @property
+    def tree(self):
+        return self.core.tree
+
+    @property
+    def current_node(self):
+        return self.core.current_node
+
+    @current_node.setter
+    def current_node(self, node):
+        self.core.current_node = node
+
+    @property
+    def scan(self):
+        return self.core.scan
 
     #  Project-related methods
     def set_project(self):
@@ -150,11 +275,12 @@ class UsdBrowser(QtWidgets.QWidget):
                                     file_type=hou.fileType.Directory)
         hou.hscript('setenv JOB=' + set_job)
         self.proj = hou.getenv('JOB')
-        self.tree = Tree(self.proj)
-        self.current_node = self.tree.root
+        self.use_manifest()
+        self.project = self.service.open_project(self, self.proj)
+        self.core.set_project(self.proj, self.project.tree)
+        self.history.clear()
+        self.history.visit(self.current_node.path)
         self.base = os.path.basename(self.current_node.path.rstrip('/'))
-        self.tree.add_path(self.proj)
-        self.current_node = self.tree.root
 
         # Set QtLabel Content
         proj_name = '  USD Project:  ' + set_job.split('/')[-2]
@@ -168,11 +294,88 @@ class UsdBrowser(QtWidgets.QWidget):
 
         self.comment_text(comment="")
         self.update_scene_list()
+        self.tree_model.set_tree(self.tree)
+        self.build_project_index()
+        self.build_dependency_graph()
+
+    def use_manifest(self):
+        # Browse from a prebuilt listing of the project when there is one,
+        # see storage.py for the format and how to write it
+        if self.manifest_root is not None:
+            storage.unregister_manifest(self.manifest_root)
+            self.manifest_root = None
+        path = storage.find_manifest(self.proj,
+                                     hou.getenv('USDBROWSER_MANIFEST'))
+        if path is None:
+            return
+        try:
+            backend = storage.ManifestBackend.load(
+                self.proj, path,
+                check_mtime=bool(hou.getenv('USDBROWSER_MANIFEST_CHECK')))
+        except (OSError, ValueError, KeyError, ImportError):
+            self.comment_text(comment="  can't read the project manifest!")
+            return
+        storage.register_manifest(backend)
+        self.manifest_root = backend.root
+
+    def release_service(self):
+        # The pane is going away, also runs from `destroyed` so nothing
+        # here touches widgets. The last pane shuts the service down
+        if self.service is None:
+            return
+        self.cancel_scans()
+        if self.conversion_dry_run is not None:
+            self.conversion_dry_run.set()
+        if self.conversion is not None:
+            self.conversion.cancel()
+        if self.thumbnails is not None:
+            self.thumbnails.shutdown()
+        self.service.unsubscribe(self)
+        self.service.release()
+        self.service = None
+
+    def build_project_index(self, force=False):
+        # Index every directory and usd file of the project in the
+        # background, project-wide search uses it once complete. Panes on
+        # the same project share one index
+        self.service.build_index(self.project, force)
+
+    def build_dependency_graph(self, force=False):
+        # Layers unchanged since the last session come from the cache
+        self.set_dependency_graph(None)
+        if not self.analyse_dependencies:
+            return
+        self.service.analyse(self.project, force)
+
+    def set_dependency_graph(self, graph):
+        if graph is not None and (not self.analyse_dependencies
+                                  or not self.proj or graph.root !=
+                                  os.path.normpath(self.proj)):
+            return
+        self.dependency_graph = graph
+        self.scene_model.dependencies = graph
+        self.tree_model.dependencies = graph
+
+    def set_project_index(self, index):
+        if not self.proj or index.root != os.path.normpath(self.proj):
+            return
+        self.core.index = index
+        if self.watch_project:
+            self.watch_directories()
+        if self.search_bar.text().startswith('/'):
+            self.search_directories()
 
     def reset_project(self):
-        self.tree = Tree()
-        self.current_node = self.tree.root
-        self.back_stack.clear()
+        self.cancel_scans()
+        self.set_dependency_graph(None)
+        self.service.watch(self, [])
+        self.project = self.service.open_project(self, None)
+        self.core.set_project("")
+        self.tree_model.set_tree(None)
+        if self.manifest_root is not None:
+            storage.unregister_manifest(self.manifest_root)
+            self.manifest_root = None
+        self.history.clear()
         self.proj = None
 
         self.proj_name.setText(self.default_proj_name)
@@ -180,7 +383,7 @@ class UsdBrowser(QtWidgets.QWidget):
         self.job_path.setText(self.default_job_path)
         self.search_bar.installEventFilter(self)
 
-        self.ascending_order = True
+        self.ascending_order = sorting.default_ascending(self.sort_mode)
         self.sort_btn_clicked = False
 
         self.back_btn.setEnabled(False)
@@ -188,6 +391,9 @@ class UsdBrowser(QtWidgets.QWidget):
         self.sort_btn.setEnabled(False)
         self.ref_btn.setEnabled(False)
         self.home_btn.setEnabled(False)
+        self.tree_btn.setEnabled(False)
+        self.size_btn.setEnabled(False)
+        self.sort_mode_box.setEnabled(False)
         self.search_bar.setVisible(False)
         self.init_label.setVisible(True)
         self.usd_label.setVisible(False)
@@ -195,29 +401,39 @@ class UsdBrowser(QtWidgets.QWidget):
         self.usdc_label.setVisible(False)
         self.import_btn.setEnabled(False)
 
-        self.comment_text(comment= "")
+        self.comment_text(comment="")
 
-        self.scene_list.clear()
+        self.scene_model.clear()
 
     #  Sequential update methods
     def update_scene_list(self):
-        self.scene_list.clear()
+        self.scene_model.clear()
         self.set_ui()
         self.set_path_label()
         self.sort_n_count_items()
         self.set_usd_labels()
         self.get_items()
         self.set_items()
+        self.prefetcher.visit(self.current_node.path)
+        self.scan_batches.append(self.count_subtrees())
+        self.watch_directories()
+        self.prefetch_pending = True
+        if not self.scan.unscanned:
+            self.start_prefetch()
 
         return self.scene_list
 
     def set_ui(self):
-        self.back_btn.setEnabled(True)
-        self.fwd_btn.setEnabled(True)
-        self.sort_btn.setEnabled(True)
+        self.back_btn.setEnabled(not self.tree_mode)
+        self.fwd_btn.setEnabled(not self.tree_mode)
+        self.sort_btn.setEnabled(not self.tree_mode)
         self.ref_btn.setEnabled(True)
         self.home_btn.setEnabled(True)
+        self.tree_btn.setEnabled(True)
+        self.size_btn.setEnabled(not self.tree_mode)
+        self.sort_mode_box.setEnabled(not self.tree_mode)
         self.search_bar.setVisible(True)
+        self.search_bar.setEnabled(not self.tree_mode)
         self.init_label.setVisible(False)
         self.usd_label.setVisible(True)
         self.usda_label.setVisible(True)
@@ -247,43 +463,18 @@ class UsdBrowser(QtWidgets.QWidget):
 
         self.proj_path.setText('Path:  ' + str(formatted_path) + '/')
 
-        # Remove extra trailing slash
-        self.current_node.path = self.current_node.path + '/'
-        if self.current_node.path[-2:] == '//':
-            self.current_node.path = self.current_node.path[:-1]
-
+    @perftrace.traced()
     def sort_n_count_items(self):
-        self.items = os.listdir(self.current_node.path)
-        self.dir_items = []
-        self.usd_file_count = 0
-        self.usda_file_count = 0
-        self.usdc_file_count = 0
-
-        # Count files & directories
-        for file in self.items:
-            path = os.path.join(self.current_node.path, file)
-            if os.path.isdir(path):
-                self.dir_items.append(file)
-            for root, dirs, files in os.walk(path):
-                for filename in files:
-                    if filename.endswith('.usd'):
-                        self.usd_file_count += 1
-                    if filename.endswith('.usda'):
-                        self.usda_file_count += 1
-                    if filename.endswith('.usdc'):
-                        self.usdc_file_count += 1
-
-        # Sort directories each update
-        self.dir_items.sort()
-        if self.sort_btn_clicked:
-            self.sort_items()
-
-        # Replace duplicate dirs in the original list with sorted dirs
-        self.dir_items_index = 0
-        for i in range(len(self.items)):
-            if self.items[i] in self.dir_items:
-                self.items[i] = self.dir_items[self.dir_items_index]
-                self.dir_items_index += 1
+        # List the current directory only, subtree counts are filled in
+        # by count_subtrees once the rows are shown
+        self.cancel_scans()
+        self.core.list_current()
+        self.usd_file_count = self.scan.counts.usd
+        self.usda_file_count = self.scan.counts.usda
+        self.usdc_file_count = self.scan.counts.usdc
+
+        self.dir_items, self.usd_items = self.core.listing(
+            self.ascending_order, self.sort_mode)
 
     def set_usd_labels(self):
         usd_file_present = False
@@ -297,6 +488,12 @@ class UsdBrowser(QtWidgets.QWidget):
             usda_file_present = self.usda_file_count > 0
             usdc_file_present = self.usdc_file_count > 0
 
+        # Usd files directly in the current directory
+        file_counts = self.scan.file_counts
+        usd_file_present = usd_file_present or file_counts.usd > 0
+        usda_file_present = usda_file_present or file_counts.usda > 0
+        usdc_file_present = usdc_file_present or file_counts.usdc > 0
+
         if usd_file_present and usda_file_present and usdc_file_present:
             self.usd_label.setText("usd")
             self.usda_label.setText("usda")
@@ -337,219 +534,242 @@ class UsdBrowser(QtWidgets.QWidget):
             self.usda_label.setText("")
             self.usdc_label.setText("usdc")
 
+    @perftrace.traced()
     def get_items(self):
-        self.digit_font = QtGui.QFont("Consolas", 12)
-        self.usd_items = []
-        self.dir_items = []
-
-        # get all items in current node & subdirs
-        for item in self.items:
-            path = os.path.join(self.current_node.path, item)
-            if os.path.isdir(path):  # if item is a directory
-                self.layout_usd_values(path, item)
-            else:  # if item is a usd file
-                self.layout_usd_files(item)
-
-    def layout_usd_values(self, path, item):
-        self.tree.add_path(path + '/')
-        self.tree.node = self.current_node
-        self.current_node.subdirs_present = True
-
-        self.usd_file_count = 0
-        self.usda_file_count = 0
-        self.usdc_file_count = 0
-        for root, dirs, files in os.walk(path):
-            for filename in files:
-                if filename.endswith('.usd'):
-                    self.usd_file_count += 1
-                elif filename.endswith('.usda'):
-                    self.usda_file_count += 1
-                elif filename.endswith('.usdc'):
-                    self.usdc_file_count += 1
-
-        usda_str_length = len(str(self.usda_file_count))
-        usdc_str_length = len(str(self.usdc_file_count))
-        usda_padding = '&nbsp;' * (4 - usda_str_length)
-        usdc_padding = '&nbsp;' * (4 - usdc_str_length)
-        end_space_1 = '&nbsp;'
-        end_space_4 = '&nbsp;' * 4
-        # Format USD values
-        if self.usd_file_count == 0 and self.usda_file_count == 0 \
-                and self.usdc_file_count == 0:
-            self.usd_file_count = '&nbsp;' * 3
-            self.usda_file_count = '&nbsp;' * 3
-            self.usdc_file_count = '&nbsp;' * 3
-            item_text = f"<font color='#36C3F1'>" \
-                        f"{self.usd_file_count}</font>" \
-                        f"{usda_padding}{end_space_4}" \
-                        f"<font color='#1F8ECD'>" \
-                        f"{self.usda_file_count}</font>" \
-                        f"{usdc_padding}{end_space_4}" \
-                        f"<font color='#5DAADA'>" \
-                        f"{self.usdc_file_count}</font>" \
-                        f"{end_space_1}"
-        elif self.usd_file_count == 0 and self.usda_file_count == 0:
-            self.usd_file_count = '&nbsp;' * 3
-            self.usda_file_count = '&nbsp;' * 3
-            item_text = f"<font color='#36C3F1'>" \
-                        f"{self.usd_file_count}</font>" \
-                        f"{usda_padding}{end_space_4}" \
-                        f"<font color='#1F8ECD'>" \
-                        f"{self.usda_file_count}</font>" \
-                        f"{usdc_padding}{end_space_4}" \
-                        f"<font color='#5DAADA'>" \
-                        f"({self.usdc_file_count})</font>" \
-                        f"{end_space_1}"
-        elif self.usd_file_count == 0 and self.usdc_file_count == 0:
-            self.usd_file_count = '&nbsp;' * 3
-            self.usdc_file_count = '&nbsp;' * 3
-            item_text = f"<font color='#36C3F1'>" \
-                        f"{self.usd_file_count}</font>" \
-                        f"{usda_padding}{end_space_4}" \
-                        f"<font color='#1F8ECD'>(" \
-                        f"{self.usda_file_count})</font>" \
-                        f"{usdc_padding}{end_space_4}" \
-                        f"<font color='#5DAADA'>" \
-                        f"{self.usdc_file_count}</font>" \
-                        f"{end_space_1}"
-        elif self.usda_file_count == 0 and self.usdc_file_count == 0:
-            self.usda_file_count = '&nbsp;' * 3
-            self.usdc_file_count = '&nbsp;' * 3
-            item_text = f"<font color='#36C3F1'>(" \
-                        f"{self.usd_file_count})</font>" \
-                        f"{usda_padding}{end_space_4}" \
-                        f"<font color='#1F8ECD'>" \
-                        f"{self.usda_file_count}</font>" \
-                        f"{usdc_padding}{end_space_4}" \
-                        f"<font color='#5DAADA'>" \
-                        f"{self.usdc_file_count}</font>" \
-                        f"{end_space_1}"
-        elif self.usd_file_count == 0:
-            self.usd_file_count = '&nbsp;' * 3
-            item_text = f"<font color='#36C3F1'>" \
-                        f"{self.usd_file_count}</font>" \
-                        f"{usda_padding}{end_space_4}" \
-                        f"<font color='#1F8ECD'>(" \
-                        f"{self.usda_file_count})</font>" \
-                        f"{usdc_padding}{end_space_4}" \
-                        f"<font color='#5DAADA'>" \
-                        f"({self.usdc_file_count})</font>" \
-                        f"{end_space_1}"
-        elif self.usda_file_count == 0:
-            self.usda_file_count = '&nbsp;' * 3
-            item_text = f"<font color='#36C3F1'>(" \
-                        f"{self.usd_file_count})</font>" \
-                        f"{usda_padding}{end_space_4}" \
-                        f"<font color='#1F8ECD'>" \
-                        f"{self.usda_file_count}</font>" \
-                        f"{usdc_padding}{end_space_4}" \
-                        f"<font color='#5DAADA'>" \
-                        f"({self.usdc_file_count})</font>" \
-                        f"{end_space_1}"
-        elif self.usdc_file_count == 0:
-            self.usdc_file_count = '&nbsp;' * 3
-            item_text = f"<font color='#36C3F1'>(" \
-                        f"{self.usd_file_count})</font>" \
-                        f"{usda_padding}{end_space_4}" \
-                        f"<font color='#1F8ECD'>(" \
-                        f"{self.usda_file_count})</font>" \
-                        f"{usdc_padding}{end_space_4}" \
-                        f"<font color='#5DAADA'>" \
-                        f"{self.usdc_file_count}</font>" \
-                        f"{end_space_1}"
-        else:
-            item_text = f"<font color='#36C3F1'>(" \
-                        f"{self.usd_file_count})</font>" \
-                        f"{usda_padding}{end_space_4}" \
-                        f"<font color='#1F8ECD'>(" \
-                        f"{self.usda_file_count})</font>" \
-                        f"{usdc_padding}{end_space_4}" \
-                        f"<font color='#5DAADA'>" \
-                        f"({self.usdc_file_count})</font>" \
-                        f"{end_space_1}"
-
-        item = QtWidgets.QListWidgetItem(f"{item}")
-        item_widget = QtWidgets.QWidget()
-        item_label = QtWidgets.QLabel(item_text)
-        item_label.setAlignment(QtCore.Qt.AlignRight)
-        item_label.setFont(self.digit_font)
-        item_layout = QtWidgets.QHBoxLayout(item_widget)
-        item_layout.setContentsMargins(0, 0, 0, 0)
-        item_layout.addWidget(item_label)
-
-        self.dir_items.append((item, item_widget))
-
-    def layout_usd_files(self, item):
+        # Directory rows are painted from their scan entries, only the usd
+        # files change the header labels
+        for entry in self.usd_items:
+            self.layout_usd_files(entry)
+
+    def layout_usd_files(self, entry):
         # Style USD files
+        item = entry.name
         if item.endswith('.usd'):
-            list_widget = QtWidgets.QListWidget()
-            item = QtWidgets.QListWidgetItem(item)
-            item.setForeground(QtGui.QColor('#36C3F1'))
-
-            list_widget.addItem(item.text())
-            self.usd_items.append(item)
-            self.usd_items.sort()
-
             self.usd_font.setOverline(True)
             self.usd_label.setText("usd")
             self.usd_label.setFont(self.usd_font)
 
         elif item.endswith('.usda'):
-            list_widget = QtWidgets.QListWidget()
-            item = QtWidgets.QListWidgetItem(item)
-            item.setForeground(QtGui.QColor('#1F8ECD'))
-
-            list_widget.addItem(item.text())
-            self.usd_items.append(item)
-            self.usd_items.sort()
-
             self.usd_font.setOverline(True)
             self.usda_label.setText("usda")
             self.usda_label.setFont(self.usd_font)
 
         elif item.endswith('.usdc'):
-            list_widget = QtWidgets.QListWidget()
-            item = QtWidgets.QListWidgetItem(item)
-            item.setForeground(QtGui.QColor('#5DAADA'))
-
-            list_widget.addItem(item.text())
-            self.usd_items.append(item)
-            self.usd_items.sort()
-
             self.usd_font.setOverline(True)
             self.usdc_label.setText("usdc")
             self.usdc_label.setFont(self.usd_font)
 
+    @perftrace.traced()
     def set_items(self):
-        # Set directory items
-        for dir_item, item_widget in self.dir_items:
-            self.scene_list.addItem(dir_item)
-            self.scene_list.setItemWidget(dir_item, item_widget)
-
-        # Add a separator & line item between item types
-        if self.usd_items and self.dir_items:
-            separator = QtWidgets.QListWidgetItem()
-            separator.setFlags(QtCore.Qt.NoItemFlags)
-            separator.setSizeHint(QtCore.QSize(0, 20))
-            separator.setBackground(
-                QtGui.QColor(128, 128, 128))
-
-            line = QtWidgets.QFrame()
-            line.setFrameShape(QtWidgets.QFrame.HLine)
-            line.setLineWidth(1)
-            line.setContentsMargins(7, 0, 7, 0)
-
-            palette = line.palette()
-            palette.setColor(QtGui.QPalette.WindowText, QtGui.QColor(
-                128, 128, 128))
-            line.setPalette(palette)
-
-            self.scene_list.addItem(separator)
-            self.scene_list.setItemWidget(separator, line)
-
-        # Set usd items
-        for usd_item in self.usd_items:
-            self.scene_list.addItem(usd_item)
+        # Directories, a separator, then the usd files sorted by name
+        self.scene_model.set_entries(self.dir_items, self.usd_items)
+
+    def count_subtrees(self, entries=None):
+        # Count directories on the scan pool, rows update as each subtree
+        # finishes. Defaults to the directories of the current listing
+        if entries is None:
+            entries = self.scan.pending(self.core.disk_usage)
+        generation = self.scan_generation
+        for entry in entries:
+            self.counting.setdefault(entry.path, []).append(entry)
+        return self.scan_pool.count_subtrees(
+            [entry.path for entry in entries],
+            lambda path, counts, usage=None: self.scan_signals.counted.emit(
+                generation, path, counts, usage),
+            self.core.disk_usage)
+
+    def cancel_scans(self):
+        self.prefetcher.cancel()
+        if self.thumbnails is not None:
+            self.thumbnails.cancel()
+        self.prefetch_pending = False
+        self.scan_generation += 1
+        self.counting = {}
+        for batch in self.scan_batches:
+            batch.cancel()
+        if self.result_batch is not None:
+            self.result_batch.cancel()
+        self.scan_batches = []
+        self.result_batch = None
+
+    def set_subtree_counts(self, generation, path, counts, usage):
+        if generation != self.scan_generation:
+            return
+        listed = False
+        for entry in self.counting.pop(path, ()):
+            if self.scan.by_name.get(entry.name) is entry:
+                self.core.set_counts(entry, counts, usage)
+                self.usd_file_count = self.scan.counts.usd
+                self.usda_file_count = self.scan.counts.usda
+                self.usdc_file_count = self.scan.counts.usdc
+                self.set_usd_labels()
+                listed = True
+            else:
+                # Project-wide search results are not part of the listing
+                entry.counts = counts
+                entry.usage = usage
+            self.scene_model.counts_changed(entry.name)
+
+        if not self.scan.unscanned:
+            self.scan_cache.flush()
+            if self.prefetch_pending:
+                self.start_prefetch()
+            if listed and self.sort_mode in sorting.VALUE_KEYS \
+                    and not self.scan.pending(self.core.disk_usage):
+                # Counts, sizes and mtimes are all known now, order by them
+                self.show_listing()
+
+    def start_prefetch(self):
+        # Idle time after counting: the forward target, then children by
+        # frecency, then the parent and the siblings after going back
+        self.prefetch_pending = False
+        children = [entry.path for entry in self.scan.entries if entry.is_dir]
+        first = [self.history.forward_path()] \
+            if self.history.can_go_forward() else []
+        after = []
+        if self.went_back and self.current_node.parent is not None:
+            after.append(self.current_node.parent.path)
+        self.went_back = False
+        self.prefetcher.start(self.prefetcher.predict(children, first, after))
+
+    def watch_directories(self):
+        paths = [self.current_node.path]
+        paths.extend(entry.path for entry in self.scan.entries
+                     if entry.is_dir)
+        index = self.core.index
+        if self.watch_project and index is not None:
+            paths.extend(index.path(i) for i in range(len(index))
+                         if index.is_dir(i))
+        if self.tree_mode:
+            paths.extend(self.tree_model.listed_paths())
+        self.service.watch(self, paths)
+
+    def set_tree_mode(self, enabled):
+        # The tree replaces scene_list, history navigation, sorting and
+        # filtering only apply to the list
+        self.tree_mode = enabled
+        self.scene_list.setVisible(not enabled)
+        self.scene_tree.setVisible(enabled)
+        self.back_btn.setEnabled(not enabled)
+        self.fwd_btn.setEnabled(not enabled)
+        self.sort_btn.setEnabled(not enabled)
+        self.size_btn.setEnabled(not enabled)
+        self.sort_mode_box.setEnabled(not enabled)
+        self.search_bar.setEnabled(not enabled)
+        if self.scan is not None:
+            self.watch_directories()
+
+    def set_disk_usage(self, enabled):
+        # The size column. Directories are counted again with their disk
+        # usage, the scan cache keeps it so this is paid once per folder
+        self.core.disk_usage = enabled
+        self.prefetcher.usage = enabled
+        if not enabled and self.sort_mode in sorting.USAGE_SORTS:
+            self.sort_mode_box.setCurrentIndex(0)
+        self.update_usage_column()
+        if self.scan is not None:
+            self.update_scene_list()
+
+    def set_sort_mode(self, index):
+        self.sort_mode = self.sort_mode_box.itemData(index)
+        self.ascending_order = sorting.default_ascending(self.sort_mode)
+        self.sort_btn_clicked = False
+        if self.sort_mode in sorting.USAGE_SORTS \
+                and not self.size_btn.isChecked():
+            # Sorting by size needs the sizes, this lists again
+            self.size_btn.setChecked(True)
+            return
+        self.update_usage_column()
+        if self.scan is not None:
+            self.show_listing()
+
+    def update_usage_column(self):
+        if not self.core.disk_usage:
+            self.list_delegate.usage_mode = None
+        elif self.sort_mode == sorting.SORT_MTIME:
+            self.list_delegate.usage_mode = listmodel.USAGE_MTIME
+        else:
+            self.list_delegate.usage_mode = listmodel.USAGE_SIZE
+        self.scene_list.viewport().update()
+
+    def apply_disk_changes(self, paths):
+        # One coalesced burst of directory changes, the service already
+        # expired its caches (see ScanService.apply_disk_changes): re-list
+        # the current directory if its entries changed. Counts above the
+        # changed directories follow in roll_up_change
+        if self.proj is None:
+            return
+        paths = [path for path in paths if self.project.contains(path)]
+        if not paths:
+            return
+        if self.thumbnails is not None:
+            self.thumbnails.forget(paths)
+        for path in paths:
+            self.tree_model.refresh_directory(path)
+        current = os.path.normpath(self.current_node.path)
+        if current in paths:
+            try:
+                self.relist_directory()
+            except OSError:
+                self.comment_text(comment="  directory no longer exists!")
+                return
+        self.watch_directories()
+
+    def roll_up_change(self, path, change, nodes):
+        # The service applied the change of `path` to the shared tree,
+        # `nodes` are the ones it updated
+        if self.proj is None:
+            return
+        if change is None:
+            # Subdirectories came or went, or the directory was never
+            # counted: count the listed directories containing it again
+            changed = [entry for entry in self.scan.entries if entry.is_dir
+                       and entry.counts is not None
+                       and (path == entry.path
+                            or path.startswith(entry.path + os.sep))]
+            if changed:
+                self.scan_batches.append(self.count_subtrees(changed))
+            return
+
+        for node in nodes:
+            if node.parent is not self.current_node:
+                continue
+            entry = self.scan.by_name.get(node.name)
+            if entry is not None and entry.is_dir \
+                    and entry.counts is not None:
+                self.core.set_counts(entry, node.counts, node.usage)
+                self.scene_model.counts_changed(entry.name)
+        self.usd_file_count = self.scan.counts.usd
+        self.usda_file_count = self.scan.counts.usda
+        self.usdc_file_count = self.scan.counts.usdc
+        self.set_usd_labels()
+
+    def relist_directory(self):
+        # Keep the counts of directories that are still there
+        self.core.list_current(keep_counts=True)
+        self.show_listing()
+        self.scan_batches.append(self.count_subtrees())
+
+    def show_listing(self):
+        # Sort the listing into the view again. The view keeps its filter,
+        # selection and scroll position
+        selected = self.selected_entry()
+        scroll = self.scene_list.verticalScrollBar().value()
+
+        self.dir_items, self.usd_items = self.core.listing(
+            self.ascending_order, self.sort_mode)
+        self.usd_file_count = self.scan.counts.usd
+        self.usda_file_count = self.scan.counts.usda
+        self.usdc_file_count = self.scan.counts.usdc
+        self.set_usd_labels()
+        self.get_items()
+        self.scene_model.update_entries(self.dir_items, self.usd_items)
+
+        if selected is not None:
+            index = self.scene_model.index_of(selected.name)
+            if index.isValid():
+                self.scene_list.setCurrentIndex(index)
+        self.scene_list.verticalScrollBar().setValue(scroll)
 
     # Button-related methods
     def reset_button(self):
@@ -577,143 +797,372 @@ class UsdBrowser(QtWidgets.QWidget):
             self.reset_project()
 
     def refresh_button(self):
-        self.back_stack.clear()
+        # Views kept in the history may be out of date as well
+        self.history.discard()
         self.comment_text(comment="  refreshed directory!")
-        self.ascending_order = True
+        self.ascending_order = sorting.default_ascending(self.sort_mode)
         self.sort_btn_clicked = False
+        # Check every directory against the disk again
+        self.service.expire()
         self.update_scene_list()
+        self.tree_model.set_tree(self.tree)
+        self.build_project_index(force=True)
+        self.build_dependency_graph(force=True)
 
     def home_button(self):
-        self.current_node.path = self.proj
-        self.back_stack.clear()
-        self.ascending_order = True
-        self.sort_btn_clicked = False
-        self.update_scene_list()
+        self.scene_tree.collapseAll()
+        self.open_directory(self.tree.root)
         self.comment_text(comment="  returned to JOB!")
 
     def sort_button(self):
+        # Only the order changes, the rows already listed are sorted again
         self.sort_btn_clicked = True
-        self.update_scene_list()
+        self.sort_items()
+        self.show_listing()
 
     def back_button(self):
-        home_dir = os.path.expanduser("~")
-        job_path_bold = self.job_path.text().split('JOB:  ')[1].replace(
-            '$HOME', home_dir)
-        job_path = job_path_bold.replace("<b>", "").replace("</b>", "")
-
-        if os.path.abspath(self.current_node.path) == job_path:
-            self.comment_text(comment="  can't go back on JOB!")
-            return
-        else:
-            self.back_stack.append(self.current_node.path)
-            self.current_node.path = os.path.dirname(
-                os.path.dirname(self.current_node.path))
-            self.comment_text(comment="")
-
-            self.ascending_order = True
-            self.sort_btn_clicked = False
-            self.update_scene_list()
+        if not self.history.can_go_back():
+            if self.current_node.parent is None:
+                self.comment_text(comment="  can't go back on JOB!")
+                return
+            # Nothing was visited before this view, back goes up a level
+            self.history.insert_before(self.current_node.parent.path)
+        self.went_back = True
+        self.comment_text(comment="")
+        self.restore_view(self.history.back())
 
     def forward_button(self):
-        selected_item = self.scene_list.currentItem()
+        selected_item = self.selected_entry()
 
         if selected_item is None:
             self.comment_text(comment="")
             return
 
-        selected_path = os.path.join(self.current_node.path,
-                                     selected_item.text())
-
-        if os.path.isdir(selected_path):
-            self.back_stack.clear()
+        selected_path = selected_item.path
 
-            for child in self.current_node.children:
-                if child.path == selected_path:
-                    self.current_node = child
-                    self.update_scene_list()
-                    self.comment_text(comment="")
-                    return
-
-        elif selected_item.text().endswith(('usd', '.usda', '.usdc')):
-            self.comment_text(comment="can only navigate to directories!")
-            return
-        else:
+        if listmodel.is_sequence(selected_item):
+            # Forward on a sequence shows or hides its frames
+            self.scene_model.toggle_sequence(selected_item)
+            index = self.scene_model.index_of(selected_item.name)
+            if index.isValid():
+                self.scene_list.setCurrentIndex(index)
             self.comment_text(comment="")
             return
 
-        self.current_node.path = os.path.join(
-            self.current_node.path + selected_item.text())
-        self.ascending_order = True
+        if not selected_item.is_dir:
+            if selected_item.name.endswith(('usd', '.usda', '.usdc')):
+                self.comment_text(comment="can only navigate to directories!")
+            else:
+                self.comment_text(comment="")
+            return
+
+        if self.search_bar.text().startswith('/'):
+            # Leaving project-wide results for the chosen directory
+            self.search_bar.blockSignals(True)
+            self.search_bar.clear()
+            self.search_bar.blockSignals(False)
+        self.open_directory(self.tree.add_path(selected_path))
+        self.comment_text(comment="")
+
+    def open_directory(self, node):
+        # A new entry in the history, listed with the default sort order
+        self.save_view()
+        self.history.visit(node.path)
+        self.current_node = node
+        self.ascending_order = sorting.default_ascending(self.sort_mode)
         self.sort_btn_clicked = False
         self.update_scene_list()
-        self.comment_text(comment="")
+
+    def save_view(self):
+        # Snapshot of the view being left. Project-wide search results do
+        # not belong to the directory and are not kept
+        if self.scan is None or self.scene_model.filter_text is None:
+            return
+        current = self.selected_entry()
+        snapshot = history.ViewSnapshot(
+            self.current_node.path, self.scan, self.dir_items,
+            self.usd_items, self.ascending_order, self.sort_btn_clicked,
+            self.search_bar.text(),
+            self.scene_list.verticalScrollBar().value(),
+            [entry.name for entry in self.selected_entries()],
+            current.name if current is not None else None, self.core.sorter)
+        self.history.save(snapshot)
+
+    def restore_view(self, path):
+        # Back and forward redraw a kept snapshot immediately and check it
+        # against the disk in the background, otherwise list from disk
+        self.save_view()
+        self.current_node = self.tree.add_path(path)
+        snapshot = self.history.snapshot(path)
+        if snapshot is None:
+            self.ascending_order = sorting.default_ascending(self.sort_mode)
+            self.sort_btn_clicked = False
+            self.update_scene_list()
+            return
+
+        self.cancel_scans()
+        self.core.set_scan(snapshot.scan, snapshot.sorter)
+        self.ascending_order = snapshot.ascending
+        self.sort_btn_clicked = snapshot.sort_clicked
+        self.dir_items = snapshot.dir_entries
+        self.usd_items = snapshot.file_entries
+        self.set_ui()
+        self.set_path_label()
+        self.usd_file_count = self.scan.counts.usd
+        self.usda_file_count = self.scan.counts.usda
+        self.usdc_file_count = self.scan.counts.usdc
+        self.set_usd_labels()
+        self.get_items()
+        self.set_items()
+
+        self.search_bar.blockSignals(True)
+        self.search_bar.setText(snapshot.filter_text)
+        self.search_bar.blockSignals(False)
+        if snapshot.filter_text and not snapshot.filter_text.startswith('/'):
+            self.scene_model.set_filter(snapshot.filter_text)
+        selection = self.scene_list.selectionModel()
+        for name in snapshot.selected:
+            index = self.scene_model.index_of(name)
+            if index.isValid():
+                selection.select(index, QtCore.QItemSelectionModel.Select)
+        if snapshot.current is not None:
+            index = self.scene_model.index_of(snapshot.current)
+            if index.isValid():
+                selection.setCurrentIndex(index,
+                                          QtCore.QItemSelectionModel.NoUpdate)
+        self.scene_list.verticalScrollBar().setValue(snapshot.scroll)
+
+        self.prefetcher.visit(self.current_node.path)
+        self.revalidate_view()
+        self.watch_directories()
+
+    def revalidate_view(self):
+        # Recount every directory of a restored view and re-list it when
+        # the directory itself changed since the snapshot was taken
+        self.prefetch_pending = True
+        dir_entries = [entry for entry in self.scan.entries if entry.is_dir]
+        self.scan_batches.append(self.count_subtrees(dir_entries))
+        if not dir_entries:
+            self.start_prefetch()
+        generation = self.scan_generation
+        path = self.current_node.path
+        mtime_ns = self.scan.mtime_ns
+
+        def check():
+            try:
+                changed = storage.dir_mtime(path) != mtime_ns
+            except OSError:
+                changed = True
+            if changed:
+                self.scan_signals.stale.emit(generation)
+
+        self.scan_batches[-1].futures.append(self.scan_pool.submit(check))
+
+    def reload_stale_view(self, generation):
+        if generation != self.scan_generation:
+            return
+        self.scan_cache.expire(self.current_node.path)
+        try:
+            self.relist_directory()
+        except OSError:
+            self.comment_text(comment="  directory no longer exists!")
+            return
+        self.watch_directories()
 
     def import_button(self):
-        self.selected_usd = self.scene_list.currentItem()
-        if self.selected_usd is not None \
-                and self.selected_usd.text().endswith(('usd', '.usda',
-                                                       '.usdc')):
+        self.selected_usd = [entry for entry in self.selected_entries()
+                             if not entry.is_dir
+                             and entry.name.endswith(('usd', '.usda',
+                                                      '.usdc'))]
+        if self.selected_usd:
             self.import_usd()
         else:
             self.comment_text(comment="can only import usd files!")
             return
 
     # Widget functionality methods
+    @perftrace.traced()
     def import_usd(self):
-        self.selected_usd = self.current_node.path + self.selected_usd.text()
-
-        loader = hou.node('/obj').createNode('geo', 'usd_loader')
-        usd_import = loader.createNode('usdimport')
-        usd_import.parm('filepath1').set(self.selected_usd)
-        usd_import.parm('importtraversal').set('std:boundables')
+        # Every selected file in one undo step, see batchimport. A sequence
+        # row is one node reading its frames through $F
+        paths = [entry.path for entry in self.selected_usd]
+        try:
+            batchimport.import_files(paths, self.import_mode.currentData())
+        except ValueError as error:
+            self.comment_text(comment=f"  can't import: {error}!")
+            return
 
-        usd_comment = self.selected_usd.text()
-        comment = "imported: " + usd_comment
+        if len(self.selected_usd) == 1:
+            comment = "imported: " + os.path.basename(
+                self.selected_usd[0].path)
+        else:
+            comment = f"imported {len(self.selected_usd)} usd files"
         self.comment_text(comment)
 
+    def show_context_menu(self, position):
+        view = self.scene_tree if self.tree_mode else self.scene_list
+        menu = QtWidgets.QMenu(self)
+        if self.conversion_dry_run is not None or self.conversion is not None:
+            menu.addAction('Cancel conversion', self.cancel_conversion)
+        else:
+            for target in (convert.TO_USDC, convert.TO_USDA):
+                menu.addAction(f'Convert to {target}...',
+                               lambda target=target:
+                               self.convert_selection(target))
+        menu.exec_(view.viewport().mapToGlobal(position))
+
+    def convert_selection(self, target):
+        # Selected files, sequences and whole folders. A dry run plans the
+        # conversion and converts a few samples on the scan pool first,
+        # confirm_conversion shows its report before anything is written
+        if self.conversion_dry_run is not None or self.conversion is not None:
+            self.comment_text(comment="  a conversion is already running!")
+            return
+        paths = []
+        for entry in self.selected_entries():
+            if listmodel.is_sequence(entry):
+                paths.extend(member.path for member in entry.members)
+            else:
+                paths.append(entry.path)
+        if not paths:
+            self.comment_text(comment="  select files or folders to convert!")
+            return
+        command = convert.converter_command()
+        if command is None:
+            self.comment_text(comment="  usdcat not found, can't convert!")
+            return
+        cancel = self.conversion_dry_run = threading.Event()
+        future = self.scan_pool.submit(convert.dry_run, paths, target,
+                                       command, cancel, self.dependency_graph)
+        future.add_done_callback(
+            lambda future: None if cancel.is_set()
+            else self.convert_signals.planned.emit(
+                cancel, None if future.exception() else future.result()))
+        self.comment_text(comment=f"  estimating conversion to {target}...")
+
+    def confirm_conversion(self, cancel, report):
+        if cancel is not self.conversion_dry_run:
+            return
+        self.conversion_dry_run = None
+        if report is None:
+            self.comment_text(comment="  can't read the layers to convert!")
+            return
+        plan = report.plan
+        if not plan.conversions:
+            self.comment_text(comment=f"  nothing to convert to "
+                                      f"{plan.target}!")
+            return
+        msg_box = QMessageBox()
+        msg_box.setWindowTitle('Convert')
+        msg_box.setText(f'Convert {len(plan.conversions)} layers to '
+                        f'{plan.target}?')
+        msg_box.setInformativeText('\n'.join(report.describe(self.proj)))
+        if plan.skipped:
+            msg_box.setDetailedText('\n'.join(
+                f"{path}: {reason}" for path, reason in plan.skipped))
+        msg_box.setIcon(QMessageBox.Question)
+        msg_box.setStandardButtons(QMessageBox.Yes | QMessageBox.No)
+        msg_box.setDefaultButton(QMessageBox.No)
+        if msg_box.exec_() != QMessageBox.Yes:
+            self.comment_text(comment="")
+            return
+        command = convert.converter_command()
+        if command is None:
+            self.comment_text(comment="  usdcat not found, can't convert!")
+            return
+        self.conversion = convert.ConversionBatch(
+            plan, command, progress=lambda batch, conversion, error:
+            self.convert_signals.progress.emit(batch, conversion.source,
+                                               error))
+        self.comment_text(comment=f"  converting 0/{len(plan.conversions)}")
+
+    def conversion_progress(self, batch, path, error):
+        if batch is not self.conversion:
+            return
+        finished, total = batch.finished_count(), batch.total()
+        if finished < total:
+            self.comment_text(comment=f"  converting {finished}/{total}: "
+                                      f"{os.path.basename(path)}")
+            return
+        self.conversion = None
+        comment = f"  converted {len(batch.converted)} layers to " \
+                  f"{batch.plan.target}"
+        if batch.failed:
+            path, error = batch.failed[0]
+            comment += f", {len(batch.failed)} failed " \
+                       f"({os.path.basename(path)}: {error})"
+        self.conversion_finished(batch)
+        self.comment_text(comment=comment)
+
+    def cancel_conversion(self):
+        # Layers already renamed into place stay converted
+        if self.conversion_dry_run is not None:
+            self.conversion_dry_run.set()
+            self.conversion_dry_run = None
+            self.comment_text(comment="  conversion cancelled!")
+        if self.conversion is not None:
+            batch = self.conversion
+            self.conversion = None
+            batch.cancel()
+            self.conversion_finished(batch)
+            self.comment_text(comment=f"  conversion cancelled, "
+                                      f"{len(batch.converted)} layers "
+                                      f"converted!")
+
+    def conversion_finished(self, batch):
+        # Folders outside the watched ones are counted again too, the
+        # same way as changes the watcher reports
+        folders = sorted({os.path.dirname(conversion.destination)
+                          for conversion in batch.converted})
+        if folders:
+            self.service.apply_disk_changes(folders)
+
+    @perftrace.traced()
     def search_directories(self):
+        # Filters the entries already scanned for the current directory,
+        # nothing is read from disk
+        self.search_timer.stop()
         query = self.search_bar.text()
-        if query:
-            self.scene_list.clear()
-            self.current_node.subdirs_present = False
-            items = os.listdir(self.current_node.path)
-            items.sort()
-            for file in items:
-                path = os.path.join(self.current_node.path, file)
-                if os.path.isdir(path) and query.lower() in file.lower():
-                    self.scene_list.addItem(file)
-                    self.tree.add_path(path + '/')
-                    self.tree.node = self.current_node
-                    self.current_node.subdirs_present = True
-                elif file.lower().endswith('.usd') \
-                        and query.lower() in file.lower():
-                    file_item = QListWidgetItem(file)
-                    file_item.setForeground(QBrush(QColor('#36C3F1')))
-                    self.scene_list.addItem(file_item)
-                elif file.lower().endswith('.usda') \
-                        and query.lower() in file.lower():
-                    file_item = QListWidgetItem(file)
-                    file_item.setForeground(QBrush(QColor('#1F8ECD')))
-                    self.scene_list.addItem(file_item)
-                elif file.lower().endswith('.usdc') \
-                        and query.lower() in file.lower():
-                    file_item = QListWidgetItem(file)
-                    file_item.setForeground(QBrush(QColor('#5DAADA')))
-                    self.scene_list.addItem(file_item)
-        else:
-            self.update_scene_list()
+        if query.startswith('/'):
+            self.search_project(query[1:])
+            return
 
-    def sort_items(self):
-        if not self.ascending_order:
-            self.ascending_order = True
-            self.dir_items.sort()
-            self.comment_text(comment="")
-        elif self.ascending_order:
-            self.ascending_order = False
-            self.dir_items.sort(reverse=True)
+        if self.scene_model.filter_text is None:
+            # Leaving project-wide results
             self.comment_text(comment="")
+        self.scene_model.set_filter(query)
+        self.current_node.subdirs_present = bool(self.scene_model.shown_dirs)
+        if self.result_batch is not None:
+            self.result_batch.cancel()
+            self.result_batch = None
+
+    def search_project(self, query):
+        # `/name` searches the whole project, see projectindex.parse_query
+        index = self.core.index
+        if self.project.index_stale:
+            # Files changed on disk since the index was built
+            self.build_project_index()
+        if index is None:
+            self.scene_model.clear()
+            self.comment_text(comment="  indexing project...")
+            return
+
+        dir_entries, file_entries = self.core.search_project(query)
+        if self.result_batch is not None:
+            self.result_batch.cancel()
+        self.scene_model.show_results(dir_entries, file_entries)
+        self.result_batch = self.count_subtrees(dir_entries)
+        self.comment_text(comment=f"  {len(dir_entries) + len(file_entries)}"
+                                  f" matches in project")
+
+    def sort_items(self):
+        self.ascending_order = not self.ascending_order
+        self.comment_text(comment="")
 
     def comment_text(self, comment):
+        self.comment = comment
+        if not comment and self.debug_overlay and self.last_trace is not None:
+            comment = '  ' + self.last_trace.describe()
         comment_font = QtGui.QFont("TerminessTTF Nerd Font Mono", 12,
                                    QtGui.QFont.Bold)
         self.cmt_label.setFont(comment_font)
@@ -723,36 +1172,97 @@ class UsdBrowser(QtWidgets.QWidget):
         self.cmt_label.setPalette(palette)
         return self.cmt_label.text()
 
+    # Instrumentation
+    def set_debug_overlay(self, enabled):
+        self.debug_overlay = enabled
+        if enabled:
+            perftrace.enable()
+            if self.show_trace not in perftrace.recorder.listeners:
+                perftrace.recorder.listeners.append(self.show_trace)
+        else:
+            if self.show_trace in perftrace.recorder.listeners:
+                perftrace.recorder.listeners.remove(self.show_trace)
+            self.last_trace = None
+            self.cmt_label.setToolTip("")
+        self.comment_text(self.comment)
+
+    def show_trace(self, record):
+        # Top level operations of the panel only, not nested calls or
+        # work on the scan pool
+        if record.depth or threading.current_thread() is not \
+                threading.main_thread():
+            return
+        self.last_trace = record
+        recent = [trace for trace in perftrace.records()
+                  if not trace.depth][-TRACE_TOOLTIP_LINES:]
+        self.cmt_label.setToolTip('\n'.join(trace.describe()
+                                            for trace in reversed(recent)))
+        self.comment_text(self.comment)
+
+    def export_trace(self):
+        # .json writes the operations and totals, *.trace.json a Chrome
+        # trace for chrome://tracing or Perfetto
+        path = hou.ui.selectFile(title='Export Trace',
+                                 file_type=hou.fileType.Any,
+                                 pattern='*.json',
+                                 chooser_mode=hou.fileChooserMode.Write)
+        if not path:
+            return
+        path = hou.expandString(path)
+        try:
+            if path.endswith('.trace.json'):
+                perftrace.write_chrome_trace(path)
+            else:
+                perftrace.write_json(path)
+        except OSError:
+            self.comment_text(comment="  can't write the trace!")
+            return
+        self.comment_text(comment="  trace exported: "
+                                  + os.path.basename(path))
+
     # Navigation Methods
     def redo_click_forward(self):
-        selected_item = self.scene_list.currentItem()
+        selected_item = self.selected_entry()
 
-        if selected_item is None:
-            if len(self.back_stack) >= 1 and self.current_node.subdirs_present:
-                node = self.back_stack.pop()
-                self.current_node.path = node
-            elif len(self.back_stack) <= 0 \
-                    and self.current_node.subdirs_present:
-                return
-            elif not self.current_node.subdirs_present:
-                self.comment_text(comment="  no more subdirectories!")
-                return
-
-        self.ascending_order = True
-        self.sort_btn_clicked = False
-        self.update_scene_list()
+        if selected_item is not None:
+            return
+        if self.history.can_go_forward():
+            self.restore_view(self.history.forward())
+        elif not self.current_node.subdirs_present:
+            self.comment_text(comment="  no more subdirectories!")
+
+    def selected_entry(self):
+        return self.scene_model.entry(self.scene_list.currentIndex())
+
+    def selected_entries(self):
+        # Selected rows in list order, the current row when none are
+        if self.tree_mode:
+            indexes = self.scene_tree.selectionModel().selectedIndexes()
+            entries = sorted((self.tree_model.entry(index)
+                              for index in indexes),
+                             key=lambda entry: entry.path)
+            if not entries:
+                entries = [self.tree_model.entry(
+                    self.scene_tree.currentIndex())]
+            return [entry for entry in entries if entry is not None]
+        indexes = sorted(self.scene_list.selectionModel().selectedIndexes(),
+                         key=lambda index: index.row())
+        entries = [self.scene_model.entry(index) for index in indexes]
+        if not entries:
+            entries = [self.selected_entry()]
+        return [entry for entry in entries if entry is not None]
 
     def double_click_forward(self):
-        # Double clicking a directory acts as a forward button
-        self.back_stack.clear()
+        # Double clicking a directory acts as a forward button, on a
+        # sequence it shows or hides the frames
         self.forward_button()
 
     # Event handling methods
     def mousePressEvent(self, event):
         if event.button() == QtCore.Qt.LeftButton:
-            item = self.scene_list.itemAt(event.pos())
-            if item:
-                if item.isSelected():
+            index = self.scene_list.indexAt(event.pos())
+            if index.isValid():
+                if self.scene_list.selectionModel().isSelected(index):
                     self.scene_list.clearSelection()
             else:
                 self.scene_list.clearSelection()
@@ -785,7 +1295,7 @@ class UsdBrowser(QtWidgets.QWidget):
         elif event.key() == QtCore.Qt.Key_Return:
             if self.search_bar.hasFocus():
                 self.search_bar.clearFocus()
-                self.scene_list.setCurrentRow(0)
+                self.scene_list.setCurrentIndex(self.scene_model.index(0))
                 self.scene_list.setFocus()
                 self.enter_pressed_on_search_bar = True
             else:
@@ -801,6 +1311,11 @@ class UsdBrowser(QtWidgets.QWidget):
             if self.scene_list.hasFocus():
                 self.double_click_forward()
 
+        elif event.matches(QKeySequence("Ctrl+Shift+D")):
+            self.set_debug_overlay(not self.debug_overlay)
+        elif event.matches(QKeySequence("Ctrl+Shift+E")):
+            self.export_trace()
+
         # Delete all text in search bar
         elif event.matches(QKeySequence("Ctrl+Backspace")) \
                 and self.search_bar.hasFocus():
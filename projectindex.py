@@ -0,0 +1,250 @@
+import heapq
+import os
+import re
+import sys
+from array import array
+from bisect import bisect_right
+
+try:
+    from . import storage
+except ImportError:
+    import storage
+
+KIND_DIR = 0
+KIND_USD = 1
+KIND_USDA = 2
+KIND_USDC = 3
+KIND_EXTENSIONS = ((KIND_USD, '.usd'), (KIND_USDA, '.usda'),
+                   (KIND_USDC, '.usdc'))
+
+MODE_SUBSTRING = 'substring'
+MODE_GLOB = 'glob'
+MODE_FUZZY = 'fuzzy'
+
+DEFAULT_LIMIT = 500
+# Stop collecting candidates for very unselective queries
+MAX_CANDIDATES = 50000
+
+
+def file_kind(name):
+    for kind, extension in KIND_EXTENSIONS:
+        if name.endswith(extension):
+            return kind
+    return None
+
+
+def parse_query(text):
+    # `~name` is fuzzy, wildcards make a glob, anything else is a substring
+    if text.startswith('~'):
+        return MODE_FUZZY, text[1:]
+    if any(char in text for char in '*?['):
+        return MODE_GLOB, text
+    return MODE_SUBSTRING, text
+
+
+def glob_to_regex(pattern):
+    # Like fnmatch.translate, but a match may not leave its own line
+    parts = []
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        i += 1
+        if char == '*':
+            parts.append('[^\n]*')
+        elif char == '?':
+            parts.append('[^\n]')
+        elif char == '[':
+            end = pattern.find(']', i + 1 if pattern[i:i + 1] == '!' else i)
+            if end == -1:
+                parts.append(re.escape(char))
+                continue
+            body = pattern[i:end].replace('\\', '\\\\')
+            if body.startswith('!'):
+                body = '^' + body[1:]
+            parts.append('[' + body + ']')
+            i = end + 1
+        else:
+            parts.append(re.escape(char))
+    return re.compile('^' + ''.join(parts) + '$', re.MULTILINE)
+
+
+def fuzzy_to_regex(query):
+    parts = [re.escape(char) for char in query]
+    return re.compile('[^\n]*?'.join(parts))
+
+
+def searchable_names(names):
+    # The newline-joined `names` lowercased for searching, with their
+    # offsets still valid. Lowercasing never shortens a name but a few
+    # characters grow ('İ' becomes 'i' and a combining dot), those names
+    # are kept as is
+    lower = names.lower()
+    if len(lower) == len(names):
+        return lower
+    lowered = []
+    for name in names.split('\n')[:-1]:
+        lower = name.lower()
+        lowered.append(lower if len(lower) == len(name) else name)
+    return '\n'.join(lowered) + '\n'
+
+
+class ProjectIndex:
+    # Every directory and usd file under `root`. Names live in one
+    # newline-joined string and the rest in typed arrays, so an entry
+    # costs a few bytes instead of a Python object per path
+    def __init__(self, root):
+        self.root = os.path.normpath(root)
+        self.names = ''
+        self.lower_names = ''
+        self.offsets = array('q')
+        self.parents = array('q')
+        self.kinds = array('B')
+        self.complete = False
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def build(self, cancel=None):
+        names = []
+        offsets = array('q')
+        parents = array('q')
+        kinds = array('B')
+        offset = 0
+        # (directory path, index of that directory), -1 is the root
+        stack = [(self.root, -1)]
+        while stack:
+            if cancel is not None and cancel.is_set():
+                return self
+            top, parent = stack.pop()
+            try:
+                _, entries = storage.list_dir(top)
+            except OSError:
+                continue
+            for entry in entries:
+                if '\n' in entry.name:
+                    # The name separator, such a folder is left out with
+                    # everything under it
+                    continue
+                is_dir = entry.is_dir
+                if is_dir:
+                    kind = KIND_DIR
+                else:
+                    kind = file_kind(entry.name)
+                    if kind is None:
+                        continue
+                index = len(kinds)
+                names.append(entry.name)
+                offsets.append(offset)
+                parents.append(parent)
+                kinds.append(kind)
+                offset += len(entry.name) + 1
+                if is_dir and not entry.is_symlink:
+                    stack.append((os.path.join(top, entry.name), index))
+
+        self.names = '\n'.join(names) + '\n' if names else ''
+        self.lower_names = searchable_names(self.names)
+        self.offsets = offsets
+        self.parents = parents
+        self.kinds = kinds
+        self.complete = True
+        return self
+
+    def name(self, index):
+        start = self.offsets[index]
+        return self.names[start:self.names.index('\n', start)]
+
+    def is_dir(self, index):
+        return self.kinds[index] == KIND_DIR
+
+    def relative_path(self, index):
+        parts = []
+        while index != -1:
+            parts.append(self.name(index))
+            index = self.parents[index]
+        return os.path.join(*reversed(parts))
+
+    def path(self, index):
+        return os.path.join(self.root, self.relative_path(index))
+
+    def depth(self, index):
+        depth = 0
+        while index != -1:
+            depth += 1
+            index = self.parents[index]
+        return depth
+
+    def _index_at(self, position):
+        return bisect_right(self.offsets, position) - 1
+
+    def _name_end(self, index):
+        if index + 1 < len(self.offsets):
+            return self.offsets[index + 1] - 1
+        return len(self.names) - 1
+
+    def search(self, text, limit=DEFAULT_LIMIT):
+        # Ranked entry indices matching `text`, best match first
+        mode, query = parse_query(text)
+        query = query.lower()
+        if not query or not self.complete:
+            return []
+        if mode == MODE_GLOB:
+            candidates = self._search_glob(query)
+        elif mode == MODE_FUZZY:
+            candidates = self._search_fuzzy(query)
+        else:
+            candidates = self._search_substring(query)
+        ranked = heapq.nsmallest(limit, candidates)
+        return [index for _score, index in ranked]
+
+    def _search_substring(self, query):
+        lower_names = self.lower_names
+        found = []
+        position = lower_names.find(query)
+        while position != -1 and len(found) < MAX_CANDIDATES:
+            index = self._index_at(position)
+            start = self.offsets[index]
+            length = self._name_end(index) - start
+            # Whole name, then prefix, then anywhere; shorter names first
+            if position == start and length == len(query):
+                rank = 0
+            elif position == start:
+                rank = 1
+            else:
+                rank = 2
+            found.append(((rank, length, self.kinds[index] != KIND_DIR),
+                          index))
+            position = lower_names.find(query, self._name_end(index) + 1)
+        return found
+
+    def _search_glob(self, query):
+        found = []
+        for match in glob_to_regex(query).finditer(self.lower_names):
+            index = self._index_at(match.start())
+            length = match.end() - match.start()
+            found.append(((length, self.kinds[index] != KIND_DIR), index))
+            if len(found) >= MAX_CANDIDATES:
+                break
+        return found
+
+    def _search_fuzzy(self, query):
+        found = []
+        seen = set()
+        for match in fuzzy_to_regex(query).finditer(self.lower_names):
+            index = self._index_at(match.start())
+            if index in seen:
+                continue
+            seen.add(index)
+            start = self.offsets[index]
+            # Fewer skipped characters rank higher, as do matches that
+            # begin at the start of the name
+            gaps = match.end() - match.start() - len(query)
+            found.append(((gaps, match.start() != start,
+                           self._name_end(index) - start), index))
+            if len(found) >= MAX_CANDIDATES:
+                break
+        return found
+
+    def memory_footprint(self):
+        return sum(sys.getsizeof(value) for value in (
+            self.names, self.lower_names, self.offsets, self.parents,
+            self.kinds))
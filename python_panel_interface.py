@@ -2,9 +2,12 @@ import hou
 import os
 import sys
 import project
-import importlib
+import startup
 
-importlib.reload(project)
+# Modules are only reloaded in dev mode (USDBROWSER_DEV=1), otherwise every
+# pane reuses the loaded modules, UI form and icons
+if startup.dev_mode():
+    startup.reload_modules()
 script_path = os.path.join(os.path.dirname(__file__), 'project.py')
 sys.path.append(os.path.dirname(script_path))
 
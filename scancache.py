@@ -0,0 +1,329 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    from . import scanner, storage
+except ImportError:
+    import scanner
+    import storage
+
+CACHE_FILE = 'usdbrowser_scancache.sqlite'
+DEFAULT_MAX_ENTRIES = 250000
+# Directories modified this close to their scan time are listed again,
+# a second change inside the same mtime tick would go unnoticed otherwise
+RACY_SECONDS = 2.0
+# last_used is only rewritten once it is this old, keeps LRU writes cheap
+TOUCH_INTERVAL = 3600.0
+# Directories checked against disk this recently are trusted without a
+# stat by fresh lookups, this is what makes prefetched folders instant
+FRESH_SECONDS = 30.0
+MAX_LISTINGS = 512
+
+
+def default_cache_path(pref_dir=None):
+    if not pref_dir:
+        pref_dir = os.environ.get('HOUDINI_USER_PREF_DIR') \
+                   or os.path.expanduser('~')
+    return os.path.join(pref_dir, CACHE_FILE)
+
+
+class DirRecord:
+    __slots__ = ('mtime_ns', 'scanned_at', 'counts', 'subdirs', 'last_used',
+                 'checked_at', 'usage')
+
+    def __init__(self, mtime_ns, scanned_at, counts, subdirs, last_used,
+                 usage=None):
+        self.mtime_ns = mtime_ns
+        self.scanned_at = scanned_at
+        self.counts = counts
+        self.subdirs = subdirs
+        self.last_used = last_used
+        # DiskUsage of the directory's own files, None when it was listed
+        # without file stats
+        self.usage = usage
+        # Last time the mtime was compared with the disk, memory only
+        self.checked_at = 0.0
+
+    def is_valid(self, mtime_ns):
+        return self.mtime_ns == mtime_ns \
+            and self.scanned_at - mtime_ns / 1e9 > RACY_SECONDS
+
+
+class ScanCache:
+    # Per-directory usd counts and disk usage validated against directory
+    # mtimes. Each directory stores only its own files and subdirectory
+    # names, so a subtree total re-lists just the directories whose mtime
+    # changed
+    def __init__(self, path=None, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path or ':memory:'
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.RLock()
+        self._records = OrderedDict()
+        self._dirty = set()
+        # Full listings of recently visited or prefetched directories,
+        # path -> (checked_at, mtime_ns, [(name, is_dir), ...])
+        self._listings = OrderedDict()
+        self._db = self._connect(self.path)
+
+    def _connect(self, path):
+        try:
+            if path != ':memory:':
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            db = sqlite3.connect(path, check_same_thread=False)
+            self._create_schema(db)
+        except (OSError, sqlite3.Error):
+            # Unwritable preference dir, keep the cache for this session
+            self.path = ':memory:'
+            db = sqlite3.connect(':memory:', check_same_thread=False)
+            self._create_schema(db)
+        return db
+
+    def _create_schema(self, db):
+        db.execute('CREATE TABLE IF NOT EXISTS dirs ('
+                   'path TEXT PRIMARY KEY, mtime_ns INTEGER, '
+                   'scanned_at REAL, usd INTEGER, usda INTEGER, '
+                   'usdc INTEGER, subdirs TEXT, last_used REAL, '
+                   'usage TEXT)')
+        columns = [row[1] for row in db.execute('PRAGMA table_info(dirs)')]
+        if 'usage' not in columns:
+            # Cache written before disk usage was recorded
+            db.execute('ALTER TABLE dirs ADD COLUMN usage TEXT')
+        db.execute('CREATE INDEX IF NOT EXISTS dirs_last_used '
+                   'ON dirs (last_used)')
+        db.commit()
+
+    def _load(self, path):
+        record = self._records.get(path)
+        if record is not None:
+            self._records.move_to_end(path)
+            return record
+
+        row = self._db.execute('SELECT mtime_ns, scanned_at, usd, usda, '
+                               'usdc, subdirs, last_used, usage FROM dirs '
+                               'WHERE path = ?', (path,)).fetchone()
+        if row is None:
+            return None
+        mtime_ns, scanned_at, usd, usda, usdc, subdirs, last_used, usage = row
+        record = DirRecord(mtime_ns, scanned_at,
+                           scanner.UsdCounts(usd, usda, usdc),
+                           subdirs.split('\n') if subdirs else [],
+                           last_used,
+                           scanner.DiskUsage.from_dict(json.loads(usage))
+                           if usage else None)
+        self._remember(path, record)
+        return record
+
+    def _remember(self, path, record):
+        self._records[path] = record
+        self._records.move_to_end(path)
+        while len(self._records) > self.max_entries:
+            self._records.popitem(last=False)
+
+    def _store(self, path, mtime_ns, counts, subdirs, usage=None):
+        now = time.time()
+        record = DirRecord(mtime_ns, now, counts, subdirs, now, usage)
+        record.checked_at = now
+        self._remember(path, record)
+        self._dirty.add(path)
+        return record
+
+    def lookup(self, path, mtime_ns, usage=False):
+        # Cached (counts, subdirs, usage) for one directory, None when
+        # stale or, with `usage`, when it was listed without file stats
+        path = os.path.normpath(path)
+        with self._lock:
+            record = self._load(path)
+            if record is None or not record.is_valid(mtime_ns) \
+                    or usage and record.usage is None:
+                return None
+            now = time.time()
+            record.checked_at = now
+            if now - record.last_used > TOUCH_INTERVAL:
+                record.last_used = now
+                self._dirty.add(path)
+            return record.counts, record.subdirs, record.usage
+
+    def _fresh(self, path, usage=False):
+        with self._lock:
+            record = self._records.get(path)
+            if record is not None \
+                    and time.time() - record.checked_at < FRESH_SECONDS \
+                    and (record.usage is not None or not usage):
+                return record.counts, record.subdirs, record.usage
+        return None
+
+    def store(self, path, mtime_ns, counts, subdirs, usage=None):
+        with self._lock:
+            self._store(os.path.normpath(path), mtime_ns, counts, subdirs,
+                        usage)
+
+    def level(self, path, fresh=False, usage=False):
+        # Own counts, subdirectories and disk usage of `path`, listed only
+        # when stale. With `fresh` a recently checked record skips the
+        # stat as well. Usage is None unless asked for with `usage`
+        path = os.path.normpath(path)
+        if fresh:
+            cached = self._fresh(path, usage)
+            if cached is not None:
+                self.hits += 1
+                return cached
+        mtime_ns = storage.dir_mtime(path)
+        cached = self.lookup(path, mtime_ns, usage)
+        if cached is not None:
+            self.hits += 1
+            return cached
+        self.misses += 1
+        return self._list(path, usage)
+
+    def _list(self, path, usage):
+        mtime_ns, entries = storage.list_dir(path, usage)
+        counts, subdirs = scanner.level_counts(entries)
+        level = scanner.level_usage(mtime_ns, entries) if usage else None
+        self.store(path, mtime_ns, counts, subdirs, level)
+        return counts, subdirs, level
+
+    def subtree_counts(self, path, cancel=None, fresh=False):
+        totals = self.subtree_totals(path, cancel, fresh, usage=False)
+        return totals[0] if totals is not None else None
+
+    def subtree_totals(self, path, cancel=None, fresh=False, usage=True):
+        # (counts, DiskUsage or None) of the whole subtree in one walk
+        total = scanner.UsdCounts()
+        total_usage = scanner.DiskUsage() if usage else None
+        stack = [path]
+        while stack:
+            if cancel is not None and cancel.is_set():
+                return None
+            top = stack.pop()
+            try:
+                counts, subdirs, level = self.level(top, fresh, usage)
+            except OSError:
+                continue
+            total.add(counts)
+            if usage:
+                total_usage.add(level)
+            stack.extend(os.path.join(top, name) for name in subdirs)
+        return total, total_usage
+
+    def level_change(self, path, usage=False):
+        # List a directory changed on disk and return how its own files
+        # changed as (counts delta, usage delta or None), so totals above
+        # it can be adjusted without walking their subtrees. None when the
+        # old level is unknown or its subdirectories changed, the subtree
+        # has to be counted again then
+        path = os.path.normpath(path)
+        with self._lock:
+            old = self._load(path)
+        counts, subdirs, level = self._list(path, usage)
+        if old is None or sorted(old.subdirs) != sorted(subdirs) \
+                or usage and old.usage is None:
+            return None
+        counts_delta = counts.copy()
+        counts_delta.subtract(old.counts)
+        usage_delta = None
+        if usage:
+            usage_delta = level.copy()
+            usage_delta.subtract(old.usage)
+        return counts_delta, usage_delta
+
+    def store_listing(self, path, mtime_ns, entries):
+        with self._lock:
+            path = os.path.normpath(path)
+            self._listings[path] = (time.time(), mtime_ns, entries)
+            self._listings.move_to_end(path)
+            while len(self._listings) > MAX_LISTINGS:
+                self._listings.popitem(last=False)
+
+    def listing(self, path):
+        # (mtime_ns, [(name, is_dir), ...]) of a directory listed within
+        # FRESH_SECONDS, otherwise None
+        with self._lock:
+            cached = self._listings.get(os.path.normpath(path))
+            if cached is None or time.time() - cached[0] >= FRESH_SECONDS:
+                return None
+            return cached[1], cached[2]
+
+    def expire(self, path=None):
+        # Stop trusting `path`, or every directory, without a stat. Used
+        # when the disk is known to have changed
+        with self._lock:
+            if path is None:
+                self._listings.clear()
+                records = self._records.values()
+            else:
+                path = os.path.normpath(path)
+                self._listings.pop(path, None)
+                record = self._records.get(path)
+                records = [record] if record is not None else []
+            for record in records:
+                record.checked_at = 0.0
+
+    def invalidate(self, path):
+        # Drop `path` and everything below it
+        path = os.path.normpath(path)
+        prefix = path.rstrip(os.sep) + os.sep
+        with self._lock:
+            for key in [key for key in self._records
+                        if key == path or key.startswith(prefix)]:
+                del self._records[key]
+                self._dirty.discard(key)
+            for key in [key for key in self._listings
+                        if key == path or key.startswith(prefix)]:
+                del self._listings[key]
+            self._db.execute('DELETE FROM dirs WHERE path = ? '
+                             'OR substr(path, 1, ?) = ?',
+                             (path, len(prefix), prefix))
+            self._db.commit()
+
+    def flush(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            rows = []
+            for path in self._dirty:
+                record = self._records.get(path)
+                if record is None:
+                    continue
+                usage = json.dumps(record.usage.as_dict()) \
+                    if record.usage is not None else None
+                rows.append((path, record.mtime_ns, record.scanned_at,
+                             record.counts.usd, record.counts.usda,
+                             record.counts.usdc, '\n'.join(record.subdirs),
+                             record.last_used, usage))
+            self._dirty.clear()
+            try:
+                self._db.executemany(
+                    'INSERT OR REPLACE INTO dirs (path, mtime_ns, '
+                    'scanned_at, usd, usda, usdc, subdirs, last_used, usage) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+                self._evict()
+                self._db.commit()
+            except sqlite3.Error:
+                self._db.rollback()
+
+    def _evict(self):
+        count = self._db.execute('SELECT COUNT(*) FROM dirs').fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            self._db.execute('DELETE FROM dirs WHERE path IN (SELECT path '
+                             'FROM dirs ORDER BY last_used LIMIT ?)',
+                             (excess,))
+
+    def clear(self):
+        with self._lock:
+            self._records.clear()
+            self._dirty.clear()
+            self._listings.clear()
+            self._db.execute('DELETE FROM dirs')
+            self._db.commit()
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            self._db.close()
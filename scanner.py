@@ -0,0 +1,274 @@
+import os
+
+try:
+    from . import storage
+except ImportError:
+    import storage
+
+USD_EXTENSIONS = ('.usd', '.usda', '.usdc')
+
+
+class UsdCounts:
+    __slots__ = ('usd', 'usda', 'usdc')
+
+    def __init__(self, usd=0, usda=0, usdc=0):
+        self.usd = usd
+        self.usda = usda
+        self.usdc = usdc
+
+    def add_file(self, filename):
+        if filename.endswith('.usd'):
+            self.usd += 1
+        elif filename.endswith('.usda'):
+            self.usda += 1
+        elif filename.endswith('.usdc'):
+            self.usdc += 1
+
+    def add(self, other):
+        self.usd += other.usd
+        self.usda += other.usda
+        self.usdc += other.usdc
+
+    def subtract(self, other):
+        self.usd -= other.usd
+        self.usda -= other.usda
+        self.usdc -= other.usdc
+
+    def copy(self):
+        return UsdCounts(self.usd, self.usda, self.usdc)
+
+    def total(self):
+        return self.usd + self.usda + self.usdc
+
+    def as_tuple(self):
+        return self.usd, self.usda, self.usdc
+
+    def __eq__(self, other):
+        return isinstance(other, UsdCounts) \
+            and self.as_tuple() == other.as_tuple()
+
+    def __repr__(self):
+        return f"UsdCounts(usd={self.usd}, usda={self.usda}, " \
+               f"usdc={self.usdc})"
+
+
+class DiskUsage:
+    # Bytes, file count and newest modification of a directory or subtree.
+    # The newest mtime includes the directories themselves: creating,
+    # renaming or deleting a file touches its directory, so a subtree's
+    # newest mtime only ever grows and sums of levels stay exact
+    __slots__ = ('files', 'bytes', 'newest_mtime_ns', 'by_extension')
+
+    def __init__(self, files=0, bytes=0, newest_mtime_ns=0,
+                 by_extension=None):
+        self.files = files
+        self.bytes = bytes
+        self.newest_mtime_ns = newest_mtime_ns
+        # '.ext' (lowercase, '' without one) -> bytes
+        self.by_extension = by_extension if by_extension is not None else {}
+
+    def add_file(self, name, size, mtime_ns):
+        extension = os.path.splitext(name)[1].lower()
+        self.files += 1
+        self.bytes += size
+        self.by_extension[extension] = \
+            self.by_extension.get(extension, 0) + size
+        self.touch(mtime_ns)
+
+    def touch(self, mtime_ns):
+        if mtime_ns and mtime_ns > self.newest_mtime_ns:
+            self.newest_mtime_ns = mtime_ns
+
+    def add(self, other):
+        self.files += other.files
+        self.bytes += other.bytes
+        for extension, size in other.by_extension.items():
+            self.by_extension[extension] = \
+                self.by_extension.get(extension, 0) + size
+        self.touch(other.newest_mtime_ns)
+
+    def subtract(self, other):
+        # Used for the difference between two scans of one directory,
+        # the newest mtime stays the newer of the two
+        self.files -= other.files
+        self.bytes -= other.bytes
+        for extension, size in other.by_extension.items():
+            left = self.by_extension.get(extension, 0) - size
+            if left:
+                self.by_extension[extension] = left
+            else:
+                self.by_extension.pop(extension, None)
+        self.touch(other.newest_mtime_ns)
+
+    def copy(self):
+        return DiskUsage(self.files, self.bytes, self.newest_mtime_ns,
+                         dict(self.by_extension))
+
+    def largest_extensions(self, limit=5):
+        return sorted(self.by_extension.items(),
+                      key=lambda item: item[1], reverse=True)[:limit]
+
+    def as_dict(self):
+        return {'files': self.files, 'bytes': self.bytes,
+                'newest_mtime_ns': self.newest_mtime_ns,
+                'by_extension': self.by_extension}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['files'], data['bytes'], data['newest_mtime_ns'],
+                   dict(data['by_extension']))
+
+    def __eq__(self, other):
+        return isinstance(other, DiskUsage) \
+            and self.as_dict() == other.as_dict()
+
+    def __repr__(self):
+        return f"DiskUsage(files={self.files}, bytes={self.bytes}, " \
+               f"newest_mtime_ns={self.newest_mtime_ns})"
+
+
+class ScanEntry:
+    __slots__ = ('name', 'path', 'is_dir', 'counts', 'usage')
+
+    def __init__(self, name, path, is_dir, counts=None, usage=None):
+        self.name = name
+        self.path = path
+        self.is_dir = is_dir
+        # Subtree usd/usda/usdc counts, only set for directories
+        self.counts = counts
+        # DiskUsage of the file, or of the subtree of a directory. Only
+        # gathered while the size column is shown
+        self.usage = usage
+
+
+class DirectoryScan:
+    def __init__(self, path):
+        self.path = path
+        self.entries = []
+        self.by_name = {}
+        # Totals over all subdirectories, shown in the header labels
+        self.counts = UsdCounts()
+        # Usd files directly inside `path`
+        self.file_counts = UsdCounts()
+        # Directories whose subtree counts are not known yet
+        self.unscanned = 0
+        self.mtime_ns = None
+        # Bumped by every change, sorted orders are kept until it moves
+        self.version = 0
+
+    def add_entry(self, entry):
+        self.version += 1
+        self.entries.append(entry)
+        self.by_name[entry.name] = entry
+        if entry.counts is not None:
+            self.counts.add(entry.counts)
+        if not entry.is_dir:
+            self.file_counts.add_file(entry.name)
+        elif entry.counts is None:
+            self.unscanned += 1
+
+    def set_counts(self, name, counts, usage=None):
+        entry = self.by_name[name]
+        self.version += 1
+        if entry.counts is None:
+            self.unscanned -= 1
+        else:
+            self.counts.subtract(entry.counts)
+        entry.counts = counts
+        entry.usage = usage
+        self.counts.add(counts)
+
+    def pending(self, usage=False):
+        # Directories still to count, with `usage` also the ones counted
+        # without their disk usage
+        return [entry for entry in self.entries if entry.is_dir
+                and (entry.counts is None or usage and entry.usage is None)]
+
+    def names(self):
+        return [entry.name for entry in self.entries]
+
+    def dir_names(self):
+        return [entry.name for entry in self.entries if entry.is_dir]
+
+
+def level_counts(entries):
+    # Direct usd counts and real subdirectory names from the storage
+    # entries of one directory, symlinked directories are skipped the
+    # same way os.walk skips them
+    counts = UsdCounts()
+    subdirs = []
+    for entry in entries:
+        if entry.is_dir:
+            if not entry.is_symlink:
+                subdirs.append(entry.name)
+        else:
+            counts.add_file(entry.name)
+    return counts, subdirs
+
+
+def level_usage(mtime_ns, entries):
+    # Disk usage of the files directly inside one directory, from a
+    # listing made with `stats`
+    usage = DiskUsage(newest_mtime_ns=mtime_ns)
+    for entry in entries:
+        if not entry.is_dir:
+            usage.add_file(entry.name, entry.size or 0, entry.mtime_ns)
+    return usage
+
+
+def scan_level(path, stats=False):
+    # (counts, subdirs, usage or None without `stats`)
+    mtime_ns, entries = storage.list_dir(path, stats)
+    counts, subdirs = level_counts(entries)
+    return counts, subdirs, level_usage(mtime_ns, entries) if stats else None
+
+
+def count_usd_files(path, counts=None, cancel=None, usage=None):
+    # Iterative walk, unreadable directories are skipped like os.walk.
+    # Returns None as soon as the `cancel` event is set. Sizes are added
+    # to `usage` in the same walk when one is given
+    if counts is None:
+        counts = UsdCounts()
+    stack = [path]
+    while stack:
+        if cancel is not None and cancel.is_set():
+            return None
+        top = stack.pop()
+        try:
+            own, subdirs, level = scan_level(top, usage is not None)
+        except OSError:
+            continue
+        counts.add(own)
+        if level is not None:
+            usage.add(level)
+        stack.extend(os.path.join(top, name) for name in subdirs)
+    return counts
+
+
+def list_directory(path, cache=None, stats=False):
+    # One listing of `path`, directory counts are left as None. A listing
+    # the ScanCache holds from the last few seconds is reused as is, it
+    # has names only so listings with file `stats` always go to storage
+    scan = DirectoryScan(path)
+    listing = cache.listing(path) if cache is not None and not stats \
+        else None
+    if listing is not None:
+        scan.mtime_ns, names = listing
+        for name, is_dir in names:
+            scan.add_entry(ScanEntry(name, os.path.join(path, name), is_dir))
+        return scan
+
+    scan.mtime_ns, entries = storage.list_dir(path, stats)
+    for entry in entries:
+        usage = None
+        if stats and not entry.is_dir:
+            usage = DiskUsage()
+            usage.add_file(entry.name, entry.size or 0, entry.mtime_ns)
+        scan.add_entry(ScanEntry(entry.name, os.path.join(path, entry.name),
+                                 entry.is_dir, usage=usage))
+    if cache is not None:
+        cache.store_listing(path, scan.mtime_ns,
+                            [(entry.name, entry.is_dir)
+                             for entry in scan.entries])
+    return scan
+
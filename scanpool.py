@@ -0,0 +1,171 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+try:
+    from . import scanner
+except ImportError:
+    import scanner
+
+# Scans are I/O bound, more threads than cores keeps NFS round-trips busy
+DEFAULT_WORKERS = min(16, (os.cpu_count() or 1) + 4)
+
+logger = logging.getLogger(__name__)
+
+
+class ScanBatch:
+    # Handle for the subtree scans of one listing
+    def __init__(self, pool=None):
+        self.cancel_event = threading.Event()
+        self.futures = []
+        # Subtree walks joined through ScanPool.count_subtrees, they may
+        # be shared with other batches and are only left on cancel
+        self.pool = pool
+        self.shared = []
+
+    def cancel(self):
+        self.cancel_event.set()
+        for future in self.futures:
+            future.cancel()
+        if self.pool is not None:
+            self.pool.leave(self)
+
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def done(self):
+        return all(future.done() for future in self.futures) \
+            and all(shared.future is not None and shared.future.done()
+                    for shared in self.shared)
+
+
+class SharedScan:
+    # One walk of a subtree and every batch waiting for its result
+    __slots__ = ('key', 'cancel_event', 'future', 'waiters')
+
+    def __init__(self, key):
+        self.key = key
+        self.cancel_event = threading.Event()
+        self.future = None
+        # [(batch, path as asked, callback), ...]
+        self.waiters = []
+
+
+class ScanPool:
+    def __init__(self, cache=None, max_workers=DEFAULT_WORKERS,
+                 remote=None):
+        self.cache = cache
+        # indexd.IndexClient answering subtree totals for every Houdini
+        # session, walks fall back to this process when it can't
+        self.remote = remote
+        # (path, usage) -> SharedScan of the walks queued or running
+        self._running = {}
+        self._lock = threading.RLock()
+        self._executor = ThreadPoolExecutor(
+            max_workers, thread_name_prefix='usdbrowser-scan')
+
+    def count_subtrees(self, paths, callback, usage=False):
+        # Fan out one task per directory. `callback(path, counts)` runs on
+        # the worker thread and is skipped once the batch is cancelled.
+        # With `usage` sizes are gathered in the same walk and the callback
+        # is `callback(path, counts, usage)`. A directory already being
+        # walked, e.g. for another pane on the same project, is not walked
+        # again: the batch joins the running scan and gets its result
+        batch = ScanBatch(self)
+        count = self._total if usage else self._count
+        for path in paths:
+            key = (os.path.normpath(path), bool(usage))
+            with self._lock:
+                shared = self._running.get(key)
+                start = shared is None
+                if start:
+                    shared = self._running[key] = SharedScan(key)
+                shared.waiters.append((batch, path, callback))
+                batch.shared.append(shared)
+            if start:
+                future = self._executor.submit(count, path,
+                                               shared.cancel_event)
+                shared.future = future
+                future.add_done_callback(partial(self._finished, shared))
+        return batch
+
+    def leave(self, batch):
+        # A cancelled batch stops waiting, walks nobody waits for any more
+        # are cancelled
+        with self._lock:
+            for shared in batch.shared:
+                shared.waiters = [waiter for waiter in shared.waiters
+                                  if waiter[0] is not batch]
+                if shared.waiters or self._running.get(shared.key) \
+                        is not shared:
+                    continue
+                del self._running[shared.key]
+                shared.cancel_event.set()
+                if shared.future is not None:
+                    shared.future.cancel()
+
+    def submit(self, fn, *args):
+        return self._executor.submit(fn, *args)
+
+    def _count(self, path, cancel):
+        totals = self._remote_totals(path, False, cancel)
+        if totals is not None:
+            return totals[0]
+        if self.cache is not None:
+            return self.cache.subtree_counts(path, cancel, fresh=True)
+        return scanner.count_usd_files(path, cancel=cancel)
+
+    def _total(self, path, cancel):
+        totals = self._remote_totals(path, True, cancel)
+        if totals is not None:
+            return totals
+        if self.cache is not None:
+            return self.cache.subtree_totals(path, cancel, fresh=True)
+        usage = scanner.DiskUsage()
+        counts = scanner.count_usd_files(path, cancel=cancel, usage=usage)
+        return (counts, usage) if counts is not None else None
+
+    def _remote_totals(self, path, usage, cancel):
+        # None when the daemon can't answer in time, the walk is done in
+        # this process then, or once `cancel` is set. A cancelled walk
+        # leaves the local one straight away
+        if self.remote is None or not self.remote.available() \
+                or cancel.is_set():
+            return None
+        try:
+            return self.remote.subtree_totals(path, usage, cancel)
+        except OSError:
+            return None
+
+    def _finished(self, shared, future):
+        with self._lock:
+            if self._running.get(shared.key) is shared:
+                del self._running[shared.key]
+            waiters = shared.waiters
+            shared.waiters = []
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is not None:
+            # An unreadable or vanished directory, or a broken cache: the
+            # rows waiting for it show nothing found instead of waiting
+            # for good
+            logger.warning("can't count %s", shared.key[0],
+                           exc_info=(type(error), error,
+                                     error.__traceback__))
+            result = (scanner.UsdCounts(), scanner.DiskUsage()) \
+                if shared.key[1] else scanner.UsdCounts()
+        else:
+            result = future.result()
+        if result is None:
+            return
+        if not isinstance(result, tuple):
+            result = (result,)
+        for batch, path, callback in waiters:
+            if not batch.cancelled():
+                callback(path, *result)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
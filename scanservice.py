@@ -0,0 +1,336 @@
+import logging
+import os
+
+from PySide2 import QtCore
+
+try:
+    from . import scancache, scanpool, projectindex, depgraph, watcher, \
+        storage, indexd
+    from .tree import Tree
+except ImportError:
+    import scancache
+    import scanpool
+    import projectindex
+    import depgraph
+    import watcher
+    import storage
+    import indexd
+    from tree import Tree
+
+logger = logging.getLogger(__name__)
+# The service of this Houdini session, see acquire
+_service = None
+
+
+class ServiceSignals(QtCore.QObject):
+    # Emitted from scan worker threads, delivered on the main thread
+    level_changed = QtCore.Signal(str, object)
+    indexed = QtCore.Signal(object, object)
+    analysed = QtCore.Signal(object, object)
+
+
+class SharedProject:
+    # Tree, project index and dependency graph of one project root, shared
+    # by every pane browsing it
+    __slots__ = ('root', 'tree', 'index', 'index_batch', 'index_stale',
+                 'graph', 'graph_batches')
+
+    def __init__(self, root):
+        self.root = os.path.normpath(root)
+        self.tree = Tree(root)
+        self.index = None
+        self.index_batch = None
+        # Files changed on disk since the index was built
+        self.index_stale = False
+        self.graph = None
+        self.graph_batches = []
+
+    def contains(self, path):
+        return path == self.root \
+            or path.startswith(self.root.rstrip(os.sep) + os.sep)
+
+    def cancel(self):
+        if self.index_batch is not None:
+            self.index_batch.cancel()
+            self.index_batch = None
+        for batch in self.graph_batches:
+            batch.cancel()
+        self.graph_batches = []
+
+
+class ScanService:
+    # The scan cache, scan pool, project trees and directory watcher of the
+    # Houdini session. Every browser pane subscribes to the one instance
+    # from acquire(), so panes on the same project walk each directory
+    # once and every change on disk is applied once, then passed on.
+    # Subscribers are UsdBrowser panes, called back on the main thread with
+    # apply_disk_changes(paths), roll_up_change(path, change, nodes),
+    # set_project_index(index) and set_dependency_graph(graph).
+    # With `indexd_socket` (see acquire) a running indexd.py answers the
+    # project index and subtree counts, shared with other Houdini sessions
+    def __init__(self, pref_dir=None, max_workers=scanpool.DEFAULT_WORKERS,
+                 indexd_socket=None):
+        self.pref_dir = pref_dir
+        self.cache = scancache.ScanCache(
+            scancache.default_cache_path(pref_dir))
+        self.remote = None
+        if indexd_socket != '0':
+            self.remote = indexd.connect(indexd_socket)
+        self.pool = scanpool.ScanPool(self.cache, max_workers, self.remote)
+        self.signals = ServiceSignals()
+        self.signals.level_changed.connect(self.roll_up_change)
+        self.signals.indexed.connect(self.set_index)
+        self.signals.analysed.connect(self.set_graph)
+        self.watcher = watcher.DirectoryWatcher()
+        self.watcher.changed.connect(self.apply_disk_changes)
+        self.subscribers = []
+        # subscriber -> project root, and the directories it watches
+        self.roots = {}
+        self.watched = {}
+        # root -> SharedProject
+        self.projects = {}
+        self.references = 0
+
+    # Subscribers
+    def subscribe(self, subscriber):
+        if subscriber not in self.subscribers:
+            self.subscribers.append(subscriber)
+
+    def unsubscribe(self, subscriber):
+        if subscriber in self.subscribers:
+            self.subscribers.remove(subscriber)
+        self.roots.pop(subscriber, None)
+        if self.watched.pop(subscriber, None) is not None:
+            self.update_watcher()
+        self.drop_unused()
+
+    def subscribers_of(self, project):
+        return [subscriber for subscriber in self.subscribers
+                if self.roots.get(subscriber) == project.root]
+
+    def open_project(self, subscriber, root):
+        # The shared state of `root` for `subscriber`, None to close its
+        # project. Projects nobody browses any more are dropped
+        if not root:
+            self.roots.pop(subscriber, None)
+            self.drop_unused()
+            return None
+        root = os.path.normpath(root)
+        self.roots[subscriber] = root
+        project = self.projects.get(root)
+        if project is None:
+            project = self.projects[root] = SharedProject(root)
+        self.drop_unused()
+        return project
+
+    def drop_unused(self):
+        used = set(self.roots.values())
+        for root in [root for root in self.projects if root not in used]:
+            self.projects.pop(root).cancel()
+
+    def watch(self, subscriber, paths):
+        # Directories `subscriber` wants changes of, one watcher serves the
+        # union of every pane
+        self.watched[subscriber] = list(paths)
+        self.update_watcher()
+
+    def update_watcher(self):
+        # Current directories of every pane first, they are not cut off by
+        # the watcher's limit
+        paths = [paths[0] for paths in self.watched.values() if paths]
+        for watched in self.watched.values():
+            paths.extend(watched[1:])
+        self.watcher.set_paths(paths)
+
+    # Project index and dependency graph
+    def build_index(self, project, force=False):
+        # A build already running is joined, a finished index is handed out
+        # again unless files changed since
+        running = project.index_batch is not None \
+            and not project.index_batch.done()
+        if running and not force:
+            return
+        if not running and not force and project.index is not None \
+                and not project.index_stale:
+            self.set_index(project, project.index)
+            return
+        if project.index_batch is not None:
+            project.index_batch.cancel()
+        project.index_stale = False
+        index = projectindex.ProjectIndex(project.root)
+        batch = project.index_batch = scanpool.ScanBatch()
+        future = self.pool.submit(self.fill_index, index, batch.cancel_event)
+        batch.futures.append(future)
+        future.add_done_callback(
+            lambda future: None if batch.cancelled() or future.exception()
+            else self.signals.indexed.emit(project, index))
+
+    def fill_index(self, index, cancel):
+        # Scan pool thread. The daemon's index when one is running
+        if self.remote is not None and self.remote.available():
+            try:
+                return self.remote.fill_index(index)
+            except OSError:
+                pass
+        return index.build(cancel)
+
+    def set_index(self, project, index):
+        if self.projects.get(project.root) is not project:
+            return
+        project.index = index
+        for subscriber in self.subscribers_of(project):
+            subscriber.set_project_index(index)
+
+    def analyse(self, project, force=False):
+        # Layers unchanged since the last session come from the cache, a
+        # graph another pane already built is handed out as it is
+        if project.graph is not None and not force:
+            if project.graph.complete:
+                self.set_graph(project, project.graph)
+            return
+        for batch in project.graph_batches:
+            batch.cancel()
+        project.graph_batches = []
+        project.graph = depgraph.DependencyGraph(
+            project.root, depgraph.default_cache_path(self.pref_dir))
+        self.submit_analysis(project, project.graph.scan)
+
+    def submit_analysis(self, project, scan, *args):
+        # Scans of one graph run one after the other, see DependencyGraph
+        graph = project.graph
+        project.graph_batches = [batch for batch in project.graph_batches
+                                 if not batch.done()]
+        batch = scanpool.ScanBatch()
+        future = self.pool.submit(scan, *args, batch.cancel_event)
+        batch.futures.append(future)
+
+        def finished(future):
+            if batch.cancelled() or future.cancelled():
+                return
+            error = future.exception()
+            if error is not None:
+                logger.warning("can't analyse the layers of %s",
+                               project.root, exc_info=(type(error), error,
+                                                       error.__traceback__))
+                return
+            self.signals.analysed.emit(project, graph)
+        future.add_done_callback(finished)
+        project.graph_batches.append(batch)
+
+    def set_graph(self, project, graph):
+        if self.projects.get(project.root) is not project \
+                or project.graph is not graph:
+            return
+        for subscriber in self.subscribers_of(project):
+            subscriber.set_dependency_graph(graph)
+
+    # Changes on disk
+    def apply_disk_changes(self, paths):
+        # One coalesced burst of directory changes, for every pane: caches
+        # are expired, indexes marked stale and the layers of the changed
+        # folders read again once. Each changed directory is then listed
+        # once, the difference goes up the project trees in roll_up_change
+        for path in paths:
+            storage.expire(path)
+            self.cache.expire(path)
+        for project in self.projects.values():
+            changed = [path for path in paths if project.contains(path)]
+            if not changed:
+                continue
+            project.index_stale = True
+            if project.graph is not None:
+                self.submit_analysis(project, project.graph.rescan_folders,
+                                     changed)
+        for subscriber in list(self.subscribers):
+            subscriber.apply_disk_changes(paths)
+        usage = any(subscriber.core.disk_usage
+                    for subscriber in self.subscribers)
+        if self.remote is not None:
+            # The daemon hears of the changes before anything is counted
+            # again, then the levels are listed one after the other
+            self.pool.submit(self.level_changes, list(paths), usage)
+            return
+        for path in paths:
+            self.pool.submit(self.level_change, path, usage)
+
+    def level_changes(self, paths, usage):
+        self.expire_remote(paths)
+        for path in paths:
+            self.level_change(path, usage)
+
+    def expire_remote(self, paths=None):
+        try:
+            self.remote.expire(paths)
+        except OSError:
+            pass
+
+    def expire(self):
+        # Refresh: every directory is checked against the disk again, by
+        # the daemon too
+        self.cache.expire()
+        if self.remote is not None:
+            self.pool.submit(self.expire_remote)
+
+    def level_change(self, path, usage):
+        # Scan pool thread. Not part of a scan batch: the cache already
+        # holds the new level, the trees have to get the difference
+        try:
+            change = self.cache.level_change(path, usage)
+        except OSError:
+            change = None
+        self.signals.level_changed.emit(path, change)
+
+    def roll_up_change(self, path, change):
+        for project in list(self.projects.values()):
+            if not project.contains(path):
+                continue
+            if change is None:
+                # Subdirectories came or went, or the directory was never
+                # counted: the panes count what they show again
+                if project.tree.lookup(path) is not None:
+                    project.tree.invalidate(path)
+                nodes = None
+            else:
+                nodes = project.tree.roll_up(path, *change)
+            for subscriber in self.subscribers_of(project):
+                subscriber.roll_up_change(path, change, nodes)
+        self.cache.flush()
+
+    def release(self):
+        # Called once per acquire(), the last pane closing shuts it down
+        global _service
+        self.references -= 1
+        if self.references > 0:
+            return
+        if _service is self:
+            _service = None
+        self.shutdown()
+
+    def shutdown(self):
+        for project in self.projects.values():
+            project.cancel()
+        self.projects = {}
+        self.subscribers = []
+        self.roots = {}
+        self.watched = {}
+        try:
+            self.watcher.clear()
+        except RuntimeError:
+            # Qt already deleted it, Houdini is quitting
+            pass
+        self.pool.shutdown()
+        if self.remote is not None:
+            self.remote.close()
+        # Walks still running may store into the cache, it is left open
+        self.cache.flush()
+
+
+def acquire(pref_dir=None, indexd_socket=None):
+    # The ScanService of this session, created by the first pane. Every
+    # acquire() is paired with a ScanService.release(). `indexd_socket` is
+    # the daemon's socket, empty for its default one and '0' for none
+    global _service
+    if _service is None:
+        _service = ScanService(pref_dir, indexd_socket=indexd_socket)
+    _service.references += 1
+    return _service
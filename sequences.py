@@ -0,0 +1,138 @@
+import os
+import re
+
+try:
+    from . import scanner
+except ImportError:
+    import scanner
+
+# name.0001.usdc, name_1001.usd: prefix, separator, frame, extension
+FRAME_PATTERN = re.compile(r'^(.*)([._])(-?\d+)(\.usd[ac]?)$')
+# Fewer numbered files than this are listed one by one
+MIN_SEQUENCE_FILES = 3
+# Missing ranges spelled out in the tooltip
+MAX_GAPS_SHOWN = 8
+
+
+def frame_token(padding):
+    # Houdini's frame variable, $F4 pads to four digits
+    return f"$F{padding}" if padding > 1 else '$F'
+
+
+class FileSequence:
+    # Numbered usd files of one directory shown as a single row. Looks like
+    # a scanner.ScanEntry of a file to the views: `path` is the Houdini
+    # path of the whole sequence with a $F token, `members` are the entries
+    # of the frames in frame order
+    __slots__ = ('name', 'path', 'is_dir', 'counts', 'usage', 'prefix',
+                 'separator', 'extension', 'padding', 'frames', 'members')
+
+    def __init__(self, directory, prefix, separator, extension, padding,
+                 frames, members):
+        self.prefix = prefix
+        self.separator = separator
+        self.extension = extension
+        self.padding = padding
+        self.frames = frames
+        self.members = members
+        self.name = f"{prefix}{separator}{'#' * max(padding, 1)}{extension}"
+        self.path = os.path.join(
+            directory, f"{prefix}{separator}{frame_token(padding)}{extension}")
+        self.is_dir = False
+        self.counts = None
+        # Total of the frames once every one of them has its size
+        self.usage = None
+        if all(member.usage is not None for member in members):
+            self.usage = scanner.DiskUsage()
+            for member in members:
+                self.usage.add(member.usage)
+
+    def first(self):
+        return self.frames[0]
+
+    def last(self):
+        return self.frames[-1]
+
+    def gaps(self):
+        # [(first missing, last missing), ...] inside the frame range
+        gaps = []
+        previous = self.frames[0]
+        for frame in self.frames[1:]:
+            if frame > previous + 1:
+                gaps.append((previous + 1, frame - 1))
+            previous = frame
+        return gaps
+
+    def missing(self):
+        # Frames are counted once, a.1.usd and a.01.usd are both frame 1
+        return self.last() - self.first() + 1 - len(set(self.frames))
+
+    def frame_range(self):
+        text = f"{self.first()}-{self.last()}"
+        missing = self.missing()
+        if missing:
+            text += f" ({missing} missing)"
+        return text
+
+    def describe(self):
+        lines = [self.path,
+                 f"{len(self.frames)} files, frames {self.frame_range()}"]
+        gaps = self.gaps()
+        if gaps:
+            shown = ', '.join(str(start) if start == end else f"{start}-{end}"
+                              for start, end in gaps[:MAX_GAPS_SHOWN])
+            if len(gaps) > MAX_GAPS_SHOWN:
+                shown += f", +{len(gaps) - MAX_GAPS_SHOWN} more"
+            lines.append(f"missing: {shown}")
+        return '\n'.join(lines)
+
+
+def sequence_padding(digits):
+    # Zero padded frames give the padding, numbers of mixed lengths without
+    # leading zeros are unpadded
+    shortest = min(digits, key=lambda text: len(text.lstrip('-')))
+    length = len(shortest.lstrip('-'))
+    if shortest.lstrip('-').startswith('0') \
+            or all(len(text.lstrip('-')) == length for text in digits):
+        return length
+    return 0
+
+
+def group_sequences(entries, min_files=MIN_SEQUENCE_FILES):
+    # One pass over the file entries: numbered files sharing prefix,
+    # separator and extension become a FileSequence in the place of the
+    # first of them, everything else is kept in order. Frame numbers are
+    # parsed once and only sorted when the entries were not in name order
+    groups = {}
+    order = []
+    for entry in entries:
+        match = None if entry.is_dir else FRAME_PATTERN.match(entry.name)
+        if match is None:
+            order.append(entry)
+            continue
+        prefix, separator, digits, extension = match.groups()
+        key = (prefix, separator, extension)
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = []
+            order.append(key)
+        group.append((int(digits), digits, entry))
+
+    grouped = []
+    for item in order:
+        if not isinstance(item, tuple):
+            grouped.append(item)
+            continue
+        group = groups[item]
+        if len(group) < min_files:
+            grouped.extend(entry for _, _, entry in group)
+            continue
+        if any(group[i][0] > group[i + 1][0] for i in range(len(group) - 1)):
+            group.sort(key=lambda frame: frame[0])
+        prefix, separator, extension = item
+        grouped.append(FileSequence(
+            os.path.dirname(group[0][2].path), prefix, separator, extension,
+            sequence_padding([digits for _, digits, _ in group]),
+            [frame for frame, _, _ in group],
+            [entry for _, _, entry in group]))
+    return grouped
@@ -0,0 +1,139 @@
+import os
+import re
+
+try:
+    from . import scanner, sequences
+except ImportError:
+    import scanner
+    import sequences
+
+SORT_NAME = 'name'
+SORT_TYPE = 'type'
+SORT_COUNT = 'count'
+SORT_USD = 'usd'
+SORT_USDA = 'usda'
+SORT_USDC = 'usdc'
+SORT_SIZE = 'size'
+SORT_MTIME = 'mtime'
+SORT_MODES = ((SORT_NAME, 'Name'), (SORT_TYPE, 'Type'),
+              (SORT_COUNT, 'Layers'), (SORT_USD, 'Usd files'),
+              (SORT_USDA, 'Usda files'), (SORT_USDC, 'Usdc files'),
+              (SORT_SIZE, 'Size'), (SORT_MTIME, 'Modified'))
+# These need the disk usage gathered, see BrowserCore.disk_usage
+USAGE_SORTS = (SORT_SIZE, SORT_MTIME)
+# Value of an entry for the sorts by number, None while it is unknown
+VALUE_KEYS = {
+    SORT_COUNT: lambda entry: entry.counts.total()
+    if entry.counts is not None else None,
+    SORT_USD: lambda entry: entry.counts.usd
+    if entry.counts is not None else None,
+    SORT_USDA: lambda entry: entry.counts.usda
+    if entry.counts is not None else None,
+    SORT_USDC: lambda entry: entry.counts.usdc
+    if entry.counts is not None else None,
+    SORT_SIZE: lambda entry: entry.usage.bytes
+    if entry.usage is not None else None,
+    SORT_MTIME: lambda entry: entry.usage.newest_mtime_ns
+    if entry.usage is not None else None}
+EXTENSION_ORDER = {extension: position for position, extension
+                   in enumerate(scanner.USD_EXTENSIONS)}
+
+DIGITS = re.compile(r'(\d+)')
+
+
+def natural_key(name):
+    # 'shot9' before 'shot10' and 'top.usd' before 'top2.usd', case
+    # ignored. Digit runs sit at the odd positions, so two keys never
+    # compare a number with text
+    stem, extension = os.path.splitext(name.lower())
+    parts = DIGITS.split(stem)
+    parts[1::2] = map(int, parts[1::2])
+    return parts, extension, name
+
+
+def default_ascending(sort):
+    # The direction a sort starts in: names A-Z and types .usd first, but
+    # the most layers, the largest and the newest first
+    return sort not in VALUE_KEYS
+
+
+def extension_rank(name):
+    # Sequence rows end in their extension too, 'cache.####.usdc'
+    return EXTENSION_ORDER.get(name[name.rfind('.'):], len(EXTENSION_ORDER))
+
+
+def sort_by_value(entries, value, descending):
+    # `entries` are in name order and the sort is stable, so equal values
+    # stay in name order. Unknown values go last in either direction.
+    # Values are read once, the sort itself only compares numbers
+    values = list(map(value, entries))
+    known = [i for i, found in enumerate(values) if found is not None]
+    known.sort(key=values.__getitem__, reverse=descending)
+    ordered = [entries[i] for i in known]
+    if len(known) < len(entries):
+        ordered.extend(entry for entry, found in zip(entries, values)
+                       if found is None)
+    return ordered
+
+
+class ListingSorter:
+    # The directories and usd files of one DirectoryScan, sorted without
+    # touching the disk. Sequences are grouped and names put in natural
+    # order once, every sort after that is a stable sort of that order on
+    # one value per entry. Orders are kept until counts or sizes change
+    def __init__(self, scan, group=True):
+        self.scan = scan
+        self.group = group
+        self.size = len(scan.entries)
+        dir_entries = []
+        file_entries = []
+        for entry in scan.entries:
+            if entry.is_dir:
+                dir_entries.append(entry)
+            elif entry.name.endswith(scanner.USD_EXTENSIONS):
+                file_entries.append(entry)
+        if group:
+            file_entries = sequences.group_sequences(file_entries)
+        dir_entries.sort(key=lambda entry: natural_key(entry.name))
+        file_entries.sort(key=lambda entry: natural_key(entry.name))
+        self.dir_entries = dir_entries
+        self.file_entries = file_entries
+        # Extension group of each file, names never change
+        self._groups = None
+        # (sort, ascending) -> (directories, files)
+        self._orders = {}
+        self._version = scan.version
+
+    def matches(self, scan, group):
+        return scan is self.scan and group == self.group \
+            and len(scan.entries) == self.size
+
+    def listing(self, sort=SORT_NAME, ascending=True):
+        # (directories, usd files). Ascending means the same for every
+        # sort: names A-Z, the fewest layers, the smallest and the oldest
+        # first, types .usd, .usda then .usdc. Unknown values stay last
+        # and by name files always go A-Z
+        if self._version != self.scan.version:
+            self._orders.clear()
+            self._version = self.scan.version
+        order = self._orders.get((sort, ascending))
+        if order is None:
+            order = self._orders[(sort, ascending)] = self._sort(sort,
+                                                                 ascending)
+        return list(order[0]), list(order[1])
+
+    def _sort(self, sort, ascending):
+        value = VALUE_KEYS.get(sort)
+        if value is not None:
+            return (sort_by_value(self.dir_entries, value, not ascending),
+                    sort_by_value(self.file_entries, value, not ascending))
+        dir_entries = self.dir_entries if ascending \
+            else self.dir_entries[::-1]
+        if sort == SORT_TYPE:
+            if self._groups is None:
+                self._groups = [extension_rank(entry.name)
+                                for entry in self.file_entries]
+            order = sorted(range(len(self._groups)),
+                           key=self._groups.__getitem__, reverse=not ascending)
+            return dir_entries, [self.file_entries[i] for i in order]
+        return dir_entries, self.file_entries
@@ -0,0 +1,261 @@
+import argparse
+import importlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+
+from PySide2 import QtCore, QtGui, QtUiTools, QtWidgets
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+UI_PATH = os.path.join(PACKAGE_DIR, 'usdbrowser.ui')
+QRC_PATH = os.path.join(PACKAGE_DIR, 'resource.qrc')
+STATIC_DIR = os.path.join(PACKAGE_DIR, 'static')
+# Written by `python startup.py --build`, used while newer than their source
+COMPILED_UI = os.path.join(PACKAGE_DIR, 'usdbrowser_ui.py')
+COMPILED_RESOURCES = os.path.join(PACKAGE_DIR, 'resource_rc.py')
+RESOURCE_PREFIX = ':/usdbrowser/'
+
+# Reloaded in this order in dev mode, dependencies first
+MODULES = ('perftrace', 'storage', 'scanner', 'tree', 'scancache',
+           'scanpool', 'projectindex', 'indexd', 'sequences', 'sorting',
+           'browsercore', 'layerinfo', 'convert', 'thumbnails', 'depgraph',
+           'listmodel', 'watcher', 'batchimport', 'prefetch', 'scanservice',
+           'history', 'treemodel', 'startup', 'project')
+
+# Loaded once per Houdini session, every new pane reuses them
+_ui_data = None
+_form_class = None
+_resources = None
+_icons = {}
+_pixmaps = {}
+
+
+def dev_mode():
+    # USDBROWSER_DEV=1 reloads the modules on every new pane, so edits
+    # show up without restarting Houdini
+    return bool(os.environ.get('USDBROWSER_DEV'))
+
+
+def reload_modules():
+    package = __package__ or ''
+    for name in MODULES:
+        module = sys.modules.get(package + '.' + name if package else name)
+        if module is not None:
+            importlib.reload(module)
+    _forget()
+
+
+def _forget():
+    global _ui_data, _form_class, _resources
+    _ui_data = None
+    _form_class = None
+    _resources = None
+    _icons.clear()
+    _pixmaps.clear()
+
+
+def is_fresh(compiled, source):
+    try:
+        return os.stat(compiled).st_mtime >= os.stat(source).st_mtime
+    except OSError:
+        return False
+
+
+def _import_compiled(name):
+    if __package__:
+        return importlib.import_module('.' + name, __package__)
+    return importlib.import_module(name)
+
+
+def form_class():
+    # Ui_Form from the uic-compiled usdbrowser.ui, None when it is missing
+    # or older than the .ui file
+    global _form_class
+    if _form_class is None:
+        _form_class = False
+        if is_fresh(COMPILED_UI, UI_PATH):
+            try:
+                _form_class = _import_compiled('usdbrowser_ui').Ui_Form
+            except (ImportError, AttributeError):
+                pass
+    return _form_class or None
+
+
+def load_ui(parent=None):
+    # The compiled form builds the widgets directly, without it the .ui is
+    # read once and only parsed for each new pane
+    global _ui_data
+    form = form_class()
+    if form is not None:
+        widget = QtWidgets.QWidget(parent)
+        form().setupUi(widget)
+        return widget
+    if _ui_data is None:
+        with open(UI_PATH, 'rb') as f:
+            _ui_data = QtCore.QByteArray(f.read())
+    buffer = QtCore.QBuffer()
+    buffer.setData(_ui_data)
+    buffer.open(QtCore.QIODevice.ReadOnly)
+    return QtUiTools.QUiLoader().load(buffer, parent)
+
+
+def use_resources():
+    # Icons come from the rcc-compiled resource.qrc when it was built
+    global _resources
+    if _resources is None:
+        _resources = False
+        if is_fresh(COMPILED_RESOURCES, QRC_PATH):
+            try:
+                _import_compiled('resource_rc')
+                _resources = True
+            except ImportError:
+                pass
+    return _resources
+
+
+def resource_path(name):
+    if use_resources():
+        return RESOURCE_PREFIX + name
+    return os.path.join(STATIC_DIR, name)
+
+
+def icon(name):
+    cached = _icons.get(name)
+    if cached is None:
+        cached = _icons[name] = QtGui.QIcon(resource_path(name))
+    return cached
+
+
+def pixmap(name):
+    cached = _pixmaps.get(name)
+    if cached is None:
+        cached = _pixmaps[name] = QtGui.QPixmap(resource_path(name))
+    return cached
+
+
+# Build step
+def qt_tool(name):
+    # pyside2-uic/pyside2-rcc, or those of the binding actually loaded
+    binding = QtCore.__name__.split('.')[0].lower()
+    for command in (binding + '-' + name, name):
+        path = shutil.which(command)
+        if path is not None:
+            if command == name:
+                return [path, '-g', 'python']
+            return [path]
+    return None
+
+
+def build():
+    # Compile usdbrowser.ui and resource.qrc next to the sources
+    for tool, source, output in (('uic', UI_PATH, COMPILED_UI),
+                                 ('rcc', QRC_PATH, COMPILED_RESOURCES)):
+        command = qt_tool(tool)
+        if command is None:
+            print(f"{tool} not found, {os.path.basename(output)} not built")
+            continue
+        subprocess.check_call(command + [source, '-o', output + '.tmp'],
+                              cwd=PACKAGE_DIR)
+        os.replace(output + '.tmp', output)
+        print(f"wrote {os.path.basename(output)}")
+    _forget()
+
+
+# Timing harness
+ICON_NAMES = ('USDlogovector.svg', 'chooser_folder.svg', 'back.svg',
+              'forward.svg', 'adaptpixelrange.svg', 'reload.svg', 'home.svg')
+
+
+def run(repeat):
+    try:
+        from . import benchmark
+    except ImportError:
+        import benchmark
+
+    def ui_uncached():
+        QtUiTools.QUiLoader().load(UI_PATH).deleteLater()
+
+    def ui_cached():
+        load_ui().deleteLater()
+
+    def icons_uncached():
+        QtGui.QPixmap(os.path.join(STATIC_DIR, ICON_NAMES[0]))
+        for name in ICON_NAMES[1:]:
+            QtGui.QIcon(os.path.join(STATIC_DIR, name))
+
+    def icons_cached():
+        pixmap(ICON_NAMES[0])
+        for name in ICON_NAMES[1:]:
+            icon(name)
+
+    results = {'ui_uncached': benchmark.timed(ui_uncached, repeat),
+               'ui_cached': benchmark.timed(ui_cached, repeat),
+               'icons_uncached': benchmark.timed(icons_uncached, repeat),
+               'icons_cached': benchmark.timed(icons_cached, repeat),
+               'compiled_ui': form_class() is not None,
+               'compiled_resources': use_resources()}
+    try:
+        import hou  # noqa: F401
+        has_hou = True
+    except ImportError:
+        has_hou = False
+    if has_hou:
+        # The whole pane, only inside hython or with a hou module
+        try:
+            from . import project
+        except ImportError:
+            import project
+        results['panel'] = benchmark.timed(
+            lambda: project.UsdBrowser().deleteLater(), repeat)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Compile the panel UI and resources, or time how long '
+                    'opening the panel takes')
+    parser.add_argument('--build', action='store_true',
+                        help='compile usdbrowser.ui and resource.qrc')
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--json', help='write results to this file')
+    parser.add_argument('--compare', help='baseline json from an earlier run')
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help='allowed slowdown against the baseline')
+    args = parser.parse_args(argv)
+
+    if args.build:
+        build()
+        return 0
+
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+    results = run(args.repeat)
+    app.processEvents()
+    for name, timing in results.items():
+        if isinstance(timing, dict):
+            print(f"{name:<28}{timing['mean'] * 1000:>10.2f} ms"
+                  f"  (min {timing['min'] * 1000:.2f}, "
+                  f"max {timing['max'] * 1000:.2f})")
+        else:
+            print(f"{name:<28}{'yes' if timing else 'no':>10}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        try:
+            from . import benchmark
+        except ImportError:
+            import benchmark
+        with open(args.compare) as f:
+            regressions = benchmark.compare(results, json.load(f),
+                                            args.threshold)
+        if regressions:
+            print('regressions: ' + ', '.join(regressions))
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
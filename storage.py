@@ -0,0 +1,278 @@
+import argparse
+import json
+import os
+import sys
+import threading
+
+try:
+    from . import perftrace
+except ImportError:
+    import perftrace
+
+# Looked for in the project root when USDBROWSER_MANIFEST is not set
+MANIFEST_NAMES = ('usdbrowser_manifest.jsonl', 'usdbrowser_manifest.parquet')
+
+
+class StorageEntry:
+    __slots__ = ('name', 'is_dir', 'is_symlink', 'size', 'mtime_ns')
+
+    def __init__(self, name, is_dir, is_symlink=False, size=None,
+                 mtime_ns=None):
+        self.name = name
+        self.is_dir = is_dir
+        self.is_symlink = is_symlink
+        # Only set for files of listings made with `stats`
+        self.size = size
+        self.mtime_ns = mtime_ns
+
+
+class ScandirBackend:
+    # Local and network filesystems through os.scandir. One listing is a
+    # stat of the directory plus one scandir, entry types come from the
+    # directory itself so entries are never stat'ed one by one
+    def dir_mtime(self, path):
+        perftrace.count('stat')
+        return os.stat(path).st_mtime_ns
+
+    def list_dir(self, path, stats=False):
+        # (directory mtime_ns, [StorageEntry, ...]) in one round-trip.
+        # With `stats` every file is stat'ed for its size and mtime too
+        perftrace.count('stat')
+        mtime_ns = os.stat(path).st_mtime_ns
+        entries = []
+        stat_calls = 0
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+                if is_dir or not stats:
+                    entries.append(StorageEntry(entry.name, is_dir,
+                                                is_dir and entry.is_symlink()))
+                    continue
+                stat_calls += 1
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    # Dangling symlink, counted without size
+                    entries.append(StorageEntry(entry.name, False, False, 0,
+                                                0))
+                    continue
+                entries.append(StorageEntry(entry.name, False, False,
+                                            stat.st_size, stat.st_mtime_ns))
+        perftrace.count('scandir', files=len(entries))
+        if stat_calls:
+            perftrace.count('stat', calls=stat_calls)
+        return mtime_ns, entries
+
+
+class ManifestBackend:
+    # Listings read from a prebuilt manifest of the project, no stat or
+    # scandir is made for directories it contains. Directories missing
+    # from it, or expired since (see expire), go to `fallback`. With
+    # `check_mtime` each directory mtime is stat'ed as well, so folders
+    # changed before the browser started are read from disk too
+    def __init__(self, root, records, fallback=None, check_mtime=False):
+        self.root = os.path.normpath(root)
+        # relative directory path -> (mtime_ns, [StorageEntry, ...])
+        self.records = records
+        self.fallback = fallback if fallback is not None \
+            else ScandirBackend()
+        self.check_mtime = check_mtime
+
+    @classmethod
+    def load(cls, root, path, fallback=None, check_mtime=False):
+        if path.endswith('.parquet'):
+            records = read_parquet_manifest(path)
+        else:
+            records = read_jsonl_manifest(path)
+        return cls(root, records, fallback, check_mtime)
+
+    def contains(self, path):
+        path = os.path.normpath(path)
+        return path == self.root \
+            or path.startswith(self.root.rstrip(os.sep) + os.sep)
+
+    def _record(self, path):
+        return self.records.get(
+            os.path.relpath(os.path.normpath(path), self.root))
+
+    def dir_mtime(self, path):
+        record = self._record(path)
+        if record is None:
+            return self.fallback.dir_mtime(path)
+        if not self.check_mtime:
+            return record[0]
+        # A directory changed since the manifest was written is dropped
+        # from it, so it is listed from disk as well
+        mtime_ns = self.fallback.dir_mtime(path)
+        if record[0] != mtime_ns:
+            self.expire(path)
+        return mtime_ns
+
+    def list_dir(self, path, stats=False):
+        record = self._record(path)
+        if record is None or stats and not has_stats(record[1]):
+            return self.fallback.list_dir(path, stats)
+        perftrace.count('manifest', files=len(record[1]))
+        return record
+
+    def expire(self, path):
+        # The directory changed on disk, read it from disk from now on
+        self.records.pop(os.path.relpath(os.path.normpath(path), self.root),
+                         None)
+
+
+def has_stats(entries):
+    return all(entry.is_dir or entry.size is not None for entry in entries)
+
+
+def manifest_record(line):
+    # Manifests written before symlinks were recorded have no links
+    links = set(line.get('links') or ())
+    entries = [StorageEntry(name, True, name in links)
+               for name in line.get('dirs', ())]
+    files = line.get('files') or ()
+    # Manifests written before sizes were recorded have no sizes/mtimes
+    sizes = line.get('sizes') or (None,) * len(files)
+    mtimes = line.get('mtimes') or (None,) * len(files)
+    entries.extend(StorageEntry(name, False, False, size, mtime_ns)
+                   for name, size, mtime_ns in zip(files, sizes, mtimes))
+    return int(line.get('mtime_ns') or 0), entries
+
+
+def read_jsonl_manifest(path):
+    # One directory per line:
+    # {"dir": "shots/sh010", "mtime_ns": 0, "dirs": [...], "links": [...],
+    #  "files": [...], "sizes": [...], "mtimes": [...]}. Links are the
+    # dirs that are symlinks, sizes and mtimes those of the files
+    records = {}
+    with open(path, encoding='utf-8') as f:
+        for text in f:
+            text = text.strip()
+            if text:
+                line = json.loads(text)
+                records[os.path.normpath(line['dir'])] = manifest_record(line)
+    return records
+
+
+def read_parquet_manifest(path):
+    # Same columns as the JSONL lines, needs pyarrow
+    import pyarrow.parquet
+    table = pyarrow.parquet.read_table(path)
+    return {os.path.normpath(line['dir']): manifest_record(line)
+            for line in table.to_pylist()}
+
+
+def iter_manifest_lines(root, backend=None):
+    # Walk `root` and yield one manifest line per directory
+    backend = backend if backend is not None else ScandirBackend()
+    root = os.path.normpath(root)
+    stack = [root]
+    while stack:
+        top = stack.pop()
+        try:
+            mtime_ns, entries = backend.list_dir(top, stats=True)
+        except OSError:
+            continue
+        dirs = []
+        links = []
+        files = []
+        for entry in entries:
+            if entry.is_dir:
+                dirs.append(entry.name)
+                if entry.is_symlink:
+                    links.append(entry.name)
+                else:
+                    stack.append(os.path.join(top, entry.name))
+            else:
+                files.append(entry)
+        files.sort(key=lambda entry: entry.name)
+        yield {'dir': os.path.relpath(top, root), 'mtime_ns': mtime_ns,
+               'dirs': sorted(dirs), 'links': sorted(links),
+               'files': [entry.name for entry in files],
+               'sizes': [entry.size for entry in files],
+               'mtimes': [entry.mtime_ns for entry in files]}
+
+
+def write_manifest(root, path):
+    lines = iter_manifest_lines(root)
+    if path.endswith('.parquet'):
+        import pyarrow
+        import pyarrow.parquet
+        pyarrow.parquet.write_table(pyarrow.Table.from_pylist(list(lines)),
+                                    path)
+        return
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        for line in lines:
+            f.write(json.dumps(line) + '\n')
+    os.replace(path + '.tmp', path)
+
+
+# Backend lookup. Manifests are registered per project root, everything
+# else is listed with the scandir backend
+default_backend = ScandirBackend()
+_manifests = []
+_lock = threading.Lock()
+
+
+def backend_for(path):
+    for backend in _manifests:
+        if backend.contains(path):
+            return backend
+    return default_backend
+
+
+def dir_mtime(path):
+    return backend_for(path).dir_mtime(path)
+
+
+def list_dir(path, stats=False):
+    return backend_for(path).list_dir(path, stats)
+
+
+def register_manifest(backend):
+    with _lock:
+        unregister_manifest(backend.root)
+        _manifests.append(backend)
+
+
+def unregister_manifest(root):
+    global _manifests
+    root = os.path.normpath(root)
+    _manifests = [backend for backend in _manifests if backend.root != root]
+
+
+def expire(path):
+    backend = backend_for(path)
+    if isinstance(backend, ManifestBackend):
+        backend.expire(path)
+
+
+def find_manifest(root, override=None):
+    # USDBROWSER_MANIFEST, or a manifest file in the project root
+    if override:
+        return override if os.path.isfile(override) else None
+    for name in MANIFEST_NAMES:
+        path = os.path.join(root, name)
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Write a directory manifest the browser can read '
+                    'instead of crawling the project')
+    parser.add_argument('root')
+    parser.add_argument('--output', help='manifest file, defaults to '
+                                         + MANIFEST_NAMES[0] + ' in root')
+    args = parser.parse_args(argv)
+    output = args.output or os.path.join(args.root, MANIFEST_NAMES[0])
+    write_manifest(args.root, output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,42 @@
+import os
+import sys
+import time
+
+import pytest
+
+# The modules import each other without the package, like in Houdini
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+
+# Relative paths of the `project` fixture, usd counts below the root are
+# 3 usd, 2 usda and 1 usdc
+PROJECT_FILES = ('a.usd', 'b.usda', 'notes.txt',
+                 'shots/sh010/x.usdc', 'shots/sh010/y.usda',
+                 'shots/sh020/z.usd', 'assets/chair.usd',
+                 'assets/chair.png')
+PROJECT_DIRS = ('empty',)
+
+
+def write(path, data=b''):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+    return path
+
+
+def age(root, seconds=3600):
+    # Moves directory mtimes back, the scan cache trusts them then
+    past = time.time() - seconds
+    for top, _, _ in os.walk(root):
+        os.utime(top, (past, past))
+
+
+@pytest.fixture
+def project(tmp_path):
+    root = str(tmp_path / 'proj')
+    for name in PROJECT_FILES:
+        write(os.path.join(root, name), name.encode())
+    for name in PROJECT_DIRS:
+        os.makedirs(os.path.join(root, name))
+    age(root)
+    return root
@@ -0,0 +1,122 @@
+# Timings of the headless core on a synthetic project, run with
+# pytest-benchmark:
+#     python -m pytest tests/test_benchmark.py --benchmark-only
+# benchmark.py times the same operations without pytest
+import importlib.util
+
+import pytest
+
+import browsercore
+import projectindex
+import scancache
+import scanner
+import sorting
+from benchmark import (SORT_ROWS, build_tree, compare, run,
+                       synthetic_scan)
+
+# 1 + 4 + 16 + 64 directories of 12 files
+DEPTH, WIDTH, FILES = 3, 4, 12
+DIRECTORIES = 1 + 4 + 16 + 64
+
+needs_benchmark = pytest.mark.skipif(
+    importlib.util.find_spec('pytest_benchmark') is None,
+    reason='needs pytest-benchmark')
+
+
+@pytest.fixture(scope='module')
+def tree(tmp_path_factory):
+    root = str(tmp_path_factory.mktemp('bench') / 'proj')
+    build_tree(root, DEPTH, WIDTH, FILES)
+    return root
+
+
+@pytest.fixture
+def warm(tree):
+    core = browsercore.BrowserCore(scancache.ScanCache())
+    core.set_project(tree)
+    core.refresh()
+    return core
+
+
+def test_tree_is_counted(tree):
+    counts = scanner.count_usd_files(tree)
+    # 3 of every 4 files are usd layers
+    assert counts.total() == DIRECTORIES * FILES // 4 * 3
+
+
+def test_run_and_compare(tree):
+    results = run(tree, 1)
+    # Every directory but the root and the usd layers
+    assert results['index_entries'] \
+        == DIRECTORIES - 1 + DIRECTORIES * FILES // 4 * 3
+    assert results['count']['rounds'] == 1
+    slower = dict(results, count=dict(results['count'],
+                                      mean=results['count']['mean'] * 3))
+    assert compare(slower, results, 1.5) == ['count']
+    assert compare(results, slower, 1.5) == []
+
+
+@needs_benchmark
+def test_navigate_cold(benchmark, tree):
+    def navigate():
+        core = browsercore.BrowserCore()
+        core.set_project(tree)
+        core.list_current()
+        core.count_pending()
+        return core
+    core = benchmark(navigate)
+    assert len(core.scan.entries) == WIDTH + FILES
+
+
+@needs_benchmark
+def test_navigate_warm(benchmark, warm, tree):
+    def navigate():
+        warm.navigate(tree)
+        warm.list_current()
+        warm.count_pending()
+    benchmark(navigate)
+    assert not warm.scan.pending()
+
+
+@needs_benchmark
+def test_refresh(benchmark, warm):
+    benchmark(warm.refresh)
+
+
+@needs_benchmark
+def test_count(benchmark, tree):
+    benchmark(scanner.count_usd_files, tree)
+
+
+@needs_benchmark
+def test_search(benchmark, warm):
+    assert benchmark(warm.search, 'dir_00')
+
+
+@needs_benchmark
+def test_sort_rows(benchmark):
+    core = browsercore.BrowserCore()
+    core.scan = synthetic_scan(SORT_ROWS // 10)
+
+    def sort():
+        # A sort click after counts changed, nothing cached
+        for mode, _ in sorting.SORT_MODES:
+            core.scan.version += 1
+            core.listing(False, mode)
+    benchmark(sort)
+
+
+@needs_benchmark
+def test_index_build(benchmark, tree):
+    index = projectindex.ProjectIndex(tree)
+    benchmark(index.build)
+    assert len(index)
+
+
+@needs_benchmark
+@pytest.mark.parametrize('query', ['asset_0001', 'dir_00?', '~ast01usdc'])
+def test_search_project(benchmark, tree, query):
+    index = projectindex.ProjectIndex(tree)
+    index.build()
+    assert benchmark(index.search, query)
+
@@ -0,0 +1,144 @@
+import os
+
+import browsercore
+import scancache
+import scanner
+import sorting
+from conftest import write
+
+
+def open_project(project, cache=None):
+    core = browsercore.BrowserCore(cache)
+    core.set_project(project)
+    core.list_current()
+    core.count_pending()
+    return core
+
+
+def names(entries):
+    return [entry.name for entry in entries]
+
+
+def test_list_and_count(project):
+    core = open_project(project)
+    dir_entries, file_entries = core.listing()
+    assert names(dir_entries) == ['assets', 'empty', 'shots']
+    assert names(file_entries) == ['a.usd', 'b.usda']
+    assert core.scan.counts == scanner.UsdCounts(2, 1, 1)
+    assert core.scan.by_name['shots'].counts == scanner.UsdCounts(1, 1, 1)
+    node = core.tree.lookup(os.path.join(project, 'shots'))
+    assert node.counts == scanner.UsdCounts(1, 1, 1)
+    assert core.current_node.subdirs_present
+
+
+def test_navigate_and_go_up(project):
+    core = open_project(project)
+    node = core.navigate(os.path.join(project, 'shots'))
+    assert core.current_node is node
+    core.list_current()
+    core.count_pending()
+    assert names(core.listing()[0]) == ['sh010', 'sh020']
+    assert core.go_up() is core.tree.root
+    assert core.go_up() is core.tree.root
+
+
+def test_disk_usage(project):
+    core = browsercore.BrowserCore()
+    core.disk_usage = True
+    core.set_project(project)
+    core.list_current()
+    core.count_pending()
+    shots = core.scan.by_name['shots']
+    assert shots.usage.files == 3
+    assert core.scan.by_name['a.usd'].usage.bytes == len(b'a.usd')
+
+
+def test_keep_counts(project):
+    core = open_project(project)
+    counts = core.scan.by_name['shots'].counts
+    core.list_current(keep_counts=True)
+    assert core.scan.by_name['shots'].counts is counts
+    assert core.scan.pending() == []
+    core.list_current()
+    assert core.scan.by_name['shots'].counts is None
+
+
+def test_search(project):
+    core = open_project(project)
+    dir_entries, file_entries = core.search('S')
+    assert names(dir_entries) == ['assets', 'shots']
+    assert names(file_entries) == ['a.usd', 'b.usda']
+    assert core.search('usda') == ([], [core.scan.by_name['b.usda']])
+
+
+def test_refresh_sees_new_files(project):
+    core = open_project(project, scancache.ScanCache())
+    write(os.path.join(project, 'assets', 'lamp.usdc'))
+    write(os.path.join(project, 'c.usdc'))
+    scan = core.refresh()
+    assert scan.by_name['assets'].counts == scanner.UsdCounts(1, 0, 1)
+    assert names(core.listing()[1]) == ['a.usd', 'b.usda', 'c.usdc']
+
+
+def test_listing_follows_counts(project):
+    core = browsercore.BrowserCore()
+    core.set_project(project)
+    core.list_current()
+    sorter_listing = core.listing(False, sorting.SORT_COUNT)
+    core.count_pending()
+    assert core.listing(False, sorting.SORT_COUNT) != sorter_listing
+    assert names(core.listing(False, sorting.SORT_COUNT)[0]) \
+        == ['shots', 'assets', 'empty']
+    assert names(core.listing(True, sorting.SORT_COUNT)[0]) \
+        == ['empty', 'assets', 'shots']
+
+
+def test_listing_sorts_names_once(project, monkeypatch):
+    core = browsercore.BrowserCore()
+    core.set_project(project)
+    core.list_current()
+    sorter = core.sorter
+    assert sorter is not None and sorter.scan is core.scan
+    # A snapshot's sorter is taken back with its scan
+    scan = core.scan
+    core.list_current()
+    assert core.sorter is not sorter
+    core.set_scan(scan, sorter)
+    assert core.sorter is sorter
+    keys = []
+    monkeypatch.setattr(sorting, 'natural_key', keys.append)
+    core.listing(False, sorting.SORT_SIZE)
+    core.listing(True, sorting.SORT_NAME)
+    assert core.sorter is sorter and keys == []
+
+
+def test_sequences_grouped(tmp_path):
+    root = str(tmp_path)
+    for frame in (1001, 1002, 1004):
+        write(os.path.join(root, f'cache.{frame}.usdc'))
+    core = browsercore.BrowserCore()
+    core.set_project(root)
+    core.list_current()
+    assert names(core.listing()[1]) == ['cache.####.usdc']
+    core.group_sequences = False
+    assert len(core.listing()[1]) == 3
+
+
+def test_search_project(project):
+    core = open_project(project)
+    assert core.search_project('sh') == ([], [])
+    core.build_index()
+    dir_entries, file_entries = core.search_project('sh0')
+    assert names(dir_entries) == [os.path.join('shots', 'sh010'),
+                                  os.path.join('shots', 'sh020')]
+    assert file_entries == []
+    dir_entries, file_entries = core.search_project('*.usda')
+    assert sorted(names(file_entries)) \
+        == ['b.usda', os.path.join('shots', 'sh010', 'y.usda')]
+    assert file_entries[0].path == os.path.join(project, file_entries[0].name)
+
+
+def test_narrows():
+    assert browsercore.narrows('sh', 'SH01')
+    assert not browsercore.narrows('sh01', 'sh')
+    assert not browsercore.narrows('', 'sh')
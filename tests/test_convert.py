@@ -0,0 +1,186 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+import convert
+from conftest import write
+
+USDA = b'#usda 1.0\n\ndef "root"\n{\n}\n'
+CRATE = b'PXR-USDC' + b'\0' * 80
+
+# Stands in for usdcat: copies the layer as a fake crate file, fails on
+# layers named bad* and waits on layers named slow*
+FAKE_USDCAT = '''\
+import os, sys, time
+source, output = sys.argv[1], sys.argv[3]
+name = os.path.basename(source)
+if name.startswith('bad'):
+    sys.exit('cannot read ' + name)
+if name.startswith('slow'):
+    time.sleep(30)
+with open(source, 'rb') as f:
+    data = f.read()
+with open(output, 'wb') as f:
+    f.write(b'PXR-USDC' + data[:len(data) // 2])
+'''
+
+
+@pytest.fixture
+def usdcat(tmp_path):
+    script = tmp_path / 'usdcat.py'
+    script.write_text(FAKE_USDCAT)
+    return [sys.executable, str(script)]
+
+
+@pytest.fixture
+def layers(tmp_path):
+    root = str(tmp_path / 'layers')
+    write(os.path.join(root, 'a.usda'), USDA)
+    write(os.path.join(root, 'b.usd'), USDA)
+    write(os.path.join(root, 'c.usdc'), CRATE)
+    write(os.path.join(root, 'd.usd'), CRATE)
+    write(os.path.join(root, 'e.usd'), b'not a layer')
+    write(os.path.join(root, 'taken.usda'), USDA)
+    write(os.path.join(root, 'taken.usdc'), CRATE)
+    write(os.path.join(root, 'notes.txt'), USDA)
+    return root
+
+
+def names(paths):
+    return [os.path.basename(path) for path in paths]
+
+
+def test_layer_format_and_destination(layers):
+    assert convert.layer_format(os.path.join(layers, 'a.usda')) == 'usda'
+    assert convert.layer_format(os.path.join(layers, 'd.usd')) == 'usdc'
+    assert convert.layer_format(os.path.join(layers, 'e.usd')) is None
+    assert convert.destination_path('/x/a.usda', 'usdc') == '/x/a.usdc'
+    assert convert.destination_path('/x/a.usd', 'usdc') == '/x/a.usd'
+    assert convert.other_format('usdc') == 'usda'
+
+
+def test_conversion_args():
+    assert convert.conversion_args(['usdcat'], 'a.usda', 'a.usdc', 'usdc') \
+        == ['usdcat', 'a.usda', '-o', 'a.usdc']
+    assert convert.conversion_args(['usdcat'], 'a.usd', 'b.usd', 'usdc') \
+        == ['usdcat', 'a.usd', '-o', 'b.usd', '--usdFormat', 'usdc']
+    assert convert.conversion_args(['py', 'convert.py', '--worker'],
+                                   'a.usd', 'b.usd', 'usda') \
+        == ['py', 'convert.py', '--worker', 'a.usd', 'b.usd', 'usda']
+
+
+def test_plan(layers):
+    plan = convert.plan_conversion([layers], 'usdc')
+    assert [(os.path.basename(conversion.source),
+             os.path.basename(conversion.destination))
+            for conversion in plan.conversions] \
+        == [('a.usda', 'a.usdc'), ('b.usd', 'b.usd')]
+    assert plan.conversions[0].renamed()
+    assert not plan.conversions[1].renamed()
+    assert plan.source_bytes() == 2 * len(USDA)
+    assert [(os.path.basename(path), reason)
+            for path, reason in plan.skipped] \
+        == [('c.usdc', 'already usdc'), ('d.usd', 'already usdc'),
+            ('e.usd', 'not a usd layer'), ('taken.usda', 'taken.usdc exists'),
+            ('taken.usdc', 'already usdc')]
+
+
+def test_plan_of_files_and_cancel(layers):
+    path = os.path.join(layers, 'a.usda')
+    plan = convert.plan_conversion([path, layers], 'usda')
+    assert names(conversion.source for conversion in plan.conversions) \
+        == ['c.usdc', 'd.usd']
+    assert plan.skipped[0] == (path, 'already usda')
+    assert plan.skipped[-1] \
+        == (os.path.join(layers, 'taken.usdc'), 'taken.usda exists')
+    cancel = threading.Event()
+    cancel.set()
+    assert convert.plan_conversion([layers], 'usdc', cancel) is None
+
+
+def test_report_estimates(layers):
+    report = convert.dry_run([layers], 'usdc', sample=0)
+    assert report.expected_bytes() \
+        == int(2 * len(USDA) * convert.CRATE_SIZE_RATIO)
+    before, after = report.load_seconds()
+    assert after < before
+    lines = report.describe()
+    assert lines[0] == '2 layers to convert to usdc, 5 skipped'
+    assert 'no sample was converted' in lines[3]
+    assert '1 .usda files are written' in lines[4]
+
+
+def test_report_measures_samples(layers, usdcat):
+    report = convert.dry_run([layers], 'usdc', usdcat)
+    assert report.sampled == 2
+    # The fake writes the magic and half of the layer
+    expected = 2 * (len(b'PXR-USDC') + len(USDA) // 2)
+    assert report.size_ratio == pytest.approx(expected / (2 * len(USDA)))
+    assert 'measured on 2 converted samples' in report.describe()[3]
+
+
+def test_report_lists_renamed_layers_in_use(layers):
+    class Graph:
+        complete = True
+
+        def used_by(self, path):
+            return ['shot.usda'] if path.endswith('a.usda') else []
+
+    report = convert.dry_run([layers], 'usdc', graph=Graph(), sample=0)
+    assert report.used_by == {os.path.join(layers, 'a.usda'): 1}
+    assert report.describe(layers)[-1] == '    a.usda (1 layers)'
+
+
+def test_batch_converts(layers, usdcat):
+    plan = convert.plan_conversion([layers], 'usdc')
+    seen = []
+    batch = convert.ConversionBatch(
+        plan, usdcat, progress=lambda batch, conversion, error:
+        seen.append((os.path.basename(conversion.source), error)))
+    batch.wait()
+    assert batch.done() and batch.failed == []
+    assert sorted(seen) == [('a.usda', ''), ('b.usd', '')]
+    assert batch.finished_count() == batch.total() == 2
+    assert convert.layer_format(os.path.join(layers, 'a.usdc')) == 'usdc'
+    assert convert.layer_format(os.path.join(layers, 'b.usd')) == 'usdc'
+    # The renamed layer keeps its original
+    assert convert.layer_format(os.path.join(layers, 'a.usda')) == 'usda'
+    assert not [name for name in os.listdir(layers) if '.tmp' in name]
+
+
+def test_batch_failure_leaves_the_layer(tmp_path, usdcat):
+    path = str(tmp_path / 'bad.usd')
+    write(path, USDA)
+    plan = convert.plan_conversion([path], 'usdc')
+    batch = convert.ConversionBatch(plan, usdcat).wait()
+    assert batch.failed == [(path, 'cannot read bad.usd')]
+    assert batch.converted == []
+    with open(path, 'rb') as f:
+        assert f.read() == USDA
+    assert sorted(os.listdir(str(tmp_path))) == ['bad.usd', 'usdcat.py']
+
+
+def test_batch_cancel(tmp_path, usdcat):
+    for name in ('slow1.usd', 'slow2.usd', 'slow3.usd'):
+        write(str(tmp_path / 'layers' / name), USDA)
+    plan = convert.plan_conversion([str(tmp_path / 'layers')], 'usdc')
+    batch = convert.ConversionBatch(plan, usdcat, max_workers=1)
+    while not batch.processes and not batch.done():
+        time.sleep(0.01)
+    batch.cancel()
+    batch.wait()
+    assert batch.cancelled() and batch.converted == []
+    for name in os.listdir(str(tmp_path / 'layers')):
+        assert name.startswith('slow') and name.endswith('.usd')
+        with open(str(tmp_path / 'layers' / name), 'rb') as f:
+            assert f.read() == USDA
+
+
+def test_format_helpers():
+    assert convert.format_change(0, 10) == 'no change'
+    assert convert.format_change(100, 40) == '-60%'
+    assert convert.format_seconds(0.25) == '250 ms'
+    assert convert.format_seconds(2.0) == '2.0 s'
@@ -0,0 +1,117 @@
+import os
+import struct
+
+import depgraph
+import layerinfo
+from conftest import write
+
+
+def usda(*arcs):
+    sublayers = ', '.join(f'@{path}@' for kind, path in arcs
+                          if kind == 'sub')
+    references = ', '.join(f'@{path}@' for kind, path in arcs
+                           if kind == 'ref')
+    text = f'#usda 1.0\n(\n    subLayers = [{sublayers}]\n)\n\n'
+    if references:
+        text += (f'def "root" (\n    references = [{references}]\n)\n'
+                 '{\n}\n')
+    return text.encode()
+
+
+def make_project(root):
+    write(os.path.join(root, 'shot.usda'),
+          usda(('sub', './layout.usda'), ('ref', 'assets/chair.usda'),
+               ('ref', 'assets/missing.usd')))
+    write(os.path.join(root, 'layout.usda'),
+          usda(('ref', '/abs/elsewhere.usd'), ('ref', 'omniverse://x.usd')))
+    write(os.path.join(root, 'assets', 'chair.usda'), usda())
+    return root
+
+
+def test_resolve():
+    assert depgraph.resolve('/job/a/shot.usd', './b.usd') \
+        == os.path.normpath('/job/a/b.usd')
+    assert depgraph.resolve('/job/a/shot.usd', '../b.usd') \
+        == os.path.normpath('/job/b.usd')
+    assert depgraph.resolve('/job/a/shot.usd', '/lib/c.usd') \
+        == os.path.normpath('/lib/c.usd')
+    assert depgraph.resolve('/job/a/shot.usd', 'omniverse://x/y.usd') is None
+    assert depgraph.resolve('/job/a/shot.usd', 'cache.$F4.usd') is None
+    assert depgraph.resolve('/job/a/shot.usd', '') is None
+
+
+def test_forward_and_reverse(tmp_path):
+    root = make_project(str(tmp_path))
+    graph = depgraph.DependencyGraph(root).scan()
+    shot = os.path.join(root, 'shot.usda')
+    chair = os.path.join(root, 'assets', 'chair.usda')
+    assert graph.complete
+    assert [(dependency.arc, dependency.asset_path)
+            for dependency in graph.depends_on(shot)] \
+        == [(layerinfo.ARC_SUBLAYER, './layout.usda'),
+            (layerinfo.ARC_REFERENCE, 'assets/chair.usda'),
+            (layerinfo.ARC_REFERENCE, 'assets/missing.usd')]
+    assert [dependency.layer for dependency in graph.used_by(chair)] \
+        == [shot]
+    assert 'used by:' in graph.describe(chair)
+    assert '(missing)' in graph.describe(shot)
+
+
+def test_report(tmp_path):
+    root = make_project(str(tmp_path))
+    write(os.path.join(root, 'broken.usda'), b'junk')
+    report = depgraph.DependencyGraph(root).scan().report()
+    assert report['layers'] == 4
+    assert sorted(item['asset_path'] for item in report['missing']) \
+        == ['/abs/elsewhere.usd', 'assets/missing.usd']
+    assert [item['asset_path'] for item in report['unresolved']] \
+        == ['omniverse://x.usd']
+    assert [item['layer'] for item in report['broken']] \
+        == [os.path.join(root, 'broken.usda')]
+
+
+def test_corrupt_crate_is_broken(tmp_path):
+    root = make_project(str(tmp_path))
+    # A crate whose table of contents promises a longer TOKENS section
+    # than the file holds
+    header = layerinfo.CRATE_MAGIC + bytes([0, 8, 0, 0, 0, 0, 0, 0]) \
+        + struct.pack('<q', 24)
+    toc = struct.pack('<Q', 1) + struct.pack('<16sqq', b'TOKENS', 64, 10)
+    write(os.path.join(root, 'cut.usdc'), header + toc + b'\0' * 10)
+    graph = depgraph.DependencyGraph(root).scan()
+    assert graph.complete
+    broken = graph.report()['broken']
+    assert [item['layer'] for item in broken] \
+        == [os.path.join(root, 'cut.usdc')]
+    assert graph.used_by(os.path.join(root, 'assets', 'chair.usda'))
+
+
+def test_rescan_folders(tmp_path):
+    root = make_project(str(tmp_path))
+    graph = depgraph.DependencyGraph(root).scan()
+    missing = os.path.join(root, 'assets', 'missing.usd')
+    assert missing in graph.missing
+    write(missing, usda())
+    graph.rescan_folders([os.path.join(root, 'assets')])
+    assert missing not in graph.missing
+    assert graph.used_by(missing)
+    os.remove(os.path.join(root, 'assets', 'chair.usda'))
+    graph.rescan_folders([os.path.join(root, 'assets')])
+    assert os.path.join(root, 'assets', 'chair.usda') in graph.missing
+
+
+def test_unchanged_layers_come_from_the_cache(tmp_path, monkeypatch):
+    root = make_project(str(tmp_path / 'proj'))
+    cache = str(tmp_path / 'deps.sqlite')
+    depgraph.DependencyGraph(root, cache).scan().close()
+    read = []
+    original = layerinfo.read_layer_arcs
+    monkeypatch.setattr(layerinfo, 'read_layer_arcs',
+                        lambda path: read.append(path) or original(path))
+    graph = depgraph.DependencyGraph(root, cache).scan()
+    assert read == []
+    assert graph.used_by(os.path.join(root, 'assets', 'chair.usda'))
+    write(os.path.join(root, 'layout.usda'), usda())
+    graph.scan()
+    assert read == [os.path.join(root, 'layout.usda')]
+    graph.close()
@@ -0,0 +1,122 @@
+import concurrent.futures
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+
+import pytest
+
+import indexd
+import projectindex
+import scancache
+import scanner
+import scanpool
+from conftest import write
+
+pytestmark = pytest.mark.skipif(not hasattr(socket, 'AF_UNIX'),
+                                reason='needs unix sockets')
+
+
+@pytest.fixture
+def daemon():
+    # Unix socket paths are short, tmp_path can be too long for one
+    temp_dir = tempfile.mkdtemp(prefix='usdbrowser_test_')
+    socket_path = os.path.join(temp_dir, indexd.SOCKET_NAME)
+    server = indexd.start(indexd.IndexDaemon(), socket_path)
+    client = indexd.connect(socket_path)
+    yield client
+    client.close()
+    indexd.stop(server, socket_path)
+    shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def test_wire_format():
+    value = {'a': [1, -2, 2.5, None, True, False], 'b': b'\0\1',
+             'c': 'İ\udcff'}
+    data = indexd.encode(value, bytearray())
+    assert indexd.decode(data) == (value, len(data))
+    with pytest.raises(ValueError):
+        indexd.encode(object(), bytearray())
+
+
+def test_index_from_the_daemon(daemon, project):
+    local = projectindex.ProjectIndex(project).build()
+    remote = daemon.fill_index(projectindex.ProjectIndex(project))
+    assert remote.complete
+    assert [remote.path(i) for i in range(len(remote))] \
+        == [local.path(i) for i in range(len(local))]
+
+
+def test_names_growing_when_lowercased(daemon, tmp_path):
+    root = str(tmp_path)
+    write(os.path.join(root, 'İ' * 60, 'a.usd'))
+    write(os.path.join(root, 'b', 'c.usd'))
+    write(os.path.join(root, 'İstanbul.usda'))
+    local = projectindex.ProjectIndex(root).build()
+    remote = daemon.fill_index(projectindex.ProjectIndex(root))
+    assert remote.lower_names == local.lower_names
+    for query in ('c.usd', 'stanbul', '*.usd', '~bcusd'):
+        assert [remote.path(i) for i in remote.search(query)] \
+            == [local.path(i) for i in local.search(query)]
+    assert [remote.path(i) for i in remote.search('c.usd')] \
+        == [os.path.join(root, 'b', 'c.usd')]
+
+
+def test_totals_from_the_daemon(daemon, project):
+    expected = scancache.ScanCache().subtree_totals(project)
+    assert daemon.subtree_totals(project, usage=True) == expected
+    counts, usage = daemon.subtree_totals(project)
+    assert counts == expected[0] and usage is None
+
+
+@pytest.fixture
+def stuck_daemon():
+    # Accepts connections and never answers
+    temp_dir = tempfile.mkdtemp(prefix='usdbrowser_test_')
+    socket_path = os.path.join(temp_dir, indexd.SOCKET_NAME)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(socket_path)
+    server.listen()
+    connections = []
+    threading.Thread(target=lambda: connections.append(server.accept()),
+                     daemon=True).start()
+    client = indexd.IndexClient(socket_path)
+    yield client
+    client.close()
+    for connection, _ in connections:
+        connection.close()
+    server.close()
+    shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def test_stuck_daemon_times_out(stuck_daemon, project, monkeypatch):
+    monkeypatch.setattr(indexd, 'TOTALS_TIMEOUT', 0.3)
+    pool = scanpool.ScanPool(remote=stuck_daemon)
+    counted = []
+    start = time.monotonic()
+    pool.count_subtrees([project],
+                        lambda path, counts: counted.append(counts))
+    while not counted and time.monotonic() - start < 5:
+        time.sleep(0.05)
+    # Counted in this process once the daemon took too long
+    assert counted == [scanner.count_usd_files(project)]
+    assert not stuck_daemon.available()
+    pool.shutdown()
+
+
+def test_cancel_stops_a_waiting_request(stuck_daemon, project):
+    pool = scanpool.ScanPool(remote=stuck_daemon)
+    batch = pool.count_subtrees([project], lambda path, counts: None)
+    future = batch.shared[0].future
+    time.sleep(0.2)
+    assert not future.done()
+    start = time.monotonic()
+    batch.cancel()
+    concurrent.futures.wait([future], timeout=5)
+    assert future.done()
+    assert time.monotonic() - start < 1
+    # Cancelling is not a failure of the daemon
+    assert stuck_daemon.available()
+    pool.shutdown()
@@ -0,0 +1,118 @@
+import os
+
+import pytest
+
+import layerinfo
+from conftest import write
+
+USDA = b'''#usda 1.0
+(
+    defaultPrim = "root"
+    doc = """a ( tricky ) doc with subLayers = [@nope.usd@]"""
+    endTimeCode = 1100
+    metersPerUnit = 0.01
+    startTimeCode = 1001
+    subLayers = [
+        @./base.usda@,
+        @@@odd@name.usd@@@
+    ]
+    upAxis = "Z"
+)
+
+def Xform "root" (
+    prepend references = [@./model.usd@</model>, @other.usdc@]
+    delete references = @gone.usd@
+    payload = @./heavy.usdc@
+)
+{
+}
+'''
+
+
+def test_usda_metadata(tmp_path):
+    info = layerinfo.read_layer_info(write(str(tmp_path / 'a.usda'), USDA))
+    assert info.error is None
+    assert (info.format, info.version) == ('usda', '1.0')
+    assert info.default_prim == 'root'
+    assert info.up_axis == 'Z'
+    assert info.meters_per_unit == 0.01
+    assert (info.start_time, info.end_time) == (1001.0, 1100.0)
+    assert info.sublayers == ['./base.usda', 'odd@name.usd']
+    assert info.references == ['./model.usd', 'other.usdc']
+    assert not info.truncated
+    text = info.describe()
+    assert 'defaultPrim: root' in text
+    assert 'time: 1001 - 1100' in text
+
+
+def test_usda_arcs(tmp_path):
+    arcs = layerinfo.read_layer_arcs(write(str(tmp_path / 'a.usda'), USDA))
+    assert arcs == [(layerinfo.ARC_SUBLAYER, './base.usda'),
+                    (layerinfo.ARC_SUBLAYER, 'odd@name.usd'),
+                    (layerinfo.ARC_REFERENCE, './model.usd'),
+                    (layerinfo.ARC_REFERENCE, 'other.usdc'),
+                    (layerinfo.ARC_PAYLOAD, './heavy.usdc')]
+
+
+def test_unreadable_layers(tmp_path):
+    assert layerinfo.read_layer_info(
+        write(str(tmp_path / 'empty.usd'))).error == 'Empty file'
+    assert layerinfo.read_layer_info(
+        write(str(tmp_path / 'junk.usd'), b'junk')).error \
+        == 'Not a usda or usdc layer'
+    assert layerinfo.read_layer_info(
+        str(tmp_path / 'gone.usd')).error.startswith("Can't read layer")
+    with pytest.raises(ValueError):
+        layerinfo.read_layer_arcs(write(str(tmp_path / 'junk.usd'), b'junk'))
+
+
+def test_metadata_end():
+    text = '#usda 1.0\n( a = "(" # )\n b = @)@ )\ndef X {}'
+    header = len('#usda 1.0')
+    assert text[layerinfo.metadata_end(text, header) - 1] == ')'
+    assert text[:layerinfo.metadata_end(text, header)].endswith('@)@ )')
+    assert layerinfo.metadata_end('#usda 1.0\ndef X {}', header) is None
+
+
+def test_cache_reads_again_after_a_change(tmp_path):
+    path = write(str(tmp_path / 'a.usda'), USDA)
+    cache = layerinfo.LayerInfoCache()
+    info = cache.get(path)
+    assert cache.get(path) is info
+    write(path, USDA.replace(b'"root"', b'"other"'))
+    assert cache.get(path).default_prim == 'other'
+    os.remove(path)
+    assert cache.get(path) is None
+
+
+def crate_layer(path):
+    Sdf = pytest.importorskip('pxr.Sdf')
+    layer = Sdf.Layer.CreateNew(path)
+    layer.defaultPrim = 'root'
+    layer.subLayerPaths.append('./base.usda')
+    layer.startTimeCode = 1
+    layer.endTimeCode = 24
+    prim = Sdf.PrimSpec(layer, 'root', Sdf.SpecifierDef, 'Xform')
+    prim.referenceList.prependedItems.append(Sdf.Reference('./model.usd'))
+    prim.payloadList.prependedItems.append(Sdf.Payload('./heavy.usdc'))
+    layer.Save()
+    return path
+
+
+def test_crate_metadata(tmp_path):
+    path = crate_layer(str(tmp_path / 'a.usdc'))
+    info = layerinfo.read_layer_info(path)
+    assert info.error is None
+    assert info.format == 'usdc'
+    assert info.default_prim == 'root'
+    assert info.sublayers == ['./base.usda']
+    assert (info.start_time, info.end_time) == (1.0, 24.0)
+    assert './model.usd' in info.references
+
+
+def test_crate_arcs(tmp_path):
+    path = crate_layer(str(tmp_path / 'a.usdc'))
+    arcs = layerinfo.read_layer_arcs(path)
+    assert (layerinfo.ARC_SUBLAYER, './base.usda') in arcs
+    assert (layerinfo.ARC_REFERENCE, './model.usd') in arcs
+    assert (layerinfo.ARC_PAYLOAD, './heavy.usdc') in arcs
@@ -0,0 +1,111 @@
+import os
+import threading
+
+import pytest
+
+import projectindex
+from conftest import write
+
+
+def found(index, query):
+    return [index.relative_path(result) for result in index.search(query)]
+
+
+def test_parse_query():
+    assert projectindex.parse_query('~abc') == (projectindex.MODE_FUZZY,
+                                                'abc')
+    assert projectindex.parse_query('*.usd') == (projectindex.MODE_GLOB,
+                                                 '*.usd')
+    assert projectindex.parse_query('sh[01]') == (projectindex.MODE_GLOB,
+                                                  'sh[01]')
+    assert projectindex.parse_query('abc') == (projectindex.MODE_SUBSTRING,
+                                               'abc')
+
+
+def test_indexes_directories_and_usd_files(project):
+    index = projectindex.ProjectIndex(project).build()
+    assert index.complete
+    paths = sorted(index.relative_path(i) for i in range(len(index)))
+    assert 'notes.txt' not in paths
+    assert os.path.join('assets', 'chair.png') not in paths
+    assert os.path.join('shots', 'sh010', 'x.usdc') in paths
+    assert 'empty' in paths
+    assert len(paths) == 11
+    shots = [i for i in range(len(index)) if index.name(i) == 'shots'][0]
+    assert index.is_dir(shots)
+    assert index.path(shots) == os.path.join(project, 'shots')
+    assert index.depth(shots) == 1
+
+
+def test_substring_ranking(project):
+    index = projectindex.ProjectIndex(project).build()
+    assert found(index, 'CHAIR.USD') == [os.path.join('assets',
+                                                      'chair.usd')]
+    # Whole names, then prefixes, then matches anywhere
+    results = found(index, 'sh')
+    assert results[0] == 'shots'
+    assert set(results) == {'shots', os.path.join('shots', 'sh010'),
+                            os.path.join('shots', 'sh020')}
+
+
+def test_glob(project):
+    index = projectindex.ProjectIndex(project).build()
+    assert sorted(found(index, '*.usda')) \
+        == ['b.usda', os.path.join('shots', 'sh010', 'y.usda')]
+    assert sorted(found(index, 'sh0?0')) \
+        == [os.path.join('shots', 'sh010'), os.path.join('shots', 'sh020')]
+    assert found(index, 'sh0[!1]0') == [os.path.join('shots', 'sh020')]
+
+
+def test_fuzzy(project):
+    index = projectindex.ProjectIndex(project).build()
+    assert found(index, '~chrusd') == [os.path.join('assets', 'chair.usd')]
+    assert found(index, '~zzz') == []
+
+
+def test_limit_and_empty_query(project):
+    index = projectindex.ProjectIndex(project).build()
+    assert len(index.search('s', limit=2)) == 2
+    assert index.search('') == []
+    assert projectindex.ProjectIndex(project).search('a') == []
+
+
+def test_cancelled(project):
+    cancel = threading.Event()
+    cancel.set()
+    index = projectindex.ProjectIndex(project).build(cancel)
+    assert not index.complete
+
+
+@pytest.mark.skipif(not hasattr(os, 'symlink'), reason='needs symlinks')
+def test_symlinked_directories_are_not_indexed_twice(project):
+    os.symlink(os.path.join(project, 'shots'),
+               os.path.join(project, 'link'))
+    index = projectindex.ProjectIndex(project).build()
+    assert found(index, 'link') == ['link']
+    assert found(index, 'z.usd') == [os.path.join('shots', 'sh020',
+                                                  'z.usd')]
+
+
+def test_names_growing_when_lowercased(tmp_path):
+    root = str(tmp_path)
+    for name in ('İstanbul.usd', 'ISTANBUL_v2.usd', 'other.usda'):
+        write(os.path.join(root, name))
+    index = projectindex.ProjectIndex(root).build()
+    assert len(index.lower_names) == len(index.names)
+    assert sorted(found(index, 'stanbul')) \
+        == ['ISTANBUL_v2.usd', 'İstanbul.usd']
+    assert found(index, 'istanbul') == ['ISTANBUL_v2.usd']
+    assert found(index, 'other') == ['other.usda']
+    assert found(index, '*.usda') == ['other.usda']
+
+
+def test_names_with_a_newline_are_left_out(tmp_path):
+    root = str(tmp_path)
+    write(os.path.join(root, 'bad\nname', 'inner.usd'))
+    write(os.path.join(root, 'odd\n.usd'))
+    write(os.path.join(root, 'good.usd'))
+    index = projectindex.ProjectIndex(root).build()
+    assert [index.relative_path(i) for i in range(len(index))] \
+        == ['good.usd']
+    assert found(index, 'usd') == ['good.usd']
@@ -0,0 +1,128 @@
+import os
+import threading
+
+import scancache
+import scanner
+from conftest import age, write
+
+
+def test_subtree_counts_match_a_walk(project):
+    cache = scancache.ScanCache()
+    assert cache.subtree_counts(project) == scanner.count_usd_files(project)
+    counts, usage = cache.subtree_totals(project)
+    walked = scanner.DiskUsage()
+    scanner.count_usd_files(project, usage=walked)
+    assert counts == scanner.UsdCounts(3, 2, 1)
+    assert (usage.files, usage.bytes) == (walked.files, walked.bytes)
+
+
+def test_unchanged_directories_are_not_listed_again(project):
+    cache = scancache.ScanCache()
+    cache.subtree_counts(project)
+    misses = cache.misses
+    assert cache.subtree_counts(project) == scanner.UsdCounts(3, 2, 1)
+    assert cache.misses == misses
+
+
+def test_changed_directory_is_listed_again(project):
+    cache = scancache.ScanCache()
+    cache.subtree_counts(project)
+    misses = cache.misses
+    write(os.path.join(project, 'shots', 'sh020', 'new.usda'))
+    assert cache.subtree_counts(project) == scanner.UsdCounts(3, 3, 1)
+    assert cache.misses == misses + 1
+
+
+def test_usage_needs_a_listing_with_stats(project):
+    cache = scancache.ScanCache()
+    cache.subtree_counts(project)
+    counts, usage = cache.subtree_totals(project)
+    assert counts == scanner.UsdCounts(3, 2, 1)
+    assert usage.files == 8
+
+
+def test_persisted_between_sessions(project, tmp_path):
+    path = str(tmp_path / 'cache' / 'scan.sqlite')
+    cache = scancache.ScanCache(path)
+    cache.subtree_totals(project)
+    cache.close()
+    reopened = scancache.ScanCache(path)
+    counts, usage = reopened.subtree_totals(project)
+    assert counts == scanner.UsdCounts(3, 2, 1)
+    assert usage.files == 8
+    assert reopened.misses == 0
+    reopened.close()
+
+
+def test_unwritable_path_falls_back_to_memory(tmp_path):
+    blocker = write(str(tmp_path / 'file'))
+    cache = scancache.ScanCache(os.path.join(blocker, 'scan.sqlite'))
+    assert cache.path == ':memory:'
+
+
+def test_level_change(project):
+    cache = scancache.ScanCache()
+    cache.subtree_totals(project)
+    folder = os.path.join(project, 'shots', 'sh010')
+    write(os.path.join(folder, 'extra.usdc'), b'12345')
+    counts, usage = cache.level_change(folder, usage=True)
+    assert counts == scanner.UsdCounts(0, 0, 1)
+    assert (usage.files, usage.bytes) == (1, 5)
+
+
+def test_level_change_with_new_subdirectory(project):
+    cache = scancache.ScanCache()
+    cache.subtree_counts(project)
+    folder = os.path.join(project, 'shots')
+    os.makedirs(os.path.join(folder, 'sh030'))
+    assert cache.level_change(folder) is None
+
+
+def test_level_change_of_unknown_directory(project):
+    cache = scancache.ScanCache()
+    assert cache.level_change(project) is None
+
+
+def test_listing(project):
+    cache = scancache.ScanCache()
+    scan = scanner.list_directory(project, cache)
+    mtime_ns, names = cache.listing(project)
+    assert mtime_ns == scan.mtime_ns
+    assert sorted(names) == sorted((entry.name, entry.is_dir)
+                                   for entry in scan.entries)
+    again = scanner.list_directory(project, cache)
+    assert sorted(again.names()) == sorted(scan.names())
+    cache.expire(project)
+    assert cache.listing(project) is None
+
+
+def test_invalidate(project):
+    cache = scancache.ScanCache()
+    cache.subtree_counts(project)
+    cache.invalidate(os.path.join(project, 'shots'))
+    misses = cache.misses
+    cache.subtree_counts(project)
+    # shots, sh010 and sh020
+    assert cache.misses == misses + 3
+
+
+def test_cancelled(project):
+    cancel = threading.Event()
+    cancel.set()
+    assert scancache.ScanCache().subtree_counts(project, cancel) is None
+
+
+def test_recently_modified_directory_is_not_trusted(project):
+    cache = scancache.ScanCache()
+    folder = os.path.join(project, 'assets')
+    write(os.path.join(folder, 'table.usd'))
+    cache.subtree_counts(folder)
+    misses = cache.misses
+    # Modified within RACY_SECONDS of the scan, listed again
+    cache.subtree_counts(folder)
+    assert cache.misses == misses + 1
+    age(folder)
+    cache.subtree_counts(folder)
+    misses = cache.misses
+    cache.subtree_counts(folder)
+    assert cache.misses == misses
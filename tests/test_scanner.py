@@ -0,0 +1,108 @@
+import os
+import threading
+
+import pytest
+
+import scanner
+
+
+def test_counts_by_extension():
+    counts = scanner.UsdCounts()
+    for name in ('a.usd', 'b.usda', 'c.usdc', 'd.usdc', 'e.png', 'usd'):
+        counts.add_file(name)
+    assert counts.as_tuple() == (1, 1, 2)
+    assert counts.total() == 4
+    other = counts.copy()
+    other.add(scanner.UsdCounts(1, 1, 1))
+    assert other == scanner.UsdCounts(2, 2, 3)
+    other.subtract(counts)
+    assert other == scanner.UsdCounts(1, 1, 1)
+    assert counts == scanner.UsdCounts(1, 1, 2)
+
+
+def test_disk_usage_by_extension():
+    usage = scanner.DiskUsage()
+    usage.add_file('a.USD', 10, 5)
+    usage.add_file('b.usda', 20, 3)
+    usage.add_file('README', 1, 0)
+    assert (usage.files, usage.bytes, usage.newest_mtime_ns) == (3, 31, 5)
+    assert usage.by_extension == {'.usd': 10, '.usda': 20, '': 1}
+    assert usage.largest_extensions(1) == [('.usda', 20)]
+    other = usage.copy()
+    other.subtract(scanner.DiskUsage(1, 20, 9, {'.usda': 20}))
+    assert other.by_extension == {'.usd': 10, '': 1}
+    # The newest mtime never goes back
+    assert other.newest_mtime_ns == 9
+    assert scanner.DiskUsage.from_dict(usage.as_dict()) == usage
+
+
+def test_count_usd_files(project):
+    assert scanner.count_usd_files(project) == scanner.UsdCounts(3, 2, 1)
+    assert scanner.count_usd_files(os.path.join(project, 'shots')) \
+        == scanner.UsdCounts(1, 1, 1)
+    assert scanner.count_usd_files(os.path.join(project, 'empty')) \
+        == scanner.UsdCounts()
+
+
+def test_count_usd_files_with_usage(project):
+    usage = scanner.DiskUsage()
+    scanner.count_usd_files(project, usage=usage)
+    sizes = [os.path.getsize(os.path.join(top, name))
+             for top, _, names in os.walk(project) for name in names]
+    assert usage.files == len(sizes)
+    assert usage.bytes == sum(sizes)
+    assert usage.by_extension['.png'] == len(b'assets/chair.png')
+
+
+def test_count_usd_files_cancelled(project):
+    cancel = threading.Event()
+    cancel.set()
+    assert scanner.count_usd_files(project, cancel=cancel) is None
+
+
+def test_count_usd_files_missing_directory(tmp_path):
+    assert scanner.count_usd_files(str(tmp_path / 'gone')) \
+        == scanner.UsdCounts()
+
+
+@pytest.mark.skipif(not hasattr(os, 'symlink'), reason='needs symlinks')
+def test_symlinked_directories_are_not_walked(project):
+    os.symlink(os.path.join(project, 'shots'),
+               os.path.join(project, 'link'))
+    assert scanner.count_usd_files(project) == scanner.UsdCounts(3, 2, 1)
+
+
+def test_list_directory(project):
+    scan = scanner.list_directory(project)
+    assert sorted(scan.names()) == ['a.usd', 'assets', 'b.usda', 'empty',
+                                    'notes.txt', 'shots']
+    assert sorted(scan.dir_names()) == ['assets', 'empty', 'shots']
+    assert scan.file_counts == scanner.UsdCounts(1, 1, 0)
+    assert scan.unscanned == 3
+    assert scan.by_name['a.usd'].path == os.path.join(project, 'a.usd')
+    assert all(entry.counts is None and entry.usage is None
+               for entry in scan.entries)
+
+
+def test_list_directory_with_stats(project):
+    scan = scanner.list_directory(project, stats=True)
+    entry = scan.by_name['b.usda']
+    assert entry.usage.bytes == len(b'b.usda')
+    assert scan.by_name['shots'].usage is None
+
+
+def test_set_counts(project):
+    scan = scanner.list_directory(project)
+    version = scan.version
+    scan.set_counts('shots', scanner.UsdCounts(1, 1, 1))
+    assert scan.unscanned == 2
+    assert scan.counts == scanner.UsdCounts(1, 1, 1)
+    assert scan.version > version
+    # Counting again replaces the old counts in the totals
+    scan.set_counts('shots', scanner.UsdCounts(2, 0, 0))
+    assert scan.unscanned == 2
+    assert scan.counts == scanner.UsdCounts(2, 0, 0)
+    assert [entry.name for entry in scan.pending()] != []
+    assert 'shots' not in [entry.name for entry in scan.pending()]
+    # Counted without disk usage is still pending for the size column
+    assert 'shots' in [entry.name for entry in scan.pending(usage=True)]
@@ -0,0 +1,86 @@
+import os
+
+import scanner
+import sequences
+
+
+def entries(*names, directory='/job/cache'):
+    return [scanner.ScanEntry(name, os.path.join(directory, name), False)
+            for name in names]
+
+
+def test_groups_numbered_files():
+    grouped = sequences.group_sequences(entries(
+        'cache.1001.usdc', 'cache.1002.usdc', 'cache.1005.usdc',
+        'other.usda'))
+    sequence, other = grouped
+    assert sequence.name == 'cache.####.usdc'
+    assert sequence.path == os.path.join('/job/cache', 'cache.$F4.usdc')
+    assert sequence.frames == [1001, 1002, 1005]
+    assert sequence.gaps() == [(1003, 1004)]
+    assert sequence.missing() == 2
+    assert sequence.frame_range() == '1001-1005 (2 missing)'
+    assert [member.name for member in sequence.members] \
+        == ['cache.1001.usdc', 'cache.1002.usdc', 'cache.1005.usdc']
+    assert other.name == 'other.usda'
+
+
+def test_few_files_stay_single():
+    grouped = sequences.group_sequences(entries('a.1.usd', 'a.2.usd'))
+    assert [entry.name for entry in grouped] == ['a.1.usd', 'a.2.usd']
+
+
+def test_different_extensions_are_different_sequences():
+    grouped = sequences.group_sequences(entries(
+        'a.1.usd', 'a.2.usd', 'a.3.usd', 'a.1.usdc', 'a.2.usdc',
+        'a.3.usdc'))
+    assert [entry.name for entry in grouped] == ['a.#.usd', 'a.#.usdc']
+
+
+def test_frames_out_of_order():
+    sequence, = sequences.group_sequences(entries(
+        'shot_10.usd', 'shot_9.usd', 'shot_11.usd'))
+    assert sequence.frames == [9, 10, 11]
+    assert sequence.name == 'shot_#.usd'
+    assert sequence.path == os.path.join('/job/cache', 'shot_$F.usd')
+    assert sequence.missing() == 0
+
+
+def test_padding():
+    assert sequences.sequence_padding(['0001', '0002']) == 4
+    assert sequences.sequence_padding(['1001', '1002']) == 4
+    assert sequences.sequence_padding(['9', '10']) == 0
+    assert sequences.frame_token(4) == '$F4'
+    assert sequences.frame_token(0) == '$F'
+
+
+def test_usage_totals_once_every_frame_has_it():
+    members = entries('a.1.usd', 'a.2.usd', 'a.3.usd')
+    for number, member in enumerate(members):
+        member.usage = scanner.DiskUsage(1, number + 1)
+    sequence, = sequences.group_sequences(members)
+    assert sequence.usage.bytes == 6
+    members[0].usage = None
+    sequence, = sequences.group_sequences(members)
+    assert sequence.usage is None
+
+
+def test_describe_lists_gaps():
+    sequence, = sequences.group_sequences(entries(
+        'a.1.usd', 'a.3.usd', 'a.4.usd', 'a.9.usd'))
+    text = sequence.describe()
+    assert '4 files, frames 1-9 (5 missing)' in text
+    assert 'missing: 2, 5-8' in text
+
+
+def test_files_of_one_frame():
+    sequence, = sequences.group_sequences(entries(
+        'a.1.usd', 'a.01.usd', 'a.2.usd', 'a.3.usd'))
+    assert sequence.frames == [1, 1, 2, 3]
+    assert sequence.missing() == 0
+    assert sequence.frame_range() == '1-3'
+    assert sequence.gaps() == []
+    sequence, = sequences.group_sequences(entries(
+        'a.1.usd', 'a.01.usd', 'a.4.usd'))
+    assert sequence.missing() == 2
+    assert '3 files, frames 1-4 (2 missing)' in sequence.describe()
@@ -0,0 +1,112 @@
+import scanner
+import sorting
+
+
+def listing(*rows):
+    # rows: (name, is_dir, counts or None, size or None)
+    scan = scanner.DirectoryScan('/job')
+    for name, is_dir, counts, size in rows:
+        scan.add_entry(scanner.ScanEntry(
+            name, '/job/' + name, is_dir,
+            scanner.UsdCounts(*counts) if counts is not None else None,
+            scanner.DiskUsage(1, size, size) if size is not None else None))
+    return scan
+
+
+def names(entries):
+    return [entry.name for entry in entries]
+
+
+def test_natural_order():
+    ordered = sorted(['shot10', 'Shot9', 'shot1', 'top2.usd', 'top.usd',
+                      'top.usda'], key=sorting.natural_key)
+    assert ordered == ['shot1', 'Shot9', 'shot10', 'top.usd', 'top.usda',
+                       'top2.usd']
+
+
+def test_extension_rank():
+    assert sorting.extension_rank('a.usd') < sorting.extension_rank('a.usda')
+    assert sorting.extension_rank('a.usda') < sorting.extension_rank('a.usdc')
+    assert sorting.extension_rank('cache.####.usdc') \
+        == sorting.extension_rank('a.usdc')
+
+
+def test_splits_directories_and_usd_files():
+    scan = listing(('b.usd', False, None, None), ('dir', True, None, None),
+                   ('notes.txt', False, None, None),
+                   ('a.usdc', False, None, None))
+    dir_entries, file_entries = sorting.ListingSorter(scan).listing()
+    assert names(dir_entries) == ['dir']
+    assert names(file_entries) == ['a.usdc', 'b.usd']
+
+
+def test_by_name_reversed_keeps_files_in_order():
+    scan = listing(('a', True, None, None), ('b', True, None, None),
+                   ('y.usd', False, None, None), ('x.usd', False, None, None))
+    dir_entries, file_entries = sorting.ListingSorter(scan).listing(
+        sorting.SORT_NAME, False)
+    assert names(dir_entries) == ['b', 'a']
+    assert names(file_entries) == ['x.usd', 'y.usd']
+
+
+def test_by_type():
+    scan = listing(('c.usdc', False, None, None),
+                   ('b.usda', False, None, None),
+                   ('a.usdc', False, None, None),
+                   ('d.usd', False, None, None))
+    sorter = sorting.ListingSorter(scan)
+    assert names(sorter.listing(sorting.SORT_TYPE)[1]) \
+        == ['d.usd', 'b.usda', 'a.usdc', 'c.usdc']
+
+
+def test_by_count_unknown_last():
+    scan = listing(('a', True, (1, 0, 0), None), ('b', True, (0, 5, 0), None),
+                   ('c', True, None, None), ('d', True, (0, 0, 5), None))
+    sorter = sorting.ListingSorter(scan)
+    assert names(sorter.listing(sorting.SORT_COUNT)[0]) \
+        == ['a', 'b', 'd', 'c']
+    assert names(sorter.listing(sorting.SORT_COUNT, False)[0]) \
+        == ['b', 'd', 'a', 'c']
+    assert names(sorter.listing(sorting.SORT_USDA, False)[0]) \
+        == ['b', 'a', 'd', 'c']
+
+
+def test_by_size():
+    scan = listing(('small.usd', False, None, 1), ('big.usd', False, None, 9),
+                   ('unknown.usd', False, None, None))
+    sorter = sorting.ListingSorter(scan)
+    assert names(sorter.listing(sorting.SORT_SIZE)[1]) \
+        == ['small.usd', 'big.usd', 'unknown.usd']
+    assert names(sorter.listing(sorting.SORT_SIZE, False)[1]) \
+        == ['big.usd', 'small.usd', 'unknown.usd']
+
+
+def test_default_direction():
+    assert sorting.default_ascending(sorting.SORT_NAME)
+    assert sorting.default_ascending(sorting.SORT_TYPE)
+    assert not sorting.default_ascending(sorting.SORT_COUNT)
+    assert not sorting.default_ascending(sorting.SORT_MTIME)
+
+
+def test_orders_follow_new_counts():
+    scan = listing(('a', True, None, None), ('b', True, None, None))
+    sorter = sorting.ListingSorter(scan)
+    assert names(sorter.listing(sorting.SORT_COUNT, False)[0]) == ['a', 'b']
+    scan.set_counts('b', scanner.UsdCounts(3, 0, 0))
+    assert names(sorter.listing(sorting.SORT_COUNT, False)[0]) == ['b', 'a']
+
+
+def test_listing_is_a_copy():
+    scan = listing(('a', True, None, None))
+    sorter = sorting.ListingSorter(scan)
+    sorter.listing()[0].clear()
+    assert names(sorter.listing()[0]) == ['a']
+
+
+def test_matches():
+    scan = listing(('a', True, None, None))
+    sorter = sorting.ListingSorter(scan)
+    assert sorter.matches(scan, True)
+    assert not sorter.matches(scan, False)
+    scan.add_entry(scanner.ScanEntry('b', '/job/b', True))
+    assert not sorter.matches(scan, True)
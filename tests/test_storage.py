@@ -0,0 +1,119 @@
+import json
+import os
+
+import pytest
+
+import scancache
+import scanner
+import storage
+from conftest import age, write
+
+
+def names(entries):
+    return sorted((entry.name, entry.is_dir, entry.is_symlink)
+                  for entry in entries)
+
+
+@pytest.fixture
+def manifest(project, tmp_path):
+    os.symlink(os.path.join(project, 'shots'),
+               os.path.join(project, 'linked'))
+    age(project)
+    path = str(tmp_path / 'manifest.jsonl')
+    storage.write_manifest(project, path)
+    backend = storage.ManifestBackend.load(project, path)
+    storage.register_manifest(backend)
+    yield backend
+    storage.unregister_manifest(project)
+
+
+def test_scandir_listing(project):
+    mtime_ns, entries = storage.ScandirBackend().list_dir(project, True)
+    assert mtime_ns == os.stat(project).st_mtime_ns
+    by_name = {entry.name: entry for entry in entries}
+    assert by_name['shots'].is_dir and by_name['shots'].size is None
+    assert by_name['a.usd'].size == len('a.usd')
+
+
+def test_manifest_matches_the_disk(project, manifest):
+    disk = storage.ScandirBackend()
+    for top in (project, os.path.join(project, 'shots')):
+        assert names(manifest.list_dir(top)[1]) \
+            == names(disk.list_dir(top)[1])
+        assert manifest.dir_mtime(top) == disk.dir_mtime(top)
+    assert ('linked', True, True) in names(manifest.list_dir(project)[1])
+    assert manifest.list_dir(project, True)[1] is not None
+
+
+def test_counts_match_without_the_manifest(project, manifest):
+    with_manifest = scanner.count_usd_files(project)
+    storage.unregister_manifest(project)
+    assert with_manifest == scanner.count_usd_files(project)
+    # The symlinked folder is not walked twice
+    assert with_manifest.total() == 6
+
+
+def test_listed_from_the_manifest(project, manifest, monkeypatch):
+    # Nothing under the project goes to the disk, not even a stat
+    monkeypatch.setattr(manifest, 'fallback', None)
+    assert names(storage.list_dir(os.path.join(project, 'assets'))[1]) \
+        == [('chair.png', False, False), ('chair.usd', False, False)]
+    cache = scancache.ScanCache()
+    assert cache.subtree_counts(project).total() == 6
+    # The root, assets, empty, shots and its two shots
+    assert cache.misses == 6
+
+
+def test_expired_directory_is_read_from_disk(project, manifest):
+    assets = os.path.join(project, 'assets')
+    mtime_ns = manifest.dir_mtime(assets)
+    write(os.path.join(assets, 'table.usd'))
+    # Only the watcher's expire tells a changed folder
+    assert storage.dir_mtime(assets) == mtime_ns
+    assert 'table.usd' not in [entry.name
+                               for entry in storage.list_dir(assets)[1]]
+    storage.expire(assets)
+    assert storage.dir_mtime(assets) == os.stat(assets).st_mtime_ns
+    assert 'table.usd' in [entry.name
+                           for entry in storage.list_dir(assets)[1]]
+
+
+def test_checked_mtime_finds_stale_directories(project, manifest):
+    manifest.check_mtime = True
+    assets = os.path.join(project, 'assets')
+    write(os.path.join(assets, 'table.usd'))
+    assert storage.dir_mtime(assets) == os.stat(assets).st_mtime_ns
+    assert 'table.usd' in [entry.name
+                           for entry in storage.list_dir(assets)[1]]
+    assert 'assets' not in manifest.records
+    # Unchanged directories still come from the manifest
+    assert storage.dir_mtime(project) == os.stat(project).st_mtime_ns
+    assert '.' in manifest.records and 'shots' in manifest.records
+
+
+def test_missing_directory_falls_back(project, manifest):
+    path = os.path.join(project, 'new')
+    os.mkdir(path)
+    write(os.path.join(path, 'n.usd'))
+    assert [entry.name for entry in storage.list_dir(path)[1]] == ['n.usd']
+    assert storage.dir_mtime(path) == os.stat(path).st_mtime_ns
+
+
+def test_older_manifest_lines():
+    mtime_ns, entries = storage.manifest_record(
+        {'dir': '.', 'mtime_ns': 5, 'dirs': ['d'], 'files': ['a.usd']})
+    assert mtime_ns == 5
+    assert names(entries) == [('a.usd', False, False), ('d', True, False)]
+    assert not storage.has_stats(entries)
+
+
+def test_jsonl_lines(project, tmp_path):
+    path = str(tmp_path / 'manifest.jsonl')
+    storage.write_manifest(project, path)
+    with open(path, encoding='utf-8') as f:
+        lines = {line['dir']: line for line in map(json.loads, f)}
+    assert lines['.']['dirs'] == ['assets', 'empty', 'shots']
+    assert lines['.']['links'] == []
+    assert lines['assets']['files'] == ['chair.png', 'chair.usd']
+    assert lines['assets']['sizes'] == [len('assets/chair.png'),
+                                        len('assets/chair.usd')]
@@ -0,0 +1,142 @@
+import base64
+import os
+import time
+
+import pytest
+
+pytest.importorskip('PySide2')
+
+import thumbnails  # noqa: E402
+
+
+def write(path, data=b''):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+    return path
+
+
+def usda_with_thumbnail(path, image):
+    text = ('#usda 1.0\n(\n    defaultPrim = "root"\n)\n\n'
+            'def Xform "root" (\n    assetInfo = {\n'
+            '        dictionary thumbnails = {\n'
+            '            dictionary default = {\n'
+            f'                asset defaultImage = @{image}@\n'
+            '            }\n        }\n    }\n)\n{\n}\n')
+    return write(path, text.encode())
+
+
+def test_key_changes_with_mtime_and_size():
+    key = thumbnails.ThumbnailCache.key('/a/b.usd', 1, 10)
+    assert key == thumbnails.ThumbnailCache.key('/a/./b.usd', 1, 10)
+    assert key != thumbnails.ThumbnailCache.key('/a/b.usd', 2, 10)
+    assert key != thumbnails.ThumbnailCache.key('/a/b.usd', 1, 11)
+
+
+def test_store_and_lookup(tmp_path):
+    cache = thumbnails.ThumbnailCache(str(tmp_path / 'cache'))
+    assert cache.lookup('ab12') == (False, None)
+    stored = cache.store('ab12', b'png')
+    assert cache.lookup('ab12') == (True, stored)
+    with open(stored, 'rb') as f:
+        assert f.read() == b'png'
+    # A layer without thumbnail is remembered too
+    assert cache.store('cd34', None) is None
+    assert cache.lookup('cd34') == (True, None)
+    assert not [name for _, _, name in cache.files()
+                if name.endswith('.tmp')]
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = thumbnails.ThumbnailCache(str(tmp_path / 'cache'), max_bytes=25)
+    old = cache.store('aa01', b'x' * 10)
+    past = time.time() - 100
+    os.utime(old, (past, past))
+    cache.store('bb02', b'x' * 10)
+    cache.store('cc03', b'x' * 10)
+    assert cache.lookup('aa01') == (False, None)
+    assert cache.lookup('cc03')[0]
+    assert cache.disk_usage() <= 25
+
+
+def test_clear(tmp_path):
+    cache = thumbnails.ThumbnailCache(str(tmp_path / 'cache'))
+    cache.store('aa01', b'png')
+    cache.clear()
+    assert cache.lookup('aa01') == (False, None)
+    assert cache.disk_usage() == 0
+
+
+@pytest.mark.parametrize('sidecar', ['shot.usd.png', 'shot.png',
+                                     'shot_thumb.png', 'thumbs/shot.png',
+                                     '.thumbs/shot.png'])
+def test_sidecar_image(tmp_path, sidecar):
+    layer = write(str(tmp_path / 'shot.usd'))
+    image = write(str(tmp_path / sidecar))
+    assert thumbnails.sidecar_image(layer) == image
+
+
+def test_sidecar_image_missing(tmp_path):
+    layer = write(str(tmp_path / 'shot.usd'))
+    write(str(tmp_path / 'other.png'))
+    assert thumbnails.sidecar_image(layer) is None
+
+
+def test_embedded_image_relative_path(tmp_path):
+    image = write(str(tmp_path / 'images' / 'shot.png'))
+    layer = usda_with_thumbnail(str(tmp_path / 'shot.usda'),
+                                './images/shot.png')
+    assert thumbnails.embedded_image(layer) == image
+
+
+def test_embedded_image_missing_file(tmp_path):
+    layer = usda_with_thumbnail(str(tmp_path / 'shot.usda'), 'gone.png')
+    assert thumbnails.embedded_image(layer) is None
+
+
+def test_embedded_image_data_uri(tmp_path):
+    payload = base64.b64encode(b'png bytes').decode()
+    layer = usda_with_thumbnail(str(tmp_path / 'shot.usda'),
+                                f'data:image/png;base64,{payload}')
+    assert thumbnails.embedded_image(layer) == b'png bytes'
+
+
+def test_generate_prefers_cache(tmp_path):
+    cache = thumbnails.ThumbnailCache(str(tmp_path / 'cache'))
+    layer = write(str(tmp_path / 'shot.usd'))
+    stat = os.stat(layer)
+    stored = cache.store(cache.key(layer, stat.st_mtime_ns, stat.st_size),
+                         b'png')
+    provider = thumbnails.ThumbnailProvider(cache, max_workers=1,
+                                            render=False)
+    try:
+        assert provider.generate(layer) == stored
+    finally:
+        provider.shutdown()
+
+
+def test_failed_generate_is_not_left_pending(tmp_path):
+    # `ready` is queued to the main thread, delivered by processEvents
+    from PySide2 import QtCore
+    app = QtCore.QCoreApplication.instance() \
+        or QtCore.QCoreApplication([])
+    provider = thumbnails.ThumbnailProvider(
+        thumbnails.ThumbnailCache(str(tmp_path / 'cache')), max_workers=1,
+        render=False)
+    finished = []
+    provider.listeners.append(finished.append)
+
+    def fail(path):
+        raise RuntimeError('broken')
+
+    provider.generate = fail
+    try:
+        assert provider.icon('/a/shot.usd') is None
+        deadline = time.time() + 5
+        while '/a/shot.usd' in provider.pending and time.time() < deadline:
+            app.processEvents()
+            time.sleep(0.01)
+        assert finished == ['/a/shot.usd']
+        assert provider.icons['/a/shot.usd'] is None
+    finally:
+        provider.shutdown()
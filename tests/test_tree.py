@@ -0,0 +1,92 @@
+import os
+
+import pytest
+
+import scanner
+from tree import Tree, NOT_SCANNED, LISTED, COUNTED
+
+
+def root_path(*parts):
+    return os.path.join(os.sep, 'job', 'proj', *parts)
+
+
+def counted_tree():
+    tree = Tree(root_path())
+    for path in ('shots', 'shots/sh010', 'assets'):
+        node = tree.add_path(root_path(path))
+        node.counts = scanner.UsdCounts(1, 0, 0)
+        node.usage = scanner.DiskUsage(1, 10)
+        node.state = COUNTED
+    tree.root.counts = scanner.UsdCounts(2, 0, 0)
+    tree.root.usage = scanner.DiskUsage(2, 20)
+    tree.root.state = COUNTED
+    return tree
+
+
+def test_add_and_lookup():
+    tree = Tree(root_path())
+    node = tree.add_path(root_path('shots', 'sh010'))
+    assert node.path == root_path('shots', 'sh010')
+    assert tree.lookup(root_path('shots', 'sh010')) is node
+    assert tree.lookup('shots/sh010') is node
+    assert tree.lookup(root_path()) is tree.root
+    assert tree.lookup(root_path('shots', 'sh020')) is None
+    assert tree.add_path(root_path('shots', 'sh010')) is node
+
+
+def test_paths_outside_the_root():
+    tree = Tree(root_path())
+    with pytest.raises(ValueError):
+        tree.add_path(os.path.join(os.sep, 'elsewhere'))
+
+
+def test_nearest():
+    tree = Tree(root_path())
+    shots = tree.add_path(root_path('shots'))
+    assert tree.nearest(root_path('shots', 'sh010', 'cache')) is shots
+    assert tree.nearest(root_path('assets')) is tree.root
+
+
+def test_invalidate():
+    tree = counted_tree()
+    sh010 = tree.add_path(root_path('shots', 'sh010', 'cache'))
+    assert tree.invalidate(root_path('shots')) == 3
+    shots = tree.lookup(root_path('shots'))
+    assert shots.counts is None and shots.state == NOT_SCANNED
+    assert sh010.state == NOT_SCANNED
+    # Totals above include the subtree, they are dropped too
+    assert tree.root.counts is None and tree.root.state == LISTED
+    assert tree.lookup(root_path('assets')).counts is not None
+    assert tree.invalidate(root_path('gone')) == 0
+
+
+def test_roll_up():
+    tree = counted_tree()
+    shots = tree.lookup(root_path('shots'))
+    before = shots.counts
+    updated = tree.roll_up(root_path('shots', 'sh010'),
+                           scanner.UsdCounts(0, 2, 0),
+                           scanner.DiskUsage(2, 5))
+    assert [node.name for node in updated] == ['sh010', 'shots',
+                                               root_path()]
+    assert shots.counts == scanner.UsdCounts(1, 2, 0)
+    assert shots.counts is not before
+    assert tree.root.counts == scanner.UsdCounts(2, 2, 0)
+    assert tree.root.usage.bytes == 25
+    assert tree.lookup(root_path('assets')).counts \
+        == scanner.UsdCounts(1, 0, 0)
+
+
+def test_roll_up_without_usage_drops_it():
+    tree = counted_tree()
+    tree.roll_up(root_path('shots'), scanner.UsdCounts(1, 0, 0))
+    assert tree.lookup(root_path('shots')).usage is None
+    assert tree.root.usage is None
+    assert tree.lookup(root_path('assets')).usage is not None
+
+
+def test_memory_footprint():
+    tree = counted_tree()
+    nodes, size = tree.memory_footprint()
+    assert nodes == 4
+    assert size > 0
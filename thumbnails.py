@@ -0,0 +1,320 @@
+import base64
+import hashlib
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from PySide2 import QtCore, QtGui
+
+try:
+    from . import layerinfo
+except ImportError:
+    import layerinfo
+
+CACHE_DIR = 'usdbrowser_thumbnails'
+DEFAULT_CACHE_BYTES = 256 * 1024 * 1024
+# Longest side of a stored thumbnail
+THUMBNAIL_SIZE = 128
+# Evicting goes down to this part of the cap so it does not run per store
+EVICT_TO = 0.8
+DEFAULT_WORKERS = 4
+# Renders are whole processes, only this many run at once
+MAX_RENDERS = 2
+RENDER_TIMEOUT = 120
+MAX_ICONS = 1024
+# Next to the layer, {name} is the file name and {stem} without extension
+SIDECAR_NAMES = ('{name}.png', '{stem}.png', '{stem}.jpg', '{stem}.jpeg',
+                 '{stem}_thumb.png', '.thumbs/{stem}.png',
+                 'thumbs/{stem}.png')
+
+logger = logging.getLogger(__name__)
+
+
+def default_cache_dir(pref_dir=None):
+    if not pref_dir:
+        pref_dir = os.environ.get('HOUDINI_USER_PREF_DIR') \
+                   or os.path.expanduser('~')
+    return os.path.join(pref_dir, CACHE_DIR)
+
+
+class ThumbnailCache:
+    # Thumbnails on disk named by the hash of (path, mtime, size), so an
+    # edited layer never matches its old thumbnail. Files are evicted
+    # least recently used first once the directory grows past max_bytes.
+    # A layer without any thumbnail gets an empty .none marker
+    def __init__(self, directory, max_bytes=DEFAULT_CACHE_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.size = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(path, mtime_ns, size):
+        text = f"{os.path.normpath(path)}\0{mtime_ns}\0{size}"
+        return hashlib.sha1(text.encode('utf-8', 'surrogateescape')) \
+            .hexdigest()
+
+    def image_path(self, key):
+        return os.path.join(self.directory, key[:2], key + '.png')
+
+    def marker_path(self, key):
+        return os.path.join(self.directory, key[:2], key + '.none')
+
+    def lookup(self, key):
+        # (found, image path or None for a layer without thumbnail)
+        for path, image in ((self.image_path(key), True),
+                            (self.marker_path(key), False)):
+            try:
+                os.utime(path)
+            except OSError:
+                continue
+            return True, path if image else None
+        return False, None
+
+    def store(self, key, data):
+        # `data` is the encoded png, or None to remember there is none
+        path = self.image_path(key) if data is not None \
+            else self.marker_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp, 'wb') as f:
+            f.write(data or b'')
+        os.replace(temp, path)
+        with self._lock:
+            if self.size is None:
+                self.size = self.disk_usage()
+            else:
+                self.size += len(data or b'')
+            if self.size > self.max_bytes:
+                self.evict(int(self.max_bytes * EVICT_TO))
+        return path if data is not None else None
+
+    def files(self):
+        # [(last used, size, path), ...]
+        found = []
+        try:
+            buckets = os.scandir(self.directory)
+        except OSError:
+            return found
+        with buckets:
+            for bucket in buckets:
+                if not bucket.is_dir():
+                    continue
+                with os.scandir(bucket.path) as it:
+                    for entry in it:
+                        try:
+                            stat = entry.stat()
+                        except OSError:
+                            continue
+                        found.append((stat.st_mtime, stat.st_size,
+                                      entry.path))
+        return found
+
+    def disk_usage(self):
+        return sum(size for _, size, _ in self.files())
+
+    def evict(self, target):
+        files = sorted(self.files())
+        size = sum(size for _, size, _ in files)
+        for _, file_size, path in files:
+            if size <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            size -= file_size
+        self.size = size
+
+    def clear(self):
+        with self._lock:
+            shutil.rmtree(self.directory, ignore_errors=True)
+            self.size = 0
+
+
+# Sources, run on the worker threads
+def sidecar_image(path):
+    folder, name = os.path.split(path)
+    stem = os.path.splitext(name)[0]
+    for pattern in SIDECAR_NAMES:
+        candidate = os.path.join(folder,
+                                 pattern.format(name=name, stem=stem))
+        if os.path.isfile(candidate):
+            return candidate
+    return None
+
+
+def embedded_image(path):
+    # The layer's assetInfo defaultImage: a path relative to the layer or
+    # the image itself as a data: URI. Returns a file path or bytes
+    thumbnail = layerinfo.read_layer_info(path).thumbnail
+    if not thumbnail:
+        return None
+    if thumbnail.startswith('data:'):
+        header, _, payload = thumbnail.partition(',')
+        if not header.endswith(';base64'):
+            return None
+        try:
+            return base64.b64decode(payload)
+        except ValueError:
+            return None
+    if not os.path.isabs(thumbnail):
+        thumbnail = os.path.join(os.path.dirname(path), thumbnail)
+    thumbnail = os.path.normpath(thumbnail)
+    return thumbnail if os.path.isfile(thumbnail) else None
+
+
+def render_command(path, output, size, renderer=None):
+    # husk from Houdini, or usdrecord from a USD build with imaging.
+    # None when neither is installed
+    hfs = os.environ.get('HFS')
+    husk = shutil.which('husk') or (
+        hfs and shutil.which(os.path.join(hfs, 'bin', 'husk')))
+    if husk:
+        command = [husk, '--res', str(size), str(size), '--frame-count', '1',
+                   '--output', output]
+        if renderer:
+            command += ['--renderer', renderer]
+        return command + [path]
+    usdrecord = shutil.which('usdrecord')
+    if usdrecord:
+        command = [usdrecord, '--imageWidth', str(size)]
+        if renderer:
+            command += ['--renderer', renderer]
+        return command + [path, output]
+    return None
+
+
+def scaled_png(source, size=THUMBNAIL_SIZE):
+    # Image file or bytes -> png bytes no larger than size x size. QImage
+    # is safe to use outside the main thread, QPixmap is not
+    image = QtGui.QImage()
+    if isinstance(source, bytes):
+        image.loadFromData(source)
+    else:
+        image.load(source)
+    if image.isNull():
+        return None
+    if image.width() > size or image.height() > size:
+        image = image.scaled(size, size, QtCore.Qt.KeepAspectRatio,
+                             QtCore.Qt.SmoothTransformation)
+    data = QtCore.QByteArray()
+    buffer = QtCore.QBuffer(data)
+    buffer.open(QtCore.QIODevice.WriteOnly)
+    image.save(buffer, 'PNG')
+    buffer.close()
+    return bytes(data)
+
+
+class ThumbnailSignals(QtCore.QObject):
+    # Emitted from worker threads: layer path, thumbnail file or ''
+    ready = QtCore.Signal(str, str)
+
+
+class ThumbnailProvider:
+    # Thumbnails for the rows on screen. icon() answers from memory and
+    # queues anything else on the worker threads, which look in the disk
+    # cache, then for a sidecar image, an embedded thumbnail and finally
+    # render one when a renderer is installed
+    def __init__(self, cache, max_workers=DEFAULT_WORKERS,
+                 max_renders=MAX_RENDERS, renderer=None, render=True):
+        self.cache = cache
+        self.renderer = renderer
+        self.render = render
+        self.render_slots = threading.BoundedSemaphore(max_renders)
+        self.signals = ThumbnailSignals()
+        self.signals.ready.connect(self.finished)
+        self.listeners = []
+        # path -> QIcon, or None for a layer without thumbnail
+        self.icons = OrderedDict()
+        self.pending = {}
+        self._executor = ThreadPoolExecutor(
+            max_workers, thread_name_prefix='usdbrowser-thumb')
+
+    def icon(self, path):
+        # The QIcon of `path`, None while unknown or when there is none
+        if path in self.icons:
+            self.icons.move_to_end(path)
+            return self.icons[path]
+        if path not in self.pending:
+            future = self._executor.submit(self.generate, path)
+            # Pending first: a future already done runs _done right here
+            self.pending[path] = future
+            future.add_done_callback(partial(self._done, path))
+        return None
+
+    def _done(self, path, future):
+        if future.cancelled():
+            return
+        try:
+            image = future.result()
+        except (OSError, ValueError, subprocess.SubprocessError):
+            image = None
+        except Exception:
+            # Anything else must not leave the path pending for good, it
+            # would never be asked for again
+            logger.exception("can't make the thumbnail of %s", path)
+            image = None
+        self.signals.ready.emit(path, image or '')
+
+    def finished(self, path, image):
+        # Main thread
+        if self.pending.pop(path, None) is None:
+            return
+        self.icons[path] = QtGui.QIcon(image) if image else None
+        while len(self.icons) > MAX_ICONS:
+            self.icons.popitem(last=False)
+        for listener in list(self.listeners):
+            listener(path)
+
+    def generate(self, path):
+        stat = os.stat(path)
+        key = self.cache.key(path, stat.st_mtime_ns, stat.st_size)
+        found, image = self.cache.lookup(key)
+        if found:
+            return image
+        source = sidecar_image(path) or embedded_image(path)
+        data = scaled_png(source) if source is not None else None
+        if data is None and self.render:
+            data = self.render_image(path)
+        return self.cache.store(key, data)
+
+    def render_image(self, path):
+        with self.render_slots:
+            temp_dir = tempfile.mkdtemp(prefix='usdbrowser_thumb_')
+            try:
+                output = os.path.join(temp_dir, 'thumbnail.png')
+                command = render_command(path, output, THUMBNAIL_SIZE,
+                                         self.renderer)
+                if command is None:
+                    return None
+                subprocess.run(command, stdout=subprocess.DEVNULL,
+                               stderr=subprocess.DEVNULL,
+                               timeout=RENDER_TIMEOUT)
+                if not os.path.isfile(output):
+                    return None
+                return scaled_png(output)
+            finally:
+                shutil.rmtree(temp_dir, ignore_errors=True)
+
+    def cancel(self):
+        # Drop everything not started yet, e.g. when the listing changes
+        for path, future in list(self.pending.items()):
+            if future.cancel():
+                del self.pending[path]
+
+    def forget(self, folders):
+        # Layers in these folders changed on disk
+        folders = set(folders)
+        for path in [path for path in self.icons
+                     if os.path.dirname(path) in folders]:
+            del self.icons[path]
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
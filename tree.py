@@ -0,0 +1,163 @@
+import os
+import sys
+
+# Scan state of a Node
+NOT_SCANNED = 0
+LISTED = 1
+COUNTED = 2
+
+
+class Node:
+    __slots__ = ('name', 'parent', 'children', 'counts', 'usage',
+                 'mtime_ns', 'state', 'subdirs_present')
+
+    def __init__(self, name, parent=None):
+        self.name = name
+        self.parent = parent
+        # name -> Node, created with the first child
+        self.children = None
+        # Subtree usd counts, disk usage, mtime and scan state from the
+        # last scan
+        self.counts = None
+        self.usage = None
+        self.mtime_ns = None
+        self.state = NOT_SCANNED
+        self.subdirs_present = False
+
+    @property
+    def path(self):
+        parts = []
+        node = self
+        while node is not None:
+            parts.append(node.name)
+            node = node.parent
+        return os.path.join(*reversed(parts))
+
+    def add_child(self, node):
+        if self.children is None:
+            self.children = {}
+        node.parent = self
+        self.children[node.name] = node
+        return node
+
+    def child(self, name):
+        if self.children is None:
+            return None
+        return self.children.get(name)
+
+    def iter_subtree(self):
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            yield node
+            if node.children:
+                stack.extend(node.children.values())
+
+
+class Tree:
+    def __init__(self, root=""):
+        self.root = Node(os.path.normpath(root) if root else root)
+
+    def _parts(self, path):
+        # Components of `path` below the root, absolute paths must be
+        # inside the root directory
+        path = os.path.normpath(path)
+        root = self.root.name
+        if os.path.isabs(path) and root:
+            relative = os.path.relpath(path, root)
+            if relative == os.curdir:
+                return []
+            if relative.startswith(os.pardir):
+                raise ValueError(f"{path} is not inside {root}")
+            path = relative
+        return [part for part in path.split(os.sep)
+                if part and part != os.curdir]
+
+    def add_path(self, path):
+        current = self.root
+        for part in self._parts(path):
+            found = current.child(part)
+            if found is None:
+                found = current.add_child(Node(part))
+            current = found
+        return current
+
+    def lookup(self, path):
+        current = self.root
+        for part in self._parts(path):
+            current = current.child(part)
+            if current is None:
+                return None
+        return current
+
+    def invalidate(self, path):
+        # Forget scan results of `path` and below. Ancestor counts include
+        # this subtree, so they are dropped too
+        node = self.lookup(path)
+        if node is None:
+            return 0
+        invalidated = 0
+        for descendant in node.iter_subtree():
+            descendant.counts = None
+            descendant.usage = None
+            descendant.mtime_ns = None
+            descendant.state = NOT_SCANNED
+            invalidated += 1
+        ancestor = node.parent
+        while ancestor is not None:
+            ancestor.counts = None
+            ancestor.usage = None
+            if ancestor.state == COUNTED:
+                ancestor.state = LISTED
+            ancestor = ancestor.parent
+        return invalidated
+
+    def nearest(self, path):
+        # Node of `path`, or of its closest ancestor in the tree
+        current = self.root
+        for part in self._parts(path):
+            found = current.child(part)
+            if found is None:
+                break
+            current = found
+        return current
+
+    def roll_up(self, path, counts_delta, usage_delta=None):
+        # The files directly inside `path` changed by these deltas (see
+        # ScanCache.level_change). Every counted node from `path` up to the
+        # root is adjusted in place of counting its subtree again. Without
+        # a usage delta the disk usage above `path` is dropped instead.
+        # Totals are replaced, not modified, so holders of the old objects
+        # can tell they changed. Returns the nodes updated
+        updated = []
+        node = self.nearest(path)
+        while node is not None:
+            if node.counts is not None:
+                counts = node.counts.copy()
+                counts.add(counts_delta)
+                node.counts = counts
+                if node.usage is not None and usage_delta is not None:
+                    usage = node.usage.copy()
+                    usage.add(usage_delta)
+                    node.usage = usage
+                else:
+                    node.usage = None
+                updated.append(node)
+            node = node.parent
+        return updated
+
+    def memory_footprint(self):
+        # (node count, approximate bytes held by nodes, names and counts)
+        nodes = 0
+        size = 0
+        for node in self.root.iter_subtree():
+            nodes += 1
+            size += sys.getsizeof(node) + sys.getsizeof(node.name)
+            if node.children is not None:
+                size += sys.getsizeof(node.children)
+            if node.counts is not None:
+                size += sys.getsizeof(node.counts)
+            if node.usage is not None:
+                size += sys.getsizeof(node.usage) \
+                    + sys.getsizeof(node.usage.by_extension)
+        return nodes, size
@@ -0,0 +1,266 @@
+from PySide2 import QtCore, QtGui
+
+try:
+    from . import scanner, browsercore, layerinfo
+    from .listmodel import USD_COLORS, EntryRole, CountsRole, usd_color, \
+        entry_tooltip, is_sequence
+    from .tree import LISTED, COUNTED
+except ImportError:
+    import scanner
+    import browsercore
+    import layerinfo
+    from listmodel import USD_COLORS, EntryRole, CountsRole, usd_color, \
+        entry_tooltip, is_sequence
+    from tree import LISTED, COUNTED
+
+
+class TreeSignals(QtCore.QObject):
+    # Emitted from scan worker threads, delivered on the main thread
+    counted = QtCore.Signal(int, str, object)
+
+
+class ProjectTreeModel(QtCore.QAbstractItemModel):
+    # The project as an expandable tree. A directory is listed only when
+    # the view expands it (canFetchMore/fetchMore) and the subtree counts
+    # of its children are filled in on the scan pool while it stays open.
+    # Rows are scanner.ScanEntry objects, directories are also recorded on
+    # their tree.Node; None stands for the project root
+    def __init__(self, pool, cache=None, parent=None):
+        super(ProjectTreeModel, self).__init__(parent)
+        self.pool = pool
+        self.cache = cache
+        self.tree = None
+        self.children = {}
+        self.parents = {}
+        self.row_of = {}
+        self.dir_entries = {}
+        self.batches = {}
+        self.generation = 0
+        self.signals = TreeSignals()
+        self.signals.counted.connect(self.set_counts)
+        self.brushes = {color: QtGui.QBrush(QtGui.QColor(color))
+                        for _, color in USD_COLORS}
+        self.layer_info = layerinfo.LayerInfoCache()
+        self.dependencies = None
+
+    def set_tree(self, tree):
+        self.beginResetModel()
+        self.cancel()
+        self.generation += 1
+        self.tree = tree
+        self.children = {}
+        self.parents = {}
+        self.row_of = {}
+        self.dir_entries = {}
+        self.endResetModel()
+
+    def cancel(self):
+        for batch in self.batches.values():
+            batch.cancel()
+        self.batches = {}
+
+    def entry(self, index):
+        if not index.isValid():
+            return None
+        return index.internalPointer()
+
+    def index_of(self, entry):
+        if entry is None:
+            return QtCore.QModelIndex()
+        return self.createIndex(self.row_of[entry], 0, entry)
+
+    def root_path(self):
+        return self.tree.root.path
+
+    # QAbstractItemModel
+    def index(self, row, column, parent=QtCore.QModelIndex()):
+        if not self.hasIndex(row, column, parent):
+            return QtCore.QModelIndex()
+        return self.createIndex(row, column,
+                                self.children[self.entry(parent)][row])
+
+    def parent(self, index):
+        entry = self.entry(index)
+        if entry is None:
+            return QtCore.QModelIndex()
+        return self.index_of(self.parents.get(entry))
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.column() > 0:
+            return 0
+        return len(self.children.get(self.entry(parent), ()))
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        return 1
+
+    def hasChildren(self, parent=QtCore.QModelIndex()):
+        entry = self.entry(parent)
+        if entry is None:
+            return self.tree is not None
+        if is_sequence(entry):
+            return True
+        if not entry.is_dir:
+            return False
+        rows = self.children.get(entry)
+        if rows is None:
+            # Unknown until listed, the expander goes away if it is empty
+            return True
+        return bool(rows)
+
+    def canFetchMore(self, parent):
+        entry = self.entry(parent)
+        if entry is None:
+            return self.tree is not None and None not in self.children
+        return (entry.is_dir or is_sequence(entry)) \
+            and entry not in self.children
+
+    def fetchMore(self, parent):
+        entry = self.entry(parent)
+        if is_sequence(entry):
+            # The frames of a sequence are already known
+            self.insert_rows(parent, entry, list(entry.members))
+            return
+        path = self.root_path() if entry is None else entry.path
+        node = self.tree.add_path(path)
+        try:
+            scan = scanner.list_directory(path, self.cache)
+        except OSError:
+            scan = scanner.DirectoryScan(path)
+        node.mtime_ns = scan.mtime_ns
+        node.state = LISTED
+        dir_entries, file_entries = browsercore.split_listing(scan)
+        node.subdirs_present = bool(dir_entries)
+        self.insert_rows(parent, entry, dir_entries + file_entries)
+        self.count_children(entry)
+
+    def insert_rows(self, parent, entry, rows):
+        if not rows:
+            self.children[entry] = rows
+            return
+        self.beginInsertRows(parent, 0, len(rows) - 1)
+        self.children[entry] = rows
+        for row, child in enumerate(rows):
+            self.parents[child] = entry
+            self.row_of[child] = row
+            if child.is_dir:
+                # Counts of an earlier scan of this directory are reused
+                child.counts = self.tree.add_path(child.path).counts
+                self.dir_entries[child.path] = child
+        self.endInsertRows()
+
+    def flags(self, index):
+        if self.entry(index) is None:
+            return QtCore.Qt.NoItemFlags
+        return QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        entry = self.entry(index)
+        if entry is None:
+            return None
+        if role == QtCore.Qt.DisplayRole:
+            return entry.name
+        if role == QtCore.Qt.ForegroundRole and not entry.is_dir:
+            return self.brushes.get(usd_color(entry.name))
+        if role == QtCore.Qt.ToolTipRole:
+            return entry_tooltip(entry, self.layer_info, self.dependencies)
+        if role == EntryRole:
+            return entry
+        if role == CountsRole:
+            return entry.counts
+        return None
+
+    # Counting
+    def count_children(self, entry):
+        # Count the subdirectories of an expanded directory still missing
+        # their counts, unless that is already under way
+        batch = self.batches.get(entry)
+        if batch is not None and not batch.done():
+            return
+        paths = [child.path for child in self.children.get(entry, ())
+                 if child.is_dir and child.counts is None]
+        if not paths:
+            return
+        generation = self.generation
+        self.batches[entry] = self.pool.count_subtrees(
+            paths, lambda path, counts: self.signals.counted.emit(
+                generation, path, counts))
+
+    def set_counts(self, generation, path, counts):
+        if generation != self.generation:
+            return
+        entry = self.dir_entries.get(path)
+        if entry is None:
+            return
+        entry.counts = counts
+        node = self.tree.lookup(path)
+        if node is not None:
+            node.counts = counts
+            node.state = COUNTED
+        index = self.index_of(entry)
+        self.dataChanged.emit(index, index, [CountsRole])
+        if self.cache is not None and all(
+                child.counts is not None
+                for child in self.children[self.parents[entry]]
+                if child.is_dir):
+            self.cache.flush()
+
+    def expanded(self, index):
+        self.count_children(self.entry(index))
+
+    def collapsed(self, index):
+        # Counts of a closed directory are not worth finishing
+        batch = self.batches.pop(self.entry(index), None)
+        if batch is not None:
+            batch.cancel()
+
+    # Disk changes
+    def listed_paths(self):
+        return [self.root_path() if entry is None else entry.path
+                for entry in self.children]
+
+    def refresh_directory(self, path):
+        # List an open directory again. Its subdirectories collapse
+        if self.tree is None:
+            return
+        if path == self.root_path():
+            entry = None
+        else:
+            entry = self.dir_entries.get(path)
+            if entry is None:
+                return
+            self.recount(entry)
+        rows = self.children.get(entry)
+        if rows is None:
+            return
+        parent = self.index_of(entry)
+        if rows:
+            self.beginRemoveRows(parent, 0, len(rows) - 1)
+        self.forget(entry)
+        if rows:
+            self.endRemoveRows()
+        self.fetchMore(parent)
+
+    def recount(self, entry):
+        # The subtree counts of a changed directory and of every directory
+        # above it are out of date
+        while entry is not None:
+            entry.counts = None
+            index = self.index_of(entry)
+            self.dataChanged.emit(index, index, [CountsRole])
+            parent = self.parents.get(entry)
+            # A running batch still delivers, the new one adds this entry
+            self.batches.pop(parent, None)
+            self.count_children(parent)
+            entry = parent
+
+    def forget(self, entry):
+        batch = self.batches.pop(entry, None)
+        if batch is not None:
+            batch.cancel()
+        for child in self.children.pop(entry, ()):
+            self.parents.pop(child, None)
+            self.row_of.pop(child, None)
+            if child.is_dir:
+                self.dir_entries.pop(child.path, None)
+            if child.is_dir or is_sequence(child):
+                self.forget(child)
@@ -0,0 +1,66 @@
+import os
+
+from PySide2 import QtCore
+
+# Quiet period that closes a burst of change events
+COALESCE_MS = 250
+# A steady stream of events still produces an update this often
+MAX_DELAY_MS = 2000
+# Stay well below the default inotify watch limit
+MAX_WATCHED_DIRS = 4000
+
+
+class DirectoryWatcher(QtCore.QObject):
+    # Wraps QFileSystemWatcher and folds bursts of directoryChanged
+    # events into a single `changed` signal carrying every changed path
+    changed = QtCore.Signal(list)
+
+    def __init__(self, parent=None):
+        super(DirectoryWatcher, self).__init__(parent)
+        self.watcher = QtCore.QFileSystemWatcher(self)
+        self.watcher.directoryChanged.connect(self.queue)
+        self.pending = set()
+        self.burst = QtCore.QElapsedTimer()
+        self.timer = QtCore.QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(COALESCE_MS)
+        self.timer.timeout.connect(self.flush)
+
+    def set_paths(self, paths):
+        wanted = []
+        seen = set()
+        for path in paths:
+            path = os.path.normpath(path)
+            if path not in seen:
+                seen.add(path)
+                wanted.append(path)
+        wanted = wanted[:MAX_WATCHED_DIRS]
+
+        watched = set(self.watcher.directories())
+        removed = watched.difference(wanted)
+        added = [path for path in wanted if path not in watched]
+        if removed:
+            self.watcher.removePaths(list(removed))
+        if added:
+            self.watcher.addPaths(added)
+
+    def queue(self, path):
+        if not self.pending:
+            self.burst.start()
+        self.pending.add(os.path.normpath(path))
+        # Restart the quiet period unless the burst is already too long
+        if self.burst.elapsed() < MAX_DELAY_MS or not self.timer.isActive():
+            self.timer.start()
+
+    def flush(self):
+        paths = sorted(self.pending)
+        self.pending.clear()
+        if paths:
+            self.changed.emit(paths)
+
+    def clear(self):
+        self.timer.stop()
+        self.pending.clear()
+        directories = self.watcher.directories()
+        if directories:
+            self.watcher.removePaths(directories)